@@ -0,0 +1,141 @@
+import json
+import platform
+import statistics
+import sys
+import time
+
+from common.fileio import writeFileAtomic
+
+# How much slower than its baseline a benchmark can get before it counts as a
+# regression (0.25 = 25% slower)
+DEFAULT_TOLERANCE = 0.25
+
+# Default number of times each benchmark is run
+DEFAULT_REPEAT = 5
+
+# Function to time a benchmark over a number of runs
+# Parameters:
+#     function:  The benchmark - called with no arguments
+#     repeat:    The number of runs
+#     setup:     Function called before each run, outside the timing
+#                (optional)
+# Returns: dict  The median and fastest times (in seconds) and number of runs
+def timeBenchmark(function, repeat, setup=None):
+    samples = []
+    for run in range(repeat):
+        if setup is not None:
+            setup()
+        startTime = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - startTime)
+
+    return {'median': statistics.median(samples),
+            'min': min(samples),
+            'runs': repeat}
+
+# Function to add the baseline options shared by all the benchmarks to an
+# argument parser
+# Parameters:
+#     parser:  The argparse.ArgumentParser
+def addBaselineArguments(parser):
+    parser.add_argument('--repeat',
+                        type=int,
+                        default=DEFAULT_REPEAT,
+                        metavar='N',
+                        help='Number of times to run each benchmark '
+                             '(default: %(default)s)')
+    parser.add_argument('--save-baseline',
+                        metavar='FILE',
+                        help='Save the timings as a baseline')
+    parser.add_argument('--baseline',
+                        metavar='FILE',
+                        help='Compare the timings with a saved baseline, '
+                             'failing if any has regressed')
+    parser.add_argument('--tolerance',
+                        type=float,
+                        default=DEFAULT_TOLERANCE,
+                        help='How much slower than the baseline a benchmark '
+                             'can be before it fails, as a fraction '
+                             '(default: %(default)s)')
+
+# Function to get a set of benchmark timings in the baseline format
+# Parameters:
+#     suite:       The name of the benchmark suite
+#     timings:     dict of benchmark name -> timing (from timeBenchmark)
+#     parameters:  dict of the parameters the suite was run with (sizes of
+#                  synthetic data etc.)
+# Returns: dict
+def getBaseline(suite, timings, parameters):
+    return {'suite': suite,
+            'parameters': parameters,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timings': timings}
+
+# Function to compare timings with a baseline
+# Parameters:
+#     baseline:   The baseline (as from getBaseline)
+#     timings:    dict of benchmark name -> timing (from timeBenchmark)
+#     tolerance:  How much slower than the baseline a benchmark can be, as a
+#                 fraction
+# Returns: ([] of str, [] of str)  A line of report for each benchmark, and
+#     the names of the benchmarks which have regressed
+def compareWithBaseline(baseline, timings, tolerance):
+    lines = []
+    regressions = []
+
+    for name, timing in timings.items():
+        baseTiming = baseline['timings'].get(name)
+        if baseTiming is None:
+            lines.append('%-28s %9.4fs  (not in baseline)' % (name, timing['median']))
+            continue
+
+        ratio = timing['median'] / max(baseTiming['median'], 1e-9)
+        verdict = ''
+        if ratio > 1 + tolerance:
+            verdict = '  REGRESSED'
+            regressions.append(name)
+        lines.append('%-28s %9.4fs  baseline %9.4fs  x%.2f%s' % (name,
+                                                                 timing['median'],
+                                                                 baseTiming['median'],
+                                                                 ratio,
+                                                                 verdict))
+
+    return lines, regressions
+
+# Function to report a suite's timings, saving them as a baseline and/ or
+# comparing them with one as asked on the command line
+# Parameters:
+#     suite:       The name of the benchmark suite
+#     timings:     dict of benchmark name -> timing (from timeBenchmark)
+#     parameters:  dict of the parameters the suite was run with
+#     args:        The parsed command line arguments (see
+#                  addBaselineArguments)
+# Returns: int  The exit code - 1 if any benchmark has regressed
+def reportBenchmarks(suite, timings, parameters, args):
+    exitCode = 0
+
+    if args.baseline:
+        with open(args.baseline, 'r') as baselineFile:
+            baseline = json.load(baselineFile)
+
+        if baseline.get('parameters') != parameters:
+            print('Warning: baseline was recorded with different parameters: ' +
+                  json.dumps(baseline.get('parameters')), file=sys.stderr)
+
+        lines, regressions = compareWithBaseline(baseline, timings, args.tolerance)
+        print('\n'.join(lines))
+        if regressions:
+            print(str(len(regressions)) + ' benchmarks regressed: ' +
+                  ', '.join(regressions), file=sys.stderr)
+            exitCode = 1
+    else:
+        for name, timing in timings.items():
+            print('%-28s %9.4fs  (min %.4fs)' % (name, timing['median'], timing['min']))
+
+    if args.save_baseline:
+        writeFileAtomic(args.save_baseline,
+                        json.dumps(getBaseline(suite, timings, parameters), indent=1))
+        print('Baseline saved to ' + args.save_baseline)
+
+    return exitCode
@@ -0,0 +1,79 @@
+# Benchmarks for the converter, on synthetic documents. Run from the top of
+# the repository:
+#     python -m benchmarks.converterbench --save-baseline converter-baseline.json
+#     python -m benchmarks.converterbench --baseline converter-baseline.json
+# With no plugins, the chat transform is just the built-in stages, so
+# 'convert (cold)' can be compared with baselines saved before plugins
+# existed. 'convert (cold, no-op plugin)' adds a message stage which
+# handles nothing, to show the cost of a plugin stage.
+import argparse
+import sys
+
+from benchmarks.baseline import addBaselineArguments, reportBenchmarks, timeBenchmark
+from benchmarks.synthetic import getSyntheticCharacters, getSyntheticChatHtml
+from config.classes import CharacterRoster
+from config.manager import getWorkSkinCss
+from converter.blockcache import blockCache, documentCache
+from converter.ficfileconverter import convertHtml
+from converter.transforms import ORDER_ACTION, PHASE_MESSAGE, TransformStage
+
+# This module is also the no-op plugin
+NO_OP_PLUGIN = 'benchmarks.converterbench'
+
+# Function to get the stages of the no-op plugin: a message stage which
+# runs before every built-in message stage, and handles nothing
+# Returns: [] of TransformStage
+def getTransformStages():
+    return [TransformStage('no-op',
+                           PHASE_MESSAGE,
+                           ORDER_ACTION - 1,
+                           lambda roster: lambda state, message, content: False)]
+
+# Function to clear the converter's caches, so a benchmark converts from
+# scratch
+def clearCaches():
+    blockCache.clear()
+    documentCache.clear()
+
+# Function to run the converter benchmarks
+# Parameters:
+#     argv:  The command line arguments (excluding the program name)
+# Returns: int  The exit code
+def main(argv):
+    parser = argparse.ArgumentParser(prog='converterbench',
+                                     description='Time the converter on '
+                                                 'synthetic documents')
+    parser.add_argument('--characters', type=int, default=200, metavar='N',
+                        help='Number of characters in the roster (default: '
+                             '%(default)s)')
+    parser.add_argument('--chats', type=int, default=300, metavar='N',
+                        help='Number of chats in the document (default: '
+                             '%(default)s)')
+    addBaselineArguments(parser)
+    args = parser.parse_args(argv)
+
+    characters = getSyntheticCharacters(args.characters)
+    roster = CharacterRoster.fromCharacters(characters)
+    htmlDoc = getSyntheticChatHtml(args.chats, characters)
+    senders = [character.name for character in characters]
+
+    timings = {}
+    timings['convert (cold)'] = timeBenchmark(lambda: convertHtml(htmlDoc, roster),
+                                              args.repeat,
+                                              clearCaches)
+    timings['convert (cold, no-op plugin)'] = timeBenchmark(
+        lambda: convertHtml(htmlDoc, roster, plugins=(NO_OP_PLUGIN,)),
+        args.repeat,
+        clearCaches)
+    timings['convert (cached blocks)'] = timeBenchmark(lambda: convertHtml(htmlDoc, roster),
+                                                       args.repeat)
+    timings['work skin'] = timeBenchmark(lambda: getWorkSkinCss(senders, True, roster),
+                                         args.repeat)
+
+    return reportBenchmarks('converter',
+                            timings,
+                            {'characters': args.characters, 'chats': args.chats},
+                            args)
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,175 @@
+# Benchmarks for the GUI: how long the main window takes to start up, and
+# how long each panel takes to show, with a big synthetic roster and set of
+# results. Runs headless (on Qt's offscreen platform), in a scratch directory
+# so the real config isn't touched. Run from the top of the repository:
+#     python -m benchmarks.guibench --save-baseline gui-baseline.json
+#     python -m benchmarks.guibench --baseline gui-baseline.json
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+# Must be set before Qt is loaded
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PySide2.QtCore import QCoreApplication, QEvent
+from PySide2.QtWidgets import QApplication
+
+from benchmarks.baseline import addBaselineArguments, reportBenchmarks, timeBenchmark
+from benchmarks.synthetic import getSyntheticCharacters
+from config.manager import getConfigManager
+from converter.batch import STATUS_OK, ConversionResult
+from gui.appmain import AppMainWindow, DisplayResultsPanel
+from gui.resultsmodel import ResultsTableModel
+
+# Function to make a set of synthetic batch results
+# Parameters:
+#     count:       The number of results
+#     characters:  [] of Character  The characters found in the files
+# Returns: [] of ConversionResult
+def getSyntheticResults(count, characters):
+    results = []
+    for number in range(count):
+        result = ConversionResult('chapter' + str(number) + '.docx')
+        if number % 50 == 49:
+            result.error = 'File not found: ' + result.filename
+        else:
+            result.status = STATUS_OK
+            result.outfilePath = os.path.join('output', 'chapter' + str(number) + '.html')
+            result.characters = set(character.name for character in
+                                    characters[number % len(characters):][:5])
+            result.unknownCharacters = ['stranger' + str(number % 7)]
+            result.seconds = 0.01 * (number % 100)
+            result.outputSize = 1000 * number
+            result.outputWritten = True
+        results.append(result)
+    return results
+
+# Function to let the GUI catch up: handle pending events, including deleting
+# any widgets scheduled for deletion
+def flushEvents():
+    QCoreApplication.sendPostedEvents(None, QEvent.DeferredDelete)
+    QCoreApplication.processEvents()
+
+# Class representing the state of a GUI benchmark run: the main window being
+# driven, and the synthetic data
+class GuiBenchmark():
+    # Constructor
+    # Parameters:
+    #     results:  [] of ConversionResult  Synthetic results to show
+    def __init__(self, results):
+        self.results = results
+        self.window = None
+
+    # Method to close the main window, if there is one
+    def closeWindow(self):
+        if self.window is not None:
+            self.window.close()
+            self.window.deleteLater()
+            self.window = None
+            flushEvents()
+
+    # Method to open the main window (and wait for it to be shown)
+    def openWindow(self):
+        self.window = AppMainWindow()
+        self.window.show()
+        flushEvents()
+
+    # Method to show a panel, by calling the main window method a sidebar
+    # button would
+    # Parameters:
+    #     methodName:  The name of the AppMainWindow method
+    def showPanel(self, methodName):
+        getattr(self.window, methodName)()
+        flushEvents()
+
+    # Method to change a character, so the character list has to be rebuilt
+    # the next time it's shown
+    def changeRoster(self):
+        configManager = getConfigManager()
+        character = configManager.listCharacters()[0]
+        configManager.addCharacter(character.name,
+                                   '#000000' if character.color != '#000000' else '#ffffff')
+
+    # Method to show the results panel for the synthetic results
+    def showResults(self):
+        resultsModel = ResultsTableModel(self.window)
+        for result in self.results:
+            resultsModel.appendResult(result)
+        self.window.resultsModel = resultsModel
+        self.window.resultsPanel = DisplayResultsPanel(self.window, resultsModel)
+        self.window.setContentPanel(self.window.resultsPanel)
+        flushEvents()
+
+    # Method to add the synthetic results to a results panel which is already
+    # showing, one at a time, as they would come in from a batch
+    def streamResults(self):
+        resultsModel = ResultsTableModel(self.window)
+        self.window.resultsModel = resultsModel
+        self.window.resultsPanel = DisplayResultsPanel(self.window, resultsModel)
+        self.window.setContentPanel(self.window.resultsPanel)
+        for result in self.results:
+            resultsModel.appendResult(result)
+            QCoreApplication.processEvents()
+        flushEvents()
+
+# Function to run the GUI benchmarks
+# Parameters:
+#     argv:  The command line arguments (excluding the program name)
+# Returns: int  The exit code
+def main(argv):
+    parser = argparse.ArgumentParser(prog='guibench',
+                                     description='Time the GUI headlessly, '
+                                                 'with synthetic data')
+    parser.add_argument('--characters', type=int, default=500, metavar='N',
+                        help='Number of characters in the roster (default: '
+                             '%(default)s)')
+    parser.add_argument('--results', type=int, default=2000, metavar='N',
+                        help='Number of results in a batch (default: '
+                             '%(default)s)')
+    addBaselineArguments(parser)
+    args = parser.parse_args(argv)
+
+    app = QApplication([])
+
+    # Work in a scratch directory (with the JSON config), so the config and
+    # CSS written for the synthetic roster don't replace the real ones
+    os.environ.pop('TEXTFIC_CONFIG_DB', None)
+    workingDir = os.getcwd()
+    scratchDir = tempfile.mkdtemp(prefix='guibench')
+    os.chdir(scratchDir)
+    try:
+        characters = getSyntheticCharacters(args.characters)
+        configManager = getConfigManager()
+        configManager.addCharacters(characters)
+        configManager.flush()
+
+        benchmark = GuiBenchmark(getSyntheticResults(args.results, characters))
+
+        timings = {}
+        timings['startup'] = timeBenchmark(benchmark.openWindow,
+                                           args.repeat,
+                                           benchmark.closeWindow)
+        for methodName in ['listCharacters', 'processFiles', 'previewOutput']:
+            timings[methodName] = timeBenchmark(lambda: benchmark.showPanel(methodName),
+                                                args.repeat)
+        timings['listCharacters (changed)'] = timeBenchmark(lambda: benchmark.showPanel('listCharacters'),
+                                                            args.repeat,
+                                                            benchmark.changeRoster)
+        timings['results panel'] = timeBenchmark(benchmark.showResults, args.repeat)
+        timings['streamed results'] = timeBenchmark(benchmark.streamResults, args.repeat)
+        benchmark.closeWindow()
+
+        configManager.flush()
+    finally:
+        os.chdir(workingDir)
+        shutil.rmtree(scratchDir, ignore_errors=True)
+
+    return reportBenchmarks('gui',
+                            timings,
+                            {'characters': args.characters, 'results': args.results},
+                            args)
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,116 @@
+# Benchmark for the peak memory use of streaming a very large document through
+# the converter. Run from the top of the repository:
+#     python -m benchmarks.memorybench
+#     python -m benchmarks.memorybench --megabytes 50 --max-rss 150
+# A synthetic .docx file of the given size is written (uncompressed, so the
+# file is as big as its document XML), then converted in a child process, so
+# the peak resident set size measured is the conversion's alone. The run
+# fails if the peak is over --max-rss. Only works where the resource module
+# exists (Linux and macOS).
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import getDocxParagraphXml, getSyntheticCharacters, getSyntheticChatParagraphs, writeSyntheticDocx
+
+# Default size of the document (in megabytes), and the most memory (in
+# megabytes) converting it may use
+DEFAULT_MEGABYTES = 200
+DEFAULT_MAX_RSS_MEGABYTES = 160
+
+# Default number of characters in the roster
+DEFAULT_CHARACTERS = 20
+
+# Shape of the document: the prose paragraphs after each chat, and the
+# sentences in each (real chapters are mostly prose, which is also much
+# quicker to convert than chats)
+PROSE_PARAGRAPHS = 6
+PROSE_SENTENCES = 40
+
+# Function to get the peak resident set size of the finished child processes
+# Returns: float  The peak, in megabytes
+def getChildPeakRss():
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss is in bytes on macOS, and kilobytes everywhere else
+    if sys.platform == 'darwin':
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+# Function to write a synthetic document of (about) the given size
+# Parameters:
+#     path:        The path to write the document to
+#     megabytes:   The size of the document
+#     characters:  [] of Character  The characters sending messages
+def writeLargeDocument(path, megabytes, characters):
+    # Every chat is about the same size, so the number of chats needed can be
+    # worked out from the first
+    chatBytes = sum(len(getDocxParagraphXml(runs).encode('utf-8'))
+                    for runs in getSyntheticChatParagraphs(1, characters, PROSE_PARAGRAPHS, PROSE_SENTENCES))
+    chatCount = max(megabytes * 1024 * 1024 // chatBytes, 1)
+    writeSyntheticDocx(path,
+                       getSyntheticChatParagraphs(chatCount, characters, PROSE_PARAGRAPHS, PROSE_SENTENCES),
+                       compress=False)
+
+# Function to convert a document, in the child process
+# Parameters:
+#     inputPath:   The path of the document
+#     outputPath:  The path to write the output to
+#     characters:  The number of characters in the roster
+def convertDocument(inputPath, outputPath, characters):
+    from config.classes import CharacterRoster
+    from converter.ficfileconverter import processFile
+
+    roster = CharacterRoster.fromCharacters(getSyntheticCharacters(characters))
+    processFile(inputPath, roster, outfilePath=outputPath)
+
+# Function to run the memory benchmark
+# Parameters:
+#     argv:  The command line arguments (excluding the program name)
+# Returns: int  The exit code
+def main(argv):
+    parser = argparse.ArgumentParser(prog='memorybench',
+                                     description='Measure the peak memory use '
+                                                 'of streaming a very large '
+                                                 'document through the converter')
+    parser.add_argument('--megabytes', type=int, default=DEFAULT_MEGABYTES, metavar='N',
+                        help='Size of the document (default: %(default)s)')
+    parser.add_argument('--max-rss', type=float, default=DEFAULT_MAX_RSS_MEGABYTES, metavar='MB',
+                        help='Most memory the conversion may use, in '
+                             'megabytes (default: %(default)s)')
+    parser.add_argument('--characters', type=int, default=DEFAULT_CHARACTERS, metavar='N',
+                        help='Number of characters in the roster (default: '
+                             '%(default)s)')
+    parser.add_argument('--convert', nargs=2, metavar=('INPUT', 'OUTPUT'),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.convert:
+        convertDocument(args.convert[0], args.convert[1], args.characters)
+        return 0
+
+    with tempfile.TemporaryDirectory() as directory:
+        inputPath = os.path.join(directory, 'large.docx')
+        writeLargeDocument(inputPath, args.megabytes, getSyntheticCharacters(args.characters))
+        inputSize = os.path.getsize(inputPath) / (1024 * 1024)
+
+        startTime = time.perf_counter()
+        subprocess.run([sys.executable, '-m', 'benchmarks.memorybench',
+                        '--characters', str(args.characters),
+                        '--convert', inputPath, os.path.join(directory, 'large.html')],
+                       check=True)
+        seconds = time.perf_counter() - startTime
+
+    peakRss = getChildPeakRss()
+    print('Streamed a %.0fMB document in %.1fs, peak RSS %.0fMB (limit %.0fMB)' %
+          (inputSize, seconds, peakRss, args.max_rss))
+    if peakRss > args.max_rss:
+        print('Peak memory use is over the limit')
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
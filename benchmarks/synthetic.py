@@ -0,0 +1,115 @@
+import zipfile
+from xml.sax.saxutils import escape
+
+from config.classes import Character
+from common.definitions import getAutoColors
+
+# The fixed parts of a minimal .docx file: its content types and the
+# relationship pointing at the main document part
+DOCX_CONTENT_TYPES = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                      '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                      '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                      '<Default Extension="xml" ContentType="application/xml"/>'
+                      '<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+                      '</Types>')
+DOCX_RELATIONSHIPS = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                      '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                      '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>'
+                      '</Relationships>')
+DOCX_DOCUMENT_START = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                       '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+                       '<w:body>')
+DOCX_DOCUMENT_END = '</w:body></w:document>'
+
+# Function to make a set of synthetic characters, with distinct names and
+# colors
+# Parameters:
+#     count:  The number of characters
+# Returns: [] of Character
+def getSyntheticCharacters(count):
+    return [Character('character' + str(number),
+                      color,
+                      aliases=['Alias ' + str(number)])
+            for number, color in enumerate(getAutoColors(count))]
+
+# Function to make a synthetic document, as HTML in the form produced by
+# mammoth: chats between the given characters, with prose in between
+# Parameters:
+#     chatCount:   The number of chats
+#     characters:  [] of Character  The characters sending messages
+# Returns: str
+def getSyntheticChatHtml(chatCount, characters):
+    parts = ['<p>Chapter intro paragraph with some prose.</p>']
+    for chatNumber in range(chatCount):
+        parts.append('<p>||| Chat %d</p>' % chatNumber)
+        for messageNumber in range(8):
+            character = characters[(chatNumber + messageNumber) % len(characters)]
+            parts.append('<p>%s: Message %d of chat <em>%d</em></p>' % (character.getDisplayName(),
+                                                                         messageNumber,
+                                                                         chatNumber))
+        parts.append('<p>/// Someone joined the chat</p>')
+        parts.append('<p>|||</p>')
+        parts.append('<p>Some prose between chats.</p>')
+    return ''.join(parts)
+
+# Function to make the paragraphs of a synthetic document: chats between the
+# given characters, with prose in between. Each paragraph is a list of runs,
+# each run a (text, bold, italic) tuple - or None for a line break.
+# Parameters:
+#     chatCount:        The number of chats
+#     characters:       [] of Character  The characters sending messages
+#     proseParagraphs:  The number of prose paragraphs after each chat
+#                       (optional)
+#     proseSentences:   The number of sentences in each prose paragraph
+#                       (optional)
+# Returns: generator of [] of tuple
+def getSyntheticChatParagraphs(chatCount, characters, proseParagraphs=1, proseSentences=1):
+    prose = ' '.join(['Some prose between chats.'] * proseSentences)
+    yield [('Chapter intro paragraph with some prose.', False, False)]
+    for chatNumber in range(chatCount):
+        yield [('||| Chat %d' % chatNumber, False, False)]
+        for messageNumber in range(8):
+            character = characters[(chatNumber + messageNumber) % len(characters)]
+            yield [('%s: Message %d of chat ' % (character.getDisplayName(), messageNumber), False, False),
+                   (str(chatNumber), False, True)]
+        yield [('/// Someone joined the chat', False, False)]
+        yield [('|||', False, False)]
+        for paragraphNumber in range(proseParagraphs):
+            yield [(prose, False, False)]
+
+# Function to get the document XML for a paragraph of a synthetic .docx file
+# Parameters:
+#     runs:  [] of (str, boolean, boolean)  The paragraph's runs (see
+#            getSyntheticChatParagraphs)
+# Returns: str
+def getDocxParagraphXml(runs):
+    parts = ['<w:p>']
+    for run in runs:
+        if run is None:
+            parts.append('<w:r><w:br/></w:r>')
+            continue
+        text, bold, italic = run
+        properties = ('<w:b/>' if bold else '') + ('<w:i/>' if italic else '')
+        parts.append('<w:r>' + ('<w:rPr>' + properties + '</w:rPr>' if properties else '') +
+                     '<w:t xml:space="preserve">' + escape(text) + '</w:t></w:r>')
+    parts.append('</w:p>')
+    return ''.join(parts)
+
+# Function to write a synthetic .docx file. Paragraphs are written as they're
+# generated, so documents far bigger than memory can be made.
+# Parameters:
+#     path:        The path to write the file to
+#     paragraphs:  Iterable of [] of runs  The document's paragraphs (see
+#                  getSyntheticChatParagraphs)
+#     compress:    Whether to compress the document XML (optional - if not,
+#                  the file is as big as its XML)
+def writeSyntheticDocx(path, paragraphs, compress=True):
+    compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    with zipfile.ZipFile(path, 'w', compression) as docxZip:
+        docxZip.writestr('[Content_Types].xml', DOCX_CONTENT_TYPES)
+        docxZip.writestr('_rels/.rels', DOCX_RELATIONSHIPS)
+        with docxZip.open('word/document.xml', 'w', force_zip64=True) as documentFile:
+            documentFile.write(DOCX_DOCUMENT_START.encode('utf-8'))
+            for runs in paragraphs:
+                documentFile.write(getDocxParagraphXml(runs).encode('utf-8'))
+            documentFile.write(DOCX_DOCUMENT_END.encode('utf-8'))
@@ -0,0 +1,456 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from common.fileio import writeFileAtomic
+from config.manager import generateCss, generateWorkSkin
+from converter.batch import MERGED_SUMMARY_PATH, SHARD_SUMMARY_TEMPLATE, STATUS_OK, convertFiles, countOutputsWritten, findOutputCollisions, mergeBatchSummaries, parseShard, selectShard, writeBatchSummary
+from converter.formats import FORMAT_HTML, OUTPUT_FORMATS
+from converter.messageindex import DEFAULT_SEARCH_LIMIT, MessageIndex
+from converter.prefetch import DEFAULT_READ_AHEAD, DEFAULT_READ_THREADS
+from converter.profiling import ProfileOptions
+from converter.project import MANIFEST_FILE_NAME, buildProject
+from converter.tracing import startTracing, stopTracing, writeTrace
+from converter.transforms import loadPluginStages
+
+# Function to print a message to stderr (used for warnings and errors, so that
+# stdout only contains results)
+# Parameters:
+#     line:  The message to print
+def printError(line):
+    print(line, file=sys.stderr)
+
+# Function to show the progress of a file on stderr, overwriting the previous
+# progress line
+# Parameters:
+#     fileNumber:   The number of the file in the batch
+#     fileCount:    The number of files in the batch
+#     blocksDone:   The number of blocks of the file converted so far
+#     blocksTotal:  The number of blocks in the file
+#     bytesRead:    The number of bytes of the file read so far
+def printProgress(fileNumber, fileCount, blocksDone, blocksTotal, bytesRead):
+    sys.stderr.write('\r[' + str(fileNumber + 1) + '/' + str(fileCount) + '] ' +
+                     str(blocksDone) + '/' + str(blocksTotal) + ' blocks, ' +
+                     str(bytesRead) + ' bytes read')
+    if blocksDone == blocksTotal:
+        sys.stderr.write('\r\033[K')
+    sys.stderr.flush()
+
+# Function to print the paths of the profiling reports written for a file
+# Parameters:
+#     result:  The file's ConversionResult
+def printReports(result):
+    for reportPath in result.reportPaths:
+        print('  Profile written to ' + reportPath)
+
+# Function to parse a --shard option
+# Parameters:
+#     text:  The option's value
+# Returns: (int, int)  The shard index and number of shards
+def getShardArgument(text):
+    try:
+        return parseShard(text)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error))
+
+# Function to run the 'convert' command: process the given files, reporting
+# the output file and any unknown characters for each, then generate the
+# stylesheet
+# Parameters:
+#     args:  The parsed command line arguments
+# Returns: int  The exit code
+def runConvert(args):
+    allSenders = set()
+    results = []
+    stallSeconds = 0.0
+    exitCode = 0
+
+    # Only show progress when someone's watching
+    progress = None
+    if args.progress or (args.progress is None and sys.stderr.isatty()):
+        progress = printProgress
+
+    # Load any plugins up front, so a missing one is reported once rather
+    # than for every file
+    try:
+        loadPluginStages(args.plugins or [])
+    except (ImportError, ValueError) as error:
+        printError('Plugin could not be loaded: ' + str(error))
+        return 1
+
+    # Files whose outputs would overwrite each other (and which would always
+    # be put in the same shard) are reported before anything is converted.
+    # The whole batch is checked, so every shard gives the same answer.
+    collisions = findOutputCollisions(args.files)
+    for group in collisions:
+        printError('Files would be written to the same output: ' + ', '.join(group))
+    if collisions:
+        return 1
+
+    index = None
+    if args.index:
+        try:
+            index = MessageIndex(args.index)
+        except sqlite3.Error as error:
+            printError('Message index could not be opened: ' + str(error))
+            return 1
+
+    if args.trace:
+        startTracing()
+
+    # Only convert this host's share of the files, if the batch is sharded
+    files = args.files
+    summaryPath = args.summary
+    if args.shard:
+        files = selectShard(files, *args.shard)
+        if summaryPath is None:
+            summaryPath = SHARD_SUMMARY_TEMPLATE.format(index=args.shard[0],
+                                                        count=args.shard[1])
+        print('Shard ' + str(args.shard[0]) + '/' + str(args.shard[1]) + ': ' +
+              str(len(files)) + ' of ' + str(len(args.files)) + ' files')
+
+    for result in convertFiles(files,
+                               progress=progress,
+                               readAhead=args.read_ahead,
+                               readThreads=args.read_threads,
+                               profile=ProfileOptions(args.profile, args.memprofile),
+                               formats=args.formats,
+                               plugins=args.plugins,
+                               index=index,
+                               work=args.work):
+        results.append(result)
+        stallSeconds += result.stallSeconds
+        if not result.succeeded():
+            printError('File failed to process: ' +
+                       os.path.basename(result.filename) + ' (' +
+                       result.error + ')')
+            printReports(result)
+            exitCode = 1
+            continue
+
+        allSenders.update(result.characters)
+        print('File processed successfully: ' +
+              os.path.basename(result.filename) + ' -> ' + result.outfilePath +
+              ' (' + str(result.outputSize) + ' bytes, ' +
+              '%.2f' % result.seconds + 's)')
+
+        if result.unknownCharacters:
+            printError('  File contained unknown characters: ' +
+                       ', '.join(result.unknownCharacters))
+        printReports(result)
+
+    written, skipped = countOutputsWritten(results)
+    print(str(written) + ' files written, ' + str(skipped) +
+          ' files unchanged')
+
+    if summaryPath:
+        writeBatchSummary(summaryPath, results, args.shard)
+        print('Summary written to ' + summaryPath)
+
+    # Report how long conversion was held up waiting for files to be read - if
+    # this is high, more read threads or a bigger read-ahead may help
+    print('Waited %.2fs for files to be read' % stallSeconds)
+
+    if index is not None:
+        index.close()
+        print('Messages indexed in ' + args.index)
+
+    if args.trace:
+        writeTrace(args.trace, stopTracing())
+        print('Trace written to ' + args.trace)
+
+    generateCss()
+
+    if args.minimal_skin:
+        path, fullSize, skinSize = generateWorkSkin(allSenders,
+                                                    not args.no_minify)
+        print('Work skin written to ' + path + ': ' + str(fullSize) +
+              ' bytes -> ' + str(skinSize) + ' bytes')
+
+    return exitCode
+
+# Function to run the 'merge' command: combine the summaries written by the
+# shards of a batch, and write one work skin for all of their characters
+# Parameters:
+#     args:  The parsed command line arguments
+# Returns: int  The exit code
+def runMerge(args):
+    try:
+        summary, missingShards = mergeBatchSummaries(args.summaries)
+    except (OSError, ValueError, KeyError) as error:
+        printError('Summaries could not be merged: ' + str(error))
+        return 1
+
+    if missingShards:
+        printError('Summaries are missing for shards: ' +
+                   ', '.join(str(index) for index in missingShards))
+
+    failures = [entry for entry in summary['files'] if entry['status'] != STATUS_OK]
+    for entry in failures:
+        printError('File failed to process: ' + entry['file'] + ' (' +
+                   str(entry['error']) + ')')
+
+    writeFileAtomic(args.output, json.dumps(summary, indent=1))
+    print(str(len(summary['files'])) + ' files (' + str(len(failures)) +
+          ' failed), ' + '%.2f' % summary['seconds'] + 's in total')
+    print('Merged summary written to ' + args.output)
+
+    generateCss()
+    path, fullSize, skinSize = generateWorkSkin(summary['senders'],
+                                                not args.no_minify)
+    print('Work skin written to ' + path + ': ' + str(fullSize) +
+          ' bytes -> ' + str(skinSize) + ' bytes')
+
+    return 1 if failures or missingShards else 0
+
+# Function to run the 'build' command: convert the inputs of a project whose
+# outputs are missing or out of date, and update its work skins
+# Parameters:
+#     args:  The parsed command line arguments
+# Returns: int  The exit code
+def runBuild(args):
+    if not os.path.isfile(args.manifest):
+        printError('Project manifest not found: ' + args.manifest)
+        return 1
+
+    if args.trace:
+        startTracing()
+
+    startTime = time.perf_counter()
+    try:
+        report = buildProject(args.manifest, args.jobs, args.force, args.index)
+    except (OSError, ImportError, ValueError, KeyError, sqlite3.Error) as error:
+        printError('Project could not be built: ' + str(error))
+        return 1
+    finally:
+        if args.trace:
+            writeTrace(args.trace, stopTracing())
+
+    for inputPath, outputPath in report.built:
+        print('Built ' + outputPath + ' from ' + inputPath)
+    for skinPath in report.skinsWritten:
+        print('Work skin written to ' + skinPath)
+    for inputPath, error in report.failed:
+        printError('File failed to process: ' + inputPath + ' (' + error + ')')
+
+    print(str(len(report.built)) + ' built, ' + str(report.upToDate) +
+          ' up to date, ' + str(len(report.failed)) + ' failed (' +
+          '%.2f' % (time.perf_counter() - startTime) + 's)')
+    if args.trace:
+        print('Trace written to ' + args.trace)
+    if args.index:
+        print('Messages indexed in ' + args.index)
+
+    return 1 if report.failed else 0
+
+# Function to run the 'search' command: find messages in a message index (by
+# their words, sender and/ or work), or count each character's messages
+# Parameters:
+#     args:  The parsed command line arguments
+# Returns: int  The exit code
+def runSearch(args):
+    if not os.path.isfile(args.index):
+        printError('Message index not found: ' + args.index)
+        return 1
+
+    startTime = time.perf_counter()
+    try:
+        with MessageIndex(args.index) as index:
+            if args.counts:
+                counts = index.countMessages(args.text, args.work)
+            else:
+                messages = index.search(args.text, args.sender, args.work, args.limit)
+    except sqlite3.Error as error:
+        printError('Message index could not be searched: ' + str(error))
+        return 1
+    milliseconds = (time.perf_counter() - startTime) * 1000
+
+    if args.counts:
+        for character, count in counts:
+            print(str(count).rjust(8) + '  ' + character)
+        print(str(len(counts)) + ' characters (%.1fms)' % milliseconds)
+        return 0
+
+    for message in messages:
+        print(message.work + ':' + os.path.basename(message.chapter) + ':' +
+              str(message.block) + ':' + str(message.position) + ' ' +
+              message.sender + ': ' + message.text.replace('\n', ' / '))
+    print(str(len(messages)) + ' messages (%.1fms)' % milliseconds)
+    return 0
+
+# Function to build the command line argument parser
+# Returns: argparse.ArgumentParser
+def getArgumentParser():
+    parser = argparse.ArgumentParser(
+        prog='textficwizard',
+        description='Convert texting fics for AO3. Run without arguments to '
+                    'open the GUI.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    convertParser = subparsers.add_parser('convert',
+                                          help='Convert .docx, .odt or exported .html files')
+    convertParser.add_argument('files', nargs='+', help='Files to convert')
+    convertParser.add_argument('--minimal-skin',
+                               action='store_true',
+                               help='Also write a size-optimized work skin '
+                                    'containing only the characters used in '
+                                    'these files')
+    convertParser.add_argument('--no-minify',
+                               action='store_true',
+                               help="Don't minify the size-optimized work skin")
+    convertParser.add_argument('--format',
+                               dest='formats',
+                               action='append',
+                               choices=OUTPUT_FORMATS,
+                               help='Output format - AO3 HTML, EPUB (with the '
+                                    'work skin embedded) or plain text. Repeat '
+                                    'to write several formats from one '
+                                    'conversion (default: ' + FORMAT_HTML + ')')
+    convertParser.add_argument('--plugin',
+                               dest='plugins',
+                               action='append',
+                               metavar='MODULE',
+                               help='Python module adding stages to the chat '
+                                    'transform (e.g. timestamps or read '
+                                    'receipts). Repeat to use several plugins')
+    convertParser.add_argument('--index',
+                               metavar='FILE',
+                               help="Record the files' messages in the message "
+                                    'index FILE (created if necessary), for '
+                                    'the search command')
+    convertParser.add_argument('--work',
+                               default='',
+                               metavar='NAME',
+                               help='Name of the work to record the files '
+                                    'under in the message index')
+    convertParser.add_argument('--read-ahead',
+                               type=int,
+                               default=DEFAULT_READ_AHEAD,
+                               metavar='N',
+                               help='Number of files to read ahead of the one '
+                                    'being converted (default: %(default)s)')
+    convertParser.add_argument('--read-threads',
+                               type=int,
+                               default=DEFAULT_READ_THREADS,
+                               metavar='N',
+                               help='Number of threads to read files with, or 0 '
+                                    'to read each file only when it is needed '
+                                    '(default: %(default)s)')
+    convertParser.add_argument('--profile',
+                               action='store_true',
+                               help='Profile where time goes converting each '
+                                    'file, writing cProfile stats next to its '
+                                    'output (FILE.html.pstats)')
+    convertParser.add_argument('--memprofile',
+                               action='store_true',
+                               help='Profile memory use converting each file, '
+                                    'writing a report of peak memory and top '
+                                    'allocations next to its output '
+                                    '(FILE.html.memory.txt)')
+    convertParser.add_argument('--trace',
+                               metavar='FILE',
+                               help='Record where time goes in the conversion '
+                                    'and write it to FILE as a Chrome trace '
+                                    '(viewable in Perfetto or chrome://tracing)')
+    convertParser.add_argument('--shard',
+                               type=getShardArgument,
+                               metavar='i/N',
+                               help='Only convert the i-th of N shards of the '
+                                    'files (for spreading a batch across '
+                                    'several hosts)')
+    convertParser.add_argument('--summary',
+                               metavar='FILE',
+                               help='Write a JSON summary of the results '
+                                    '(default with --shard: '
+                                    'output/summary-i-of-N.json)')
+    convertParser.add_argument('--progress',
+                               action='store_true',
+                               default=None,
+                               help='Show progress on stderr (the default when '
+                                    'stderr is a terminal)')
+    convertParser.add_argument('--no-progress',
+                               action='store_false',
+                               dest='progress',
+                               help="Don't show progress")
+    convertParser.set_defaults(function=runConvert)
+
+    mergeParser = subparsers.add_parser('merge',
+                                        help='Combine the summaries of a sharded '
+                                             'batch and write its work skin')
+    mergeParser.add_argument('summaries', nargs='+', help='Shard summaries')
+    mergeParser.add_argument('--output',
+                             default=MERGED_SUMMARY_PATH,
+                             metavar='FILE',
+                             help='Merged summary (default: %(default)s)')
+    mergeParser.add_argument('--no-minify',
+                             action='store_true',
+                             help="Don't minify the work skin")
+    mergeParser.set_defaults(function=runMerge)
+
+    buildParser = subparsers.add_parser('build',
+                                        help='Convert the chapters of a project '
+                                             'which have changed since the last '
+                                             'build')
+    buildParser.add_argument('manifest',
+                             nargs='?',
+                             default=MANIFEST_FILE_NAME,
+                             help='Project manifest (default: %(default)s)')
+    buildParser.add_argument('--jobs', '-j',
+                             type=int,
+                             default=None,
+                             metavar='N',
+                             help='Number of files to convert at once (default: '
+                                  'one per CPU)')
+    buildParser.add_argument('--force',
+                             action='store_true',
+                             help='Rebuild everything, even if it is up to date')
+    buildParser.add_argument('--trace',
+                             metavar='FILE',
+                             help='Record where time goes across the worker '
+                                  'processes and write it to FILE as a Chrome '
+                                  'trace (viewable in Perfetto or '
+                                  'chrome://tracing)')
+    buildParser.add_argument('--index',
+                             metavar='FILE',
+                             help="Keep the message index FILE up to date with "
+                                  "the project's chapters, for the search "
+                                  'command')
+    buildParser.set_defaults(function=runBuild)
+
+    searchParser = subparsers.add_parser('search',
+                                         help='Find messages in a message index')
+    searchParser.add_argument('index', help='Message index')
+    searchParser.add_argument('text',
+                              nargs='?',
+                              help='Words the messages must all contain')
+    searchParser.add_argument('--sender',
+                              metavar='NAME',
+                              help='Only find messages sent by this character '
+                                   '(by name or alias)')
+    searchParser.add_argument('--work',
+                              metavar='NAME',
+                              help='Only find messages in this work')
+    searchParser.add_argument('--counts',
+                              action='store_true',
+                              help='Count the messages each character sent, '
+                                   'instead of listing them')
+    searchParser.add_argument('--limit',
+                              type=int,
+                              default=DEFAULT_SEARCH_LIMIT,
+                              metavar='N',
+                              help='Maximum number of messages to list '
+                                   '(default: %(default)s)')
+    searchParser.set_defaults(function=runSearch)
+
+    return parser
+
+# Function to run the command line interface
+# Parameters:
+#     argv:  The command line arguments (excluding the program name)
+# Returns: int  The exit code
+def runCommandLine(argv):
+    args = getArgumentParser().parse_args(argv)
+    return args.function(args)
@@ -1,3 +1,4 @@
+import colorsys
 import re
 
 URGENCY_MESSAGE = 0
@@ -6,6 +7,11 @@ URGENCY_WARN = 2
 
 OUTPUT_DIR = 'output'
 CSS_FILE_NAME = 'style.css'
+WORK_SKIN_FILE_NAME = 'workskin.css'
+
+# Extensions of the documents which can be converted
+DOCUMENT_EXTENSIONS = ['.docx', '.odt', '.html', '.htm']
+DOCUMENT_FILE_FILTER = 'Documents (' + ' '.join('*' + extension for extension in DOCUMENT_EXTENSIONS) + ')'
 
 HEX_COLOR_REGEX = re.compile('^#[0-9A-Fa-f]{3}|#[0-9A-Fa-f]{6}$')
 
@@ -27,6 +33,33 @@ CSS_CHARACTER_CLASSES = """
 }
 """
     
+# Rules for characters in the size-optimized work skin, in which characters
+# sharing the same colors share a single rule. CHARACTER_SELECTORS is replaced
+# with the list of selectors built from the given template, one per character.
+CSS_SHARED_MESSAGE_CLASS = """
+CHARACTER_SELECTORS
+{
+  background: CHARACTER_COLOR;
+  color: CHARACTER_FONT;
+}
+"""
+
+CSS_SHARED_TAIL_CLASSES = """
+CHARACTER_SELECTORS
+{
+  border-right: 0.5em solid CHARACTER_COLOR;
+}
+
+GROUP_LEADER_SELECTORS
+{
+  border-left: 0.5em solid CHARACTER_COLOR;
+}
+"""
+
+CSS_MESSAGE_SELECTOR = '.CHARACTER_NAME .message'
+CSS_TAIL_SELECTOR = '.CHARACTER_NAME .bottom-text::after'
+CSS_GROUP_LEADER_TAIL_SELECTOR = '.group-leader.CHARACTER_NAME .bottom-text::after'
+
 BASE_CSS_CLASSES = """
 .hide
 {
@@ -151,4 +184,30 @@ def getContrastColor(color):
     except ValueError:
         fontColor = '#000000'
         
-    return fontColor
\ No newline at end of file
+    return fontColor
+
+# Function to pick a set of bubble colors which are easy to tell apart, for
+# characters that haven't been given one. Hues are spread around the color
+# wheel using the golden angle, skipping any colors already in use.
+# Parameters:
+#     count:           The number of colors needed
+#     existingColors:  Colors which are already taken (optional)
+# Returns: [] of str  Hex color strings
+def getAutoColors(count, existingColors=()):
+    existingColors = set(color.lower() for color in existingColors)
+    colors = []
+    step = 0
+    while len(colors) < count:
+        hue = (step * 0.381966) % 1.0
+        # Alternate the lightness a little so neighbouring hues differ more
+        lightness = 0.45 if step % 2 else 0.6
+        red, green, blue = colorsys.hls_to_rgb(hue, lightness, 0.65)
+        color = '#%02x%02x%02x' % (round(red * 255),
+                                   round(green * 255),
+                                   round(blue * 255))
+        if color not in existingColors:
+            colors.append(color)
+            existingColors.add(color)
+        step += 1
+
+    return colors
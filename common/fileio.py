@@ -0,0 +1,155 @@
+import hashlib
+import os
+import tempfile
+
+# Size of the pieces files are read in when hashing them
+HASH_READ_SIZE = 1024 * 1024
+
+# Details (content hash, modification time and size) of files written or
+# checked by AtomicOutputFile, so that unchanged files can be skipped without
+# reading them back
+writtenFiles = {}
+
+# Class representing an output file which is written atomically: content is
+# written to a temporary file in the same directory, which then replaces the
+# target in a single rename - so a crash (or an error generating the content)
+# part-way through can never leave a truncated file behind. If the content
+# turns out to be the same as what's already there, the target is left alone
+# (so its modification time doesn't change).
+# Used as a context manager:
+#     with AtomicOutputFile(path) as outputFile:
+#         outputFile.write(content)
+#     outputFile.changed  # Whether the target was written
+class AtomicOutputFile():
+    # Constructor
+    # Parameters:
+    #     path:           The path of the file to write
+    #     binary:         Whether to write bytes rather than text (optional)
+    #     onlyIfChanged:  Whether to leave the target alone if its content
+    #                     hasn't changed (optional)
+    def __init__(self, path, binary=False, onlyIfChanged=True):
+        self.path = path
+        self.binary = binary
+        self.onlyIfChanged = onlyIfChanged
+        self.changed = False
+        self.tempFile = None
+        self.tempPath = None
+        self.digest = hashlib.sha1()
+
+    def __enter__(self):
+        directory = os.path.dirname(self.path) or '.'
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        handle, self.tempPath = tempfile.mkstemp(dir=directory,
+                                                 prefix='.' + os.path.basename(self.path),
+                                                 suffix='.tmp')
+        try:
+            # Keep the permissions of the file being replaced (mkstemp creates
+            # files readable only by their owner)
+            if os.path.exists(self.path):
+                os.chmod(self.tempPath, os.stat(self.path).st_mode & 0o777)
+            else:
+                os.chmod(self.tempPath, 0o644)
+
+            self.tempFile = os.fdopen(handle, 'wb' if self.binary else 'w')
+        except BaseException:
+            os.close(handle)
+            os.remove(self.tempPath)
+            raise
+
+        return self
+
+    # Method to write some content to the file
+    # Parameters:
+    #     content:  The content (str, or bytes for a binary file)
+    def write(self, content):
+        self.tempFile.write(content)
+        self.digest.update(content if self.binary else content.encode('utf-8'))
+
+    def __exit__(self, excType, excValue, traceback):
+        try:
+            if excType is None:
+                self.finish()
+        finally:
+            if not self.tempFile.closed:
+                self.tempFile.close()
+            if os.path.exists(self.tempPath):
+                os.remove(self.tempPath)
+
+        return False
+
+    # Method to replace the target with the temporary file, if the content has
+    # changed
+    def finish(self):
+        digest = self.digest.hexdigest()
+        if self.onlyIfChanged and getFileDigest(self.path, self.binary) == digest:
+            return
+
+        self.tempFile.flush()
+        os.fsync(self.tempFile.fileno())
+        self.tempFile.close()
+        os.replace(self.tempPath, self.path)
+        self.changed = True
+
+        stat = os.stat(self.path)
+        writtenFiles[self.path] = (digest, stat.st_mtime_ns, stat.st_size)
+
+# Function to get the hash of a file's content, as AtomicOutputFile would
+# calculate it. Files written (or hashed) before are only read again if
+# they've been modified since.
+# Parameters:
+#     path:    The path of the file
+#     binary:  Whether to hash the file's bytes rather than its text
+# Returns: str  The hash, or None if the file doesn't exist
+def getFileDigest(path, binary):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    fileDetails = (stat.st_mtime_ns, stat.st_size)
+    written = writtenFiles.get(path)
+    if written and written[1:] == fileDetails:
+        return written[0]
+
+    digest = hashlib.sha1()
+    with open(path, 'rb' if binary else 'r') as existingFile:
+        for piece in iter(lambda: existingFile.read(HASH_READ_SIZE), b'' if binary else ''):
+            digest.update(piece if binary else piece.encode('utf-8'))
+
+    writtenFiles[path] = (digest.hexdigest(),) + fileDetails
+    return digest.hexdigest()
+
+# Function to write content to a file atomically (see AtomicOutputFile)
+# Parameters:
+#     path:           The path of the file to write
+#     content:        The content to write (str, or bytes for a binary
+#                     write), or an iterable of str to write one piece at a
+#                     time
+#     onlyIfChanged:  Whether to leave the file alone if its content hasn't
+#                     changed (optional)
+# Returns: boolean  Whether the file was written
+def writeFileAtomic(path, content, onlyIfChanged=False):
+    if isinstance(content, (str, bytes)):
+        content = [content]
+        binary = isinstance(content[0], bytes)
+    else:
+        binary = False
+
+    with AtomicOutputFile(path, binary, onlyIfChanged) as outputFile:
+        for piece in content:
+            outputFile.write(piece)
+
+    return outputFile.changed
+
+# Function to write content to a file (atomically) only if it differs from
+# what's already there, so that the file's modification time is left alone
+# when nothing has changed
+# Parameters:
+#     path:     The path of the file to write
+#     content:  The content to write (str), or an iterable of str to write
+#               one piece at a time
+# Returns: boolean  Whether the file was written
+def writeFileIfChanged(path, content):
+    return writeFileAtomic(path, content, True)
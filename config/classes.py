@@ -1,3 +1,4 @@
+import hashlib
 import re
 
 from common.definitions import getContrastColor, HEX_COLOR_REGEX
@@ -6,14 +7,32 @@ from common.definitions import getContrastColor, HEX_COLOR_REGEX
 CHARACTER_NAME_REGEX = re.compile('^[a-z0-9]+$')
 CHARACTER_PRETTY_NAME_REGEX = re.compile('^[a-z0-9]+$')
 
-# Class representing a character's config
+# Aliases can contain any characters (including spaces and non-Latin letters),
+# except for the ": " separator between sender and message, and line breaks
+CHARACTER_ALIAS_REGEX = re.compile('^[^:\\s](?:[^:\\n]*[^:\\s])?$')
+
+# Function to normalise a name or alias for case-insensitive lookups. This is
+# done character-by-character, so that it gives the same result as walking a
+# line of text one character at a time (see SenderMatcher).
+# Parameters:
+#     name:  The name to normalise
+# Returns: str
+def normaliseName(name):
+    return ''.join(char.lower() for char in name)
+
+# Class representing a character's config. Character objects are immutable (so
+# that they can be cached and shared between threads), and use __slots__ to
+# keep large rosters compact.
 class Character():
+    __slots__ = ('name', 'color', 'fontColor', 'aliases')
+
     # Constructor
     # Parameters: 
     #     name:       The name of the character
     #     color:      The character's text bubble background color
     #     fontColor:  The character's text bubble font color (optional)
-    def __init__(self, name, color, fontColor=None):
+    #     aliases:    Other names used by the character in messages (optional)
+    def __init__(self, name, color, fontColor=None, aliases=()):
         # Primary names are lowercase
         name = name.lower()
         
@@ -21,16 +40,67 @@ class Character():
         # for contrast (black or white)
         if not fontColor:
             fontColor = getContrastColor(color)
+
+        # Tidy up the aliases, dropping blanks and duplicates of the name
+        cleanAliases = []
+        seenNames = set([normaliseName(name)])
+        for alias in aliases:
+            alias = ' '.join(alias.split())
+            if alias and normaliseName(alias) not in seenNames:
+                seenNames.add(normaliseName(alias))
+                cleanAliases.append(alias)
             
-        # Save the variables
-        self.name = name
-        self.color = color
-        self.fontColor = fontColor
+        # Save the variables (bypassing our own read-only __setattr__)
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, 'color', color)
+        object.__setattr__(self, 'fontColor', fontColor)
+        object.__setattr__(self, 'aliases', tuple(cleanAliases))
+
+    # Characters are read-only once constructed
+    def __setattr__(self, key, value):
+        raise AttributeError('Character objects are immutable')
+
+    def __delattr__(self, key):
+        raise AttributeError('Character objects are immutable')
+
+    # Rebuild from constructor arguments when pickled (e.g. when sent to a
+    # worker process as part of a CharacterRoster)
+    def __reduce__(self):
+        return (Character, self.toTuple())
+
+    def __eq__(self, other):
+        if not isinstance(other, Character):
+            return NotImplemented
+        return self.toTuple() == other.toTuple()
+
+    def __hash__(self):
+        return hash(self.toTuple())
+
+    def __repr__(self):
+        return 'Character(%r, %r, %r, %r)' % self.toTuple()
+
+    # Method to get a tuple of the character's config values
+    # Returns: tuple
+    def toTuple(self):
+        return (self.name, self.color, self.fontColor, self.aliases)
+
+    # Method to get the config values which affect the generated CSS
+    # Returns: tuple
+    def getCssKey(self):
+        return (self.name, self.color, self.fontColor)
+
+    # Method to get all of the names the character can send messages under
+    # Returns: [] of str
+    def getAllNames(self):
+        return [self.name] + list(self.aliases)
     
     # Method to get a dictionary containing the character config
     # Returns: dict
     def toDict(self):
-        return self.__dict__
+        return {'name': self.name,
+                'color': self.color,
+                'fontColor': self.fontColor,
+                'aliases': list(self.aliases)}
         
     # Method to get the pretty display name of the character
     # Returns: str
@@ -46,10 +116,142 @@ class Character():
             valid = False        
         elif not HEX_COLOR_REGEX.fullmatch(self.color):
             valid = False
+        elif self.fontColor and not HEX_COLOR_REGEX.fullmatch(self.fontColor):
+            valid = False
+        elif not all(CHARACTER_ALIAS_REGEX.fullmatch(alias)
+                     for alias in self.aliases):
+            valid = False
         
         return valid
         
     # Static method to get a Character object from the values in the given dict
     # Returns: Character
     def fromDict(dict):
-        return Character(dict['name'], dict['color'], dict['fontColor'])
\ No newline at end of file
+        return Character(dict['name'],
+                         dict['color'],
+                         dict['fontColor'],
+                         dict.get('aliases', ()))
+
+# Class representing a read-only snapshot of the configured characters, indexed
+# by (lowercase) name and alias. Snapshots are never modified after construction, so they
+# can be handed to worker threads as-is, and pickled cheaply for worker
+# processes.
+class CharacterRoster():
+    # Constructor
+    # Parameters:
+    #     characters:  dict of lowercase name -> Character (taken as-is - the
+    #                  caller must not modify it afterwards)
+    #     version:     The version counter of the config this was taken from
+    def __init__(self, characters=None, version=0):
+        self._characters = characters if characters is not None else {}
+        self.version = version
+
+        # Index of normalised aliases -> character, and digest of the roster's
+        # content, both built on first use
+        self._aliases = None
+        self._digest = None
+
+    def __len__(self):
+        return len(self._characters)
+
+    def __contains__(self, name):
+        return self.getCharacter(name) is not None
+
+    def __iter__(self):
+        return iter(self._characters.values())
+
+    # Method to list all characters in the roster
+    # Returns: [] of Characters
+    def listCharacters(self):
+        return list(self._characters.values())
+
+    # Method to get a particular character by name or alias
+    # Parameters:
+    #     name:  The character's name or one of its aliases (any case)
+    # Returns: Character (or None if the character isn't in the roster)
+    def getCharacter(self, name):
+        character = self._characters.get(name.lower())
+        if character is None:
+            character = self.getAliasIndex().get(normaliseName(name))
+        return character
+
+    # Method to get the index of all names and aliases (normalised) to the
+    # characters they belong to. If two characters share an alias, the first
+    # one configured wins.
+    # Returns: dict of str -> Character
+    def getAliasIndex(self):
+        if self._aliases is None:
+            aliases = {}
+            for character in self._characters.values():
+                for alias in character.getAllNames():
+                    aliases.setdefault(normaliseName(alias), character)
+            self._aliases = aliases
+        return self._aliases
+
+    # Method to get a digest (hash) of the roster's content. Unlike the
+    # version counter, this is the same for two rosters with the same
+    # characters, even in different processes.
+    # Returns: str
+    def getDigest(self):
+        if self._digest is None:
+            content = repr([character.toTuple()
+                            for character in self._characters.values()])
+            self._digest = hashlib.sha1(content.encode('utf-8')).hexdigest()
+        return self._digest
+
+    # Method to split a collection of sender names into known and unknown
+    # characters, preserving the order in which they were given
+    # Parameters:
+    #     senders:  Iterable of sender names (as they appear in the document)
+    # Returns: ([] of str, [] of str)  The known and unknown sender names
+    def classify(self, senders):
+        known = []
+        unknown = []
+        for sender in senders:
+            if self.getCharacter(sender):
+                known.append(sender)
+            else:
+                unknown.append(sender)
+        return known, unknown
+
+    # Method to get a copy of this roster with the given characters added (or
+    # replaced) and removed
+    # Parameters:
+    #     added:    Iterable of Characters to add/ replace
+    #     removed:  Iterable of names of characters to remove
+    # Returns: CharacterRoster
+    def evolve(self, added=(), removed=()):
+        characters = dict(self._characters)
+        for name in removed:
+            characters.pop(name.lower(), None)
+        for character in added:
+            characters[character.name] = character
+        return CharacterRoster(characters, self.version + 1)
+
+    # Method to get the raw (JSON-serialisable) config for this roster
+    # Returns: dict of name -> dict
+    def toDict(self):
+        return {name: character.toDict()
+                for name, character in self._characters.items()}
+
+    # Static method to get a CharacterRoster from a list of characters
+    # Parameters:
+    #     characters:  Iterable of Characters
+    #     version:     The version counter to give the roster
+    # Returns: CharacterRoster
+    def fromCharacters(characters, version=0):
+        return CharacterRoster({character.name: character
+                                for character in characters},
+                               version)
+
+    # Static method to get a CharacterRoster from raw config values
+    # Parameters:
+    #     config:   dict of name -> dict, as produced by toDict()
+    #     version:  The version counter to give the roster
+    # Returns: CharacterRoster
+    def fromDict(config, version=0):
+        characters = {}
+        for value in config.values():
+            character = Character.fromDict(value)
+            characters[character.name] = character
+        return CharacterRoster(characters, version)
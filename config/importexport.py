@@ -0,0 +1,137 @@
+import csv
+import json
+import os
+
+from common.definitions import getAutoColors
+from config.classes import Character
+from config.manager import getConfigManager
+
+# Columns used in exported/ imported CSV files
+CSV_COLUMNS = ['name', 'color', 'fontColor', 'aliases']
+
+# Separator used between aliases in CSV files
+CSV_ALIAS_SEPARATOR = ';'
+
+# Function to export all configured characters to a CSV or JSON file
+# (depending on the file extension)
+# Parameters:
+#     filename:  The path of the file to write
+# Returns: int  The number of characters exported
+def exportCharacters(filename):
+    characters = getConfigManager().listCharacters()
+
+    if filename.lower().endswith('.csv'):
+        with open(filename, 'w', newline='') as outfile:
+            writer = csv.DictWriter(outfile, fieldnames=CSV_COLUMNS)
+            writer.writeheader()
+            for character in characters:
+                row = character.toDict()
+                row['aliases'] = CSV_ALIAS_SEPARATOR.join(character.aliases)
+                writer.writerow(row)
+    else:
+        with open(filename, 'w') as outfile:
+            json.dump([character.toDict() for character in characters],
+                      outfile,
+                      indent=2)
+
+    return len(characters)
+
+# Function to read the rows of a CSV or JSON character file. JSON files can
+# either hold a list of characters, or be a copy of config.json.
+# Parameters:
+#     filename:  The path of the file to read
+# Returns: [] of (int, dict)  The row/ entry numbers and raw values
+def readCharacterRows(filename):
+    if filename.lower().endswith('.csv'):
+        with open(filename, 'r', newline='') as infile:
+            # Row 1 is the header
+            return [(rowNumber, row)
+                    for rowNumber, row in enumerate(csv.DictReader(infile), 2)]
+
+    with open(filename, 'r') as infile:
+        entries = json.load(infile)
+
+    if isinstance(entries, dict):
+        entries = list(entries.values())
+
+    return list(enumerate(entries, 1))
+
+# Function to import characters from a CSV or JSON file. Every row is checked
+# before anything is saved: if any row is invalid (or names a character
+# already named by an earlier row), nothing is imported and all of the
+# problems are reported together. Otherwise all rows are added with a single
+# save.
+# Parameters:
+#     filename:  The path of the file to import
+# Returns: (int, [] of str)  The number of characters imported (or updated),
+#     and a list of error messages (one per invalid row)
+def importCharacters(filename):
+    try:
+        rows = readCharacterRows(filename)
+    except (OSError, ValueError, csv.Error) as error:
+        return 0, ['Could not read ' + os.path.basename(filename) + ': ' +
+                   str(error)]
+
+    characters = []
+    errors = []
+    rowNumbers = {}
+
+    for rowNumber, row in rows:
+        try:
+            aliases = row.get('aliases') or []
+            if isinstance(aliases, str):
+                aliases = aliases.split(CSV_ALIAS_SEPARATOR)
+
+            character = Character(str(row['name']).strip(),
+                                  str(row['color']).strip(),
+                                  str(row.get('fontColor') or '').strip() or None,
+                                  [str(alias) for alias in aliases])
+        except (KeyError, TypeError, AttributeError):
+            errors.append('Row ' + str(rowNumber) + ': missing name or color')
+            continue
+
+        if not character.isValid():
+            errors.append('Row ' + str(rowNumber) + ': invalid character "' +
+                          character.name + '" (' + character.color + ', font ' +
+                          character.fontColor + ')')
+            continue
+
+        if character.name in rowNumbers:
+            errors.append('Row ' + str(rowNumber) + ': duplicate character "' +
+                          character.name + '" (also in row ' +
+                          str(rowNumbers[character.name]) + ')')
+            continue
+        rowNumbers[character.name] = rowNumber
+
+        characters.append(character)
+
+    if errors:
+        return 0, errors
+
+    return getConfigManager().addCharacters(characters), []
+
+# Function to create characters for a set of sender names which aren't
+# configured yet (e.g. the unknown characters reported by a batch of
+# conversions), giving each one an automatically chosen bubble color
+# Parameters:
+#     senders:  Iterable of sender names
+# Returns: [] of Characters  The characters that were created
+def createCharactersFromSenders(senders):
+    manager = getConfigManager()
+
+    # Skip anyone we already know about (and any duplicates)
+    names = []
+    for sender in manager.classify(senders)[1]:
+        if sender.lower() not in names:
+            names.append(sender.lower())
+
+    existingColors = [character.color
+                      for character in manager.listCharacters()]
+    characters = [Character(name, color)
+                  for name, color in zip(names,
+                                         getAutoColors(len(names),
+                                                       existingColors))]
+    characters = [character for character in characters if character.isValid()]
+
+    manager.addCharacters(characters)
+    return characters
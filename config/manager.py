@@ -1,7 +1,13 @@
-import json
+import atexit
 import os
+import re
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
 from config.classes import *
 from common.definitions import *
+from common.fileio import writeFileIfChanged
+from config.stores import JsonCharacterStore, SqliteCharacterStore, DEFAULT_NAMESPACE
 
 # Project config - singleton instance
 configManager = None
@@ -9,70 +15,236 @@ configManager = None
 # File path to persistent project config
 JSON_FILE_PATH = 'config.json'
 
+# File path to the optional SQLite character store. If this file exists (or
+# the TEXTFIC_CONFIG_DB environment variable names a database), characters are
+# stored there instead of in JSON_FILE_PATH, under the namespace given by the
+# TEXTFIC_NAMESPACE environment variable. The JSON config is migrated into a
+# namespace the first time it's used.
+DB_FILE_PATH = 'config.db'
+
+# How long to wait after a change before writing the config to disk, so that a
+# burst of edits results in a single write. Set to 0 to save synchronously.
+SAVE_DELAY_SECONDS = 0.5
+
 # Singleton class - config manager
 class ConfigManager():
     # Constructor
-    def __init__(self):
-        self.characterConfig = {}
+    # Parameters:
+    #     store:  The character store to load from/ save to (optional -
+    #             defaults to the JSON config file)
+    def __init__(self, store=None):
+        self.store = store if store is not None else \
+                     JsonCharacterStore(JSON_FILE_PATH)
+
+        # The current characters are held as an immutable CharacterRoster,
+        # which is replaced (copy-on-write) whenever the config changes. Its
+        # version counter goes up with every change.
+        self.roster = CharacterRoster()
+
+        # Persistence state: unsaved changes (and whether any of them affect
+        # the generated CSS), open batches, and the pending write-behind timer
+        self.lock = threading.RLock()
+        self.configDirty = False
+        self.changedCharacters = {}
+        self.removedCharacters = set()
+        self.cssDirty = False
+        self.batchDepth = 0
+        self.saveTimer = None
+
         self.loadConfig()
+
+        # Make sure nothing is lost if the app exits with a save pending
+        atexit.register(self.flush)
         
-    # Method to load config from JSON persistent storage
+    # Method to load config from persistent storage
     def loadConfig(self):
-        if os.path.exists(JSON_FILE_PATH):
-            with open(JSON_FILE_PATH, 'r') as charfile:
-                self.characterConfig = json.load(charfile)
-                charfile.close()
+        with self.lock:
+            self.roster = CharacterRoster.fromCharacters(
+                self.store.loadCharacters(), self.roster.version + 1)
+
+    # Method to reload the config if another process has changed it (only
+    # possible with the SQLite store). Any unsaved changes are saved first.
+    def refresh(self):
+        with self.lock:
+            if self.store.hasChanged():
+                self.flush()
+                self.loadConfig()
 
-    # Method to save config to JSON persistent storage
+    # Method to save config to persistent storage. Only the characters which
+    # changed are passed to the store (the JSON store still rewrites the whole
+    # file, atomically), and the CSS is only regenerated if a change since the
+    # last save affected it.
     def saveConfig(self):
-        with open(JSON_FILE_PATH, 'w') as charfile:
-            json.dump(self.characterConfig, charfile)
-            charfile.close()
-            generateCss()
+        with self.lock:
+            self.cancelScheduledSave()
+            self.store.saveCharacters(self.roster,
+                                      list(self.changedCharacters.values()),
+                                      list(self.removedCharacters))
+            self.configDirty = False
+            self.changedCharacters = {}
+            self.removedCharacters = set()
+
+            if self.cssDirty:
+                self.cssDirty = False
+                generateCss()
+
+    # Method to write any unsaved changes to disk immediately
+    def flush(self):
+        with self.lock:
+            if self.configDirty:
+                self.saveConfig()
+
+    # Method to schedule a save of the config. Saves are delayed (and
+    # restarted by each new change) so that rapid edits are coalesced into one
+    # write, which happens off the calling thread.
+    def scheduleSave(self):
+        with self.lock:
+            if self.batchDepth:
+                # The save will happen when the outermost batch ends
+                return
+
+            self.cancelScheduledSave()
+            if SAVE_DELAY_SECONDS > 0:
+                self.saveTimer = threading.Timer(SAVE_DELAY_SECONDS, self.flush)
+                self.saveTimer.daemon = True
+                self.saveTimer.start()
+            else:
+                self.flush()
+
+    # Method to cancel any pending delayed save
+    def cancelScheduledSave(self):
+        with self.lock:
+            if self.saveTimer:
+                self.saveTimer.cancel()
+                self.saveTimer = None
+
+    # Method to batch up a series of changes into a single save, for use as a
+    # context manager:
+    #     with manager.batch():
+    #         manager.addCharacter(...)
+    #         manager.deleteCharacter(...)
+    # If the block raises an exception, all changes made within it are rolled
+    # back. Batches can be nested; only the outermost one triggers a save.
+    @contextmanager
+    def batch(self):
+        with self.lock:
+            savedState = (self.roster, self.configDirty, self.cssDirty,
+                          dict(self.changedCharacters),
+                          set(self.removedCharacters))
+            self.batchDepth += 1
+        try:
+            yield self
+        except BaseException:
+            with self.lock:
+                self.roster, self.configDirty, self.cssDirty, \
+                    self.changedCharacters, self.removedCharacters = savedState
+            raise
+        finally:
+            with self.lock:
+                self.batchDepth -= 1
+        if self.configDirty:
+            self.scheduleSave()
+
+    # Method to apply changes to the current roster and schedule a save
+    # Parameters:
+    #     changed:     Characters added or edited
+    #     removed:     Names of characters removed
+    #     affectsCss:  Whether the change affects the generated CSS
+    def commitChanges(self, changed, removed, affectsCss):
+        with self.lock:
+            self.roster = self.roster.evolve(added=changed, removed=removed)
+            for name in removed:
+                self.changedCharacters.pop(name, None)
+                self.removedCharacters.add(name)
+            for character in changed:
+                self.removedCharacters.discard(character.name)
+                self.changedCharacters[character.name] = character
+            self.configDirty = True
+            self.cssDirty = self.cssDirty or affectsCss
+        self.scheduleSave()
+
+    # Method to get a read-only snapshot of the current characters. This is
+    # cheap (no copying), and the snapshot is safe to pass to worker threads
+    # and processes.
+    # Returns: CharacterRoster
+    def snapshot(self):
+        self.refresh()
+        return self.roster
+
+    # Method to get the version counter of the current config, which changes
+    # whenever a character is added, edited or deleted
+    # Returns: int
+    def getVersion(self):
+        return self.roster.version
     
     # Method to list all characters in the current config
     # Returns: [] of Characters
     def listCharacters(self):
-        characters = []
-        for name in self.characterConfig:
-            character = Character.fromDict(self.characterConfig[name])
-            characters.append(character)
-            
-        return characters
+        return self.snapshot().listCharacters()
     
     # Method to get a particular character's config by name
     # Parameters:
     #     name:  The character's name
     # Returns: Character
     def getCharacter(self, name):
-        character = None
-        if (name.lower() in self.characterConfig):
-            character = Character.fromDict(self.characterConfig[name.lower()])
-        return character
+        return self.snapshot().getCharacter(name)
+
+    # Method to split a collection of sender names into known and unknown
+    # characters
+    # Parameters:
+    #     senders:  Iterable of sender names
+    # Returns: ([] of str, [] of str)  The known and unknown sender names
+    def classify(self, senders):
+        return self.snapshot().classify(senders)
     
     # Method to add a character
     # Parameters:
-    #     name:   The name of the character
-    #     color:  The text bubble color for the character
+    #     name:     The name of the character
+    #     color:    The text bubble color for the character
+    #     aliases:  Other names the character uses in messages (optional)
     # Returns: boolean (whether the provided config was valid)
-    def addCharacter(self, name, color):
-        character = Character(name, color)
+    def addCharacter(self, name, color, aliases=()):
+        character = Character(name, color, aliases=aliases)
     
         valid = character.isValid()
         
         if valid:
-            self.characterConfig[character.name] = character.toDict()
-            self.saveConfig()
+            self.addCharacters([character])
             
         return valid
     
+    # Method to add (or replace) several characters at once, with a single
+    # save
+    # Parameters:
+    #     characters:  Iterable of Characters, which must all be valid
+    # Returns: int  The number of characters that were added or changed
+    def addCharacters(self, characters):
+        changed = []
+        affectsCss = False
+        for character in characters:
+            existing = self.roster.getCharacter(character.name)
+
+            # Only save if something has actually changed, and only
+            # regenerate the CSS if the change affects it (e.g. not if just
+            # the aliases were edited)
+            if character != existing:
+                changed.append(character)
+                if existing is None or \
+                        character.getCssKey() != existing.getCssKey():
+                    affectsCss = True
+
+        if changed:
+            self.commitChanges(changed, [], affectsCss)
+        return len(changed)
+
     # Method to delete a character
     # Parameters:
     #     name:   The name of the character
     # Returns: boolean (whether the character existed and was deleted)
     def deleteCharacter(self, name):
-        removed = self.characterConfig.pop(name.lower(), None)
-        self.saveConfig()
+        removed = self.roster.getCharacter(name)
+        if removed:
+            self.commitChanges([], [removed.name], True)
         return removed
  
 
@@ -81,29 +253,159 @@ class ConfigManager():
 def getConfigManager():
     global configManager
     if configManager is None:
-        configManager = ConfigManager()
+        configManager = ConfigManager(createCharacterStore())
     return configManager
+
+# Function to create the character store to use - SQLite if a database has
+# been configured (see DB_FILE_PATH), otherwise the JSON config file
+# Returns: JsonCharacterStore or SqliteCharacterStore
+def createCharacterStore():
+    dbPath = os.environ.get('TEXTFIC_CONFIG_DB', DB_FILE_PATH)
+    if os.path.exists(dbPath) or 'TEXTFIC_CONFIG_DB' in os.environ:
+        return SqliteCharacterStore(dbPath,
+                                    os.environ.get('TEXTFIC_NAMESPACE',
+                                                   DEFAULT_NAMESPACE),
+                                    JSON_FILE_PATH)
+    return JsonCharacterStore(JSON_FILE_PATH)
     
-# Function to generate character-specific CSS for the given character
+# Cache of the most recently generated CSS, keyed on the CSS-affecting config
+# of every character (i.e. a hash of the roster). The roster snapshot it was
+# built from is also kept, so that repeat calls with an unchanged config don't
+# even need to rebuild the key.
+cssCache = {'roster': None, 'key': None, 'css': None}
+
+# Function to generate character-specific CSS for the given character. The
+# result is memoized, so unchanged characters cost nothing to regenerate.
 # Returns: str  The generated CSS
+@lru_cache(maxsize=4096)
 def getCharacterCss(name, color, fontColor):
     cssClasses = CSS_CHARACTER_CLASSES
     cssClasses = cssClasses.replace('CHARACTER_NAME', name)
     cssClasses = cssClasses.replace('CHARACTER_COLOR', color)
     cssClasses = cssClasses.replace('CHARACTER_FONT', fontColor)
     return cssClasses
+
+# Function to get the combined base and character-specific CSS for the current
+# config. This is cached until the CSS-affecting config changes.
+# Returns: str  The generated CSS
+def getCss():
+    roster = getConfigManager().snapshot()
+    if roster is cssCache['roster']:
+        return cssCache['css']
+
+    cssKey = tuple(character.getCssKey() for character in roster)
+
+    if cssKey != cssCache['key']:
+        cssParts = [BASE_CSS_CLASSES]
+        for name, color, fontColor in cssKey:
+            cssParts.append(getCharacterCss(name, color, fontColor))
+
+        cssCache['key'] = cssKey
+        cssCache['css'] = ''.join(cssParts)
+
+    cssCache['roster'] = roster
+
+    return cssCache['css']
  
-# Function to combine character-specific and base CSS, and output it to file
+# Function to combine character-specific and base CSS, and output it to file.
+# The file is only rewritten if its content has changed.
+# Returns: str  The generated CSS
 def generateCss():
-    if not os.path.exists(OUTPUT_DIR):
-        os.makedirs(OUTPUT_DIR)
+    css = getCss()
+    writeFileIfChanged(os.path.join(OUTPUT_DIR,CSS_FILE_NAME), css)
+    return css
+
+
+# Function to minify CSS - removes comments and any whitespace that isn't
+# needed
+# Parameters:
+#     css:  The CSS to minify
+# Returns: str  The minified CSS
+def minifyCss(css):
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.DOTALL)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    css = re.sub(r':\s+', ':', css)
+    css = css.replace(';}', '}')
+    return css.strip()
+
+# Function to build a list of selectors, one for each of the given characters
+# Parameters:
+#     template:  The selector, with CHARACTER_NAME in place of the name
+#     names:     The character names
+# Returns: str  The selectors, comma separated
+def getSelectors(template, names):
+    return ',\n'.join(template.replace('CHARACTER_NAME', name)
+                      for name in names)
+
+# Function to generate a size-optimized work skin, for publishing on AO3 (which
+# limits the size of work skins). Only characters who actually send messages
+# in the given works are included, characters with the same colors share their
+# rules, and the output can be minified.
+# Parameters:
+#     senders:  Iterable of sender names, e.g. the union of the sender sets
+#               returned by processFile for a batch of files
+#     minify:   Whether to minify the CSS
+#     roster:   The CharacterRoster to use (optional - defaults to the current
+#               config)
+# Returns: str  The generated CSS
+def getWorkSkinCss(senders, minify=True, roster=None):
+    if roster is None:
+        roster = getConfigManager().snapshot()
+
+    # Work out which characters are used, keeping the config order
+    usedNames = set()
+    for sender in senders:
+        character = roster.getCharacter(sender)
+        if character:
+            usedNames.add(character.name)
+    used = [character for character in roster if character.name in usedNames]
+
+    # Group the characters by bubble and font color for the message rules,
+    # and by bubble color alone for the message 'tail' rules
+    byColors = {}
+    byColor = {}
+    for character in used:
+        byColors.setdefault((character.color, character.fontColor),
+                            []).append(character.name)
+        byColor.setdefault(character.color, []).append(character.name)
+
+    cssParts = [BASE_CSS_CLASSES]
+    for (color, fontColor), names in byColors.items():
+        cssClasses = CSS_SHARED_MESSAGE_CLASS
+        cssClasses = cssClasses.replace('CHARACTER_SELECTORS',
+                                        getSelectors(CSS_MESSAGE_SELECTOR,
+                                                     names))
+        cssClasses = cssClasses.replace('CHARACTER_COLOR', color)
+        cssClasses = cssClasses.replace('CHARACTER_FONT', fontColor)
+        cssParts.append(cssClasses)
+
+    for color, names in byColor.items():
+        cssClasses = CSS_SHARED_TAIL_CLASSES
+        cssClasses = cssClasses.replace('CHARACTER_SELECTORS',
+                                        getSelectors(CSS_TAIL_SELECTOR, names))
+        cssClasses = cssClasses.replace('GROUP_LEADER_SELECTORS',
+                                        getSelectors(CSS_GROUP_LEADER_TAIL_SELECTOR,
+                                                     names))
+        cssClasses = cssClasses.replace('CHARACTER_COLOR', color)
+        cssParts.append(cssClasses)
 
-    with open(os.path.join(OUTPUT_DIR,CSS_FILE_NAME), 'w') as outfile:
-        outfile.write(BASE_CSS_CLASSES)
+    css = ''.join(cssParts)
+    if minify:
+        css = minifyCss(css)
 
-        for character in getConfigManager().listCharacters():
-            outfile.write(getCharacterCss(character.name,
-                                          character.color,
-                                          character.fontColor))
+    return css
 
-        outfile.close()
\ No newline at end of file
+# Function to generate a size-optimized work skin (see getWorkSkinCss) and
+# output it to file, alongside the full stylesheet
+# Parameters:
+#     senders:  Iterable of sender names used in the works
+#     minify:   Whether to minify the CSS
+# Returns: (str, int, int)  The path of the work skin file, the size of the
+#     full stylesheet and the size of the work skin (both in bytes)
+def generateWorkSkin(senders, minify=True):
+    fullSize = len(getCss().encode('utf-8'))
+    css = getWorkSkinCss(senders, minify)
+    path = os.path.join(OUTPUT_DIR, WORK_SKIN_FILE_NAME)
+    writeFileIfChanged(path, css)
+    return path, fullSize, len(css.encode('utf-8'))
@@ -0,0 +1,211 @@
+import json
+import os
+import sqlite3
+
+from common.fileio import writeFileAtomic
+from config.classes import Character, normaliseName
+
+# Namespace used when none is specified
+DEFAULT_NAMESPACE = 'default'
+
+# How long (in milliseconds) to wait for another process to finish writing to
+# the SQLite database before giving up
+SQLITE_BUSY_TIMEOUT_MS = 5000
+
+# Schema for the SQLite character store. Each work/ fandom gets its own
+# namespace of characters. Rows are read back in insertion (rowid) order, so
+# that the character list keeps the order characters were added in.
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS namespaces
+(
+    namespace TEXT PRIMARY KEY,
+    migrated INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS characters
+(
+    namespace TEXT NOT NULL,
+    name TEXT NOT NULL,
+    color TEXT NOT NULL,
+    fontColor TEXT NOT NULL,
+    PRIMARY KEY (namespace, name)
+);
+
+CREATE TABLE IF NOT EXISTS aliases
+(
+    namespace TEXT NOT NULL,
+    name TEXT NOT NULL,
+    alias TEXT NOT NULL,
+    aliasKey TEXT NOT NULL,
+    PRIMARY KEY (namespace, name, aliasKey)
+);
+
+CREATE INDEX IF NOT EXISTS aliasesByKey ON aliases (namespace, aliasKey);
+"""
+
+# Class representing the original JSON file character store. The whole file
+# is rewritten (atomically) on every save.
+class JsonCharacterStore():
+    # Constructor
+    # Parameters:
+    #     path:  The path of the JSON config file
+    def __init__(self, path):
+        self.path = path
+
+    # Method to load all characters from the store
+    # Returns: [] of Characters
+    def loadCharacters(self):
+        characters = []
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as charfile:
+                characterConfig = json.load(charfile)
+            characters = [Character.fromDict(value)
+                          for value in characterConfig.values()]
+        return characters
+
+    # Method to save changes to the store
+    # Parameters:
+    #     roster:   The full, current CharacterRoster
+    #     changed:  Characters added or edited since the last save (unused)
+    #     removed:  Names of characters removed since the last save (unused)
+    def saveCharacters(self, roster, changed, removed):
+        writeFileAtomic(self.path, json.dumps(roster.toDict()))
+
+    # Method to check whether another process has changed the store since it
+    # was last loaded/ saved. JSON files are only ever written by one app at a
+    # time, so this is always False.
+    # Returns: boolean
+    def hasChanged(self):
+        return False
+
+# Class representing a SQLite character store, which can hold rosters for many
+# works/ fandoms (namespaces) in one file. Saves only touch the rows that
+# changed, and the database runs in WAL mode so that the GUI, batch jobs and
+# watch processes can all read and write it at the same time.
+class SqliteCharacterStore():
+    # Constructor
+    # Parameters:
+    #     path:       The path of the database file (created if necessary)
+    #     namespace:  The work/ fandom whose characters to use
+    #     jsonPath:   A JSON config file to migrate characters from, the first
+    #                 time the namespace is used (optional)
+    def __init__(self, path, namespace=DEFAULT_NAMESPACE, jsonPath=None):
+        self.path = path
+        self.namespace = namespace
+
+        # The connection is shared with the write-behind save thread; the
+        # ConfigManager serialises access to it
+        self.connection = sqlite3.connect(path,
+                                          timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+                                          check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SQLITE_SCHEMA)
+        self.dataVersion = self.getDataVersion()
+
+        if jsonPath:
+            self.migrateFromJson(jsonPath)
+
+    # Method to get SQLite's data version, which changes whenever another
+    # connection commits a change to the database
+    # Returns: int
+    def getDataVersion(self):
+        return self.connection.execute('PRAGMA data_version').fetchone()[0]
+
+    # Method to check whether another process has changed the store since it
+    # was last checked
+    # Returns: boolean
+    def hasChanged(self):
+        dataVersion = self.getDataVersion()
+        changed = dataVersion != self.dataVersion
+        self.dataVersion = dataVersion
+        return changed
+
+    # Method to load all characters in the namespace
+    # Returns: [] of Characters
+    def loadCharacters(self):
+        aliases = {}
+        for name, alias in self.connection.execute(
+                'SELECT name, alias FROM aliases WHERE namespace = ? '
+                'ORDER BY rowid', (self.namespace,)):
+            aliases.setdefault(name, []).append(alias)
+
+        return [Character(name, color, fontColor, aliases.get(name, ()))
+                for name, color, fontColor in self.connection.execute(
+                    'SELECT name, color, fontColor FROM characters '
+                    'WHERE namespace = ? ORDER BY rowid', (self.namespace,))]
+
+    # Method to save changes to the store. Only the rows for characters which
+    # changed are written, in a single transaction.
+    # Parameters:
+    #     roster:   The full, current CharacterRoster (unused)
+    #     changed:  Characters added or edited since the last save
+    #     removed:  Names of characters removed since the last save
+    def saveCharacters(self, roster, changed, removed):
+        with self.connection:
+            self.writeCharacters(changed, removed)
+
+    # Method to upsert/ delete character rows (within the caller's
+    # transaction)
+    # Parameters:
+    #     changed:  Characters to insert or update
+    #     removed:  Names of characters to delete
+    def writeCharacters(self, changed, removed):
+        for name in removed:
+            self.connection.execute(
+                'DELETE FROM characters WHERE namespace = ? AND name = ?',
+                (self.namespace, name))
+            self.connection.execute(
+                'DELETE FROM aliases WHERE namespace = ? AND name = ?',
+                (self.namespace, name))
+
+        for character in changed:
+            self.connection.execute(
+                'INSERT INTO characters (namespace, name, color, fontColor) '
+                'VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (namespace, name) DO UPDATE SET '
+                'color = excluded.color, fontColor = excluded.fontColor',
+                (self.namespace, character.name, character.color,
+                 character.fontColor))
+            self.connection.execute(
+                'DELETE FROM aliases WHERE namespace = ? AND name = ?',
+                (self.namespace, character.name))
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO aliases '
+                '(namespace, name, alias, aliasKey) VALUES (?, ?, ?, ?)',
+                [(self.namespace, character.name, alias, normaliseName(alias))
+                 for alias in character.aliases])
+
+    # Method to list all of the namespaces in the store
+    # Returns: [] of str
+    def listNamespaces(self):
+        return [namespace for (namespace,) in self.connection.execute(
+            'SELECT namespace FROM namespaces UNION '
+            'SELECT DISTINCT namespace FROM characters ORDER BY 1')]
+
+    # Method to copy the characters from a JSON config file into this
+    # namespace. This only happens when the database is first used (i.e. it
+    # has no characters and nothing has been migrated into it before), so
+    # other namespaces start empty and deleted characters don't come back.
+    # Parameters:
+    #     jsonPath:  The path of the JSON config file
+    # Returns: int  The number of characters migrated
+    def migrateFromJson(self, jsonPath):
+        characters = []
+
+        with self.connection:
+            migrated = self.connection.execute(
+                'SELECT 1 FROM namespaces WHERE migrated LIMIT 1').fetchone()
+            populated = self.connection.execute(
+                'SELECT 1 FROM characters LIMIT 1').fetchone()
+
+            if not migrated and not populated:
+                characters = JsonCharacterStore(jsonPath).loadCharacters()
+                self.writeCharacters(characters, [])
+
+            self.connection.execute(
+                'INSERT INTO namespaces (namespace, migrated) VALUES (?, 1) '
+                'ON CONFLICT (namespace) DO UPDATE SET migrated = 1',
+                (self.namespace,))
+
+        return len(characters)
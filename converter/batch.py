@@ -0,0 +1,251 @@
+import hashlib
+import json
+import os
+import time
+from functools import partial
+
+from common.definitions import OUTPUT_DIR
+from common.fileio import writeFileAtomic
+from config.manager import getConfigManager
+from converter.ficfileconverter import getOutputPath, processFile
+from converter.prefetch import DEFAULT_READ_AHEAD, DEFAULT_READ_THREADS, DocumentPrefetcher
+from converter.profiling import ConversionProfiler
+from converter.progress import ConversionCancelled
+from converter.tracing import traceFile
+
+# Result statuses
+STATUS_OK = 'OK'
+STATUS_FAILED = 'Failed'
+STATUS_CANCELLED = 'Cancelled'
+
+# Default paths of the JSON summary written by each shard of a batch, and of
+# the summary merged from all of them
+SHARD_SUMMARY_TEMPLATE = os.path.join(OUTPUT_DIR, 'summary-{index}-of-{count}.json')
+MERGED_SUMMARY_PATH = os.path.join(OUTPUT_DIR, 'summary.json')
+
+# Class representing the result of converting one file in a batch
+class ConversionResult():
+    # Constructor
+    # Parameters:
+    #     filename:  The path of the input file
+    def __init__(self, filename):
+        self.filename = filename
+        self.status = STATUS_FAILED
+        self.error = None
+        self.outfilePath = None
+        self.characters = set()
+        self.unknownCharacters = []
+        self.seconds = 0.0
+        self.stallSeconds = 0.0
+        self.outputSize = 0
+        self.outputWritten = False
+        self.reportPaths = []
+
+    # Method to check whether the file was converted successfully
+    # Returns: boolean
+    def succeeded(self):
+        return self.status == STATUS_OK
+
+# Function to count the output files written and skipped (because they were
+# already up to date) in a batch
+# Parameters:
+#     results:  The ConversionResults for the batch
+# Returns: (int, int)  The number of files written, and the number skipped
+def countOutputsWritten(results):
+    succeeded = [result for result in results if result.succeeded()]
+    written = sum(1 for result in succeeded if result.outputWritten)
+    return written, len(succeeded) - written
+
+# Function to convert a batch of files, one at a time, yielding the result of
+# each as soon as it's done (so that front ends can show results as they come
+# in). A failure to convert one file is reported in its result, and doesn't
+# stop the rest of the batch. If the batch is cancelled, the file being
+# converted is reported as cancelled and the rest are skipped. The next few
+# files are read in the background while each file is converted.
+# Parameters:
+#     filenames:    The paths of the files to convert
+#     roster:       The CharacterRoster to identify senders with (optional -
+#                   defaults to the current config)
+#     progress:     Function called as each file progresses, with the number
+#                   of the file in the batch, the number of files, and the
+#                   blocks done, total blocks and bytes read for the file
+#                   (optional)
+#     cancelToken:  CancellationToken used to cancel the batch (optional)
+#     readAhead:    The number of files to read ahead of the one being
+#                   converted (optional)
+#     readThreads:  The number of threads to read files with (optional - 0
+#                   reads each file only when it's needed)
+#     profile:      ProfileOptions to profile each file's conversion with -
+#                   reports are written next to each output file (optional)
+#     formats:      [] of str  The output formats to write (optional -
+#                   defaults to just the AO3 HTML)
+#     plugins:      [] of str  The module names of the transform plugins to
+#                   use (optional - see converter.transforms)
+#     index:        MessageIndex to record each converted file's messages in
+#                   (optional - see converter.messageindex)
+#     work:         The name of the work to record the files under in the
+#                   index (optional)
+# Returns: generator of ConversionResult
+def convertFiles(filenames, roster=None, progress=None, cancelToken=None,
+                 readAhead=DEFAULT_READ_AHEAD, readThreads=DEFAULT_READ_THREADS,
+                 profile=None, formats=None, plugins=None, index=None, work=''):
+    if roster is None:
+        roster = getConfigManager().snapshot()
+
+    filenames = list(filenames)
+    prefetcher = DocumentPrefetcher(filenames, readAhead, readThreads)
+
+    try:
+        for fileNumber, filename in enumerate(filenames):
+            if cancelToken is not None and cancelToken.isCancelled():
+                return
+
+            result = ConversionResult(filename)
+            startTime = time.perf_counter()
+
+            fileProgress = None
+            if progress is not None:
+                fileProgress = partial(progress, fileNumber, len(filenames))
+
+            try:
+                docxContent, result.stallSeconds = prefetcher.getDocument(fileNumber)
+
+                messages = [] if index is not None else None
+                profiler = ConversionProfiler(getOutputPath(filename), profile)
+                result.reportPaths = profiler.reportPaths
+                with profiler:
+                    result.outfilePath, result.characters, result.outputWritten = \
+                        processFile(filename,
+                                    roster,
+                                    fileProgress,
+                                    cancelToken,
+                                    docxContent,
+                                    formats=formats,
+                                    plugins=plugins,
+                                    messages=messages)
+                if index is not None:
+                    index.updateChapter(work, filename, messages)
+                result.unknownCharacters = roster.classify(
+                    sorted(result.characters))[1]
+                result.outputSize = os.path.getsize(result.outfilePath)
+                result.status = STATUS_OK
+            except ConversionCancelled as error:
+                result.status = STATUS_CANCELLED
+                result.error = str(error)
+            except Exception as error:
+                result.error = str(error)
+
+            endTime = time.perf_counter()
+            result.seconds = endTime - startTime
+            traceFile(filename, startTime, endTime)
+            yield result
+    finally:
+        prefetcher.close()
+
+# Function to parse a shard specification of the form "i/N" (the i-th of N
+# shards, counting from 1)
+# Parameters:
+#     text:  The shard specification
+# Returns: (int, int)  The shard index and number of shards
+def parseShard(text):
+    index, separator, count = text.partition('/')
+    if not (separator and index.isdigit() and count.isdigit() and
+            1 <= int(index) <= int(count)):
+        raise ValueError('Shard must be given as i/N, with 1 <= i <= N: ' + text)
+    return int(index), int(count)
+
+# Function to find the files in a batch which would be written to the same
+# output file (their output is named after the input file, so e.g.
+# a/chapter1.docx and b/chapter1.odt collide). Files are sharded on their
+# name too, so colliding files would also always land in the same shard.
+# Parameters:
+#     filenames:  The paths of the files in the whole batch
+#     getPath:    Function to get the output path of a file (optional -
+#                 defaults to the batch output path, in the output
+#                 directory)
+# Returns: [] of [] of str  Each group of files sharing an output file
+def findOutputCollisions(filenames, getPath=getOutputPath):
+    outputs = {}
+    for filename in filenames:
+        outputs.setdefault(os.path.normcase(getPath(filename)), []).append(filename)
+    return [group for group in outputs.values() if len(group) > 1]
+
+# Function to select the files belonging to one shard of a batch. Files are
+# partitioned on a hash of their name, so every host given the same list (in
+# any order, from any directory) agrees on which shard each file is in. Files
+# with the same name can't be told apart this way, so a batch should be
+# checked with findOutputCollisions first.
+# Parameters:
+#     filenames:   The paths of the files in the whole batch
+#     shardIndex:  The index of the shard (from 1)
+#     shardCount:  The number of shards
+# Returns: [] of str  The paths of the files in the shard
+def selectShard(filenames, shardIndex, shardCount):
+    return [filename for filename in filenames
+            if int(hashlib.sha1(os.path.basename(filename).encode('utf-8')).hexdigest(), 16) %
+            shardCount == shardIndex - 1]
+
+# Function to get a summary of a batch's results, to be saved as JSON
+# Parameters:
+#     results:  The ConversionResults for the batch
+#     shard:    (int, int)  The shard index and number of shards, if the batch
+#               is one shard of a bigger batch (optional)
+# Returns: dict
+def getBatchSummary(results, shard=None):
+    senders = set()
+    files = []
+    for result in results:
+        senders.update(result.characters)
+        files.append({'file': result.filename,
+                      'status': result.status,
+                      'error': result.error,
+                      'output': result.outfilePath,
+                      'senders': sorted(result.characters),
+                      'seconds': round(result.seconds, 3),
+                      'outputSize': result.outputSize,
+                      'written': result.outputWritten})
+
+    return {'shard': list(shard) if shard else None,
+            'files': files,
+            'senders': sorted(senders),
+            'seconds': round(sum(result.seconds for result in results), 3)}
+
+# Function to write a summary of a batch's results to a JSON file
+# Parameters:
+#     path:     The path of the summary file
+#     results:  The ConversionResults for the batch
+#     shard:    (int, int)  The shard index and number of shards (optional)
+def writeBatchSummary(path, results, shard=None):
+    writeFileAtomic(path, json.dumps(getBatchSummary(results, shard), indent=1))
+
+# Function to merge the summaries written by the shards of a batch
+# Parameters:
+#     paths:  The paths of the summary files
+# Returns: (dict, [] of int)  The merged summary, and the indexes of any
+#     shards whose summaries are missing
+def mergeBatchSummaries(paths):
+    files = []
+    senders = set()
+    seconds = 0.0
+    shardIndexes = set()
+    shardCount = 0
+
+    for path in paths:
+        with open(path, 'r') as summaryFile:
+            summary = json.load(summaryFile)
+
+        files.extend(summary['files'])
+        senders.update(summary['senders'])
+        seconds += summary['seconds']
+        if summary.get('shard'):
+            shardIndexes.add(summary['shard'][0])
+            shardCount = max(shardCount, summary['shard'][1])
+
+    missingShards = [index for index in range(1, shardCount + 1)
+                     if index not in shardIndexes]
+
+    return ({'shard': None,
+             'files': files,
+             'senders': sorted(senders),
+             'seconds': round(seconds, 3)},
+            missingShards)
@@ -0,0 +1,70 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Maximum number of converted blocks to keep
+BLOCK_CACHE_SIZE = 8192
+
+# Maximum number of converted whole documents to keep
+DOCUMENT_CACHE_SIZE = 16
+
+# Class representing a cache of converted chat blocks, so that reconverting a
+# document after a small edit only has to transform the blocks which changed.
+# Entries are keyed on a hash of the block's source HTML and the roster it was
+# converted with, and the least recently used entries are dropped once the
+# cache is full. The cache is shared between threads.
+class BlockCache():
+    # Constructor
+    # Parameters:
+    #     maxSize:  The maximum number of blocks to keep
+    def __init__(self, maxSize=BLOCK_CACHE_SIZE):
+        self.maxSize = maxSize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # Method to get the cache key for a block (or document)
+    # Parameters:
+    #     source:        The block's source HTML (or document's raw bytes)
+    #     rosterDigest:  The digest of the roster used to convert the block
+    # Returns: str
+    def getKey(self, source, rosterDigest):
+        if isinstance(source, str):
+            source = source.encode('utf-8')
+        return hashlib.sha1(source).hexdigest() + rosterDigest
+
+    # Method to get a converted block from the cache
+    # Parameters:
+    #     key:  The cache key
+    # Returns: The cached value, or None if the block isn't cached
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries.move_to_end(key)
+            return value
+
+    # Method to add a converted block to the cache
+    # Parameters:
+    #     key:    The cache key
+    #     value:  The converted block
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxSize:
+                self.entries.popitem(last=False)
+
+    # Method to empty the cache
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+# Shared cache instances - one for chat blocks, and one for whole documents
+# (so that converting an unchanged document again skips mammoth too)
+blockCache = BlockCache()
+documentCache = BlockCache(DOCUMENT_CACHE_SIZE)
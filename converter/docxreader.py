@@ -0,0 +1,633 @@
+import posixpath
+import re
+import zipfile
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+# A streaming reader for .docx files, used for documents too big to convert in
+# memory with mammoth. It reads the document XML with iterparse, converting
+# and then discarding one top-level element (paragraph, table or list) at a
+# time, so only the current element is ever held in memory.
+#
+# The HTML produced matches mammoth's (with its default style map) for
+# paragraphs, headings, bold/ italic/ strikethrough/ superscript/ subscript
+# text, line breaks, tabs, hyperlinks, bookmarks, lists and simple tables.
+# Images, footnotes, endnotes and comments aren't supported, so documents
+# containing any of them are converted with mammoth instead (see
+# getUnsupportedContent), and table cells merged vertically aren't given a
+# rowspan.
+
+# XML namespaces used in .docx files
+WORD_NAMESPACE = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+RELATIONSHIP_NAMESPACE = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+PACKAGE_RELATIONSHIP_NAMESPACE = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+COMPATIBILITY_NAMESPACE = '{http://schemas.openxmlformats.org/markup-compatibility/2006}'
+OFFICE_DOCUMENT_TYPE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument'
+RELATIONSHIP_TYPE_PREFIX = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+
+# Content the streaming reader doesn't support: the relationship type of the
+# part holding it, and the tag of each item in that part (or None if the
+# relationship alone means the content is there)
+UNSUPPORTED_PARTS = {'image': None,
+                     'footnotes': WORD_NAMESPACE + 'footnote',
+                     'endnotes': WORD_NAMESPACE + 'endnote',
+                     'comments': WORD_NAMESPACE + 'comment'}
+
+# Types of footnote/ endnote which are just the lines separating the notes
+# from the text, present in most documents even without any notes
+NOTE_SEPARATOR_TYPES = {'separator', 'continuationSeparator', 'continuationNotice'}
+
+# Tag names, fully qualified
+W_BODY = WORD_NAMESPACE + 'body'
+W_PARAGRAPH = WORD_NAMESPACE + 'p'
+W_TABLE = WORD_NAMESPACE + 'tbl'
+W_RUN = WORD_NAMESPACE + 'r'
+W_TEXT = WORD_NAMESPACE + 't'
+W_VAL = WORD_NAMESPACE + 'val'
+
+# Elements which just contain other content, at the top level of the document
+# body or within a paragraph
+BODY_CONTAINER_TAGS = {WORD_NAMESPACE + 'sdt',
+                       WORD_NAMESPACE + 'sdtContent',
+                       WORD_NAMESPACE + 'customXml'}
+INLINE_CONTAINER_TAGS = {WORD_NAMESPACE + name for name in
+                         ('ins', 'smartTag', 'customXml', 'sdtContent',
+                          'moveTo', 'object', 'drawing', 'pict',
+                          'txbxContent')}
+
+# Paragraph styles shown as headings (mammoth's default style map)
+HEADING_STYLE_REGEX = re.compile('^(?:Heading ?|heading )([1-6])$')
+APPLE_HEADING_STYLE = 'Heading'
+
+# Size of the pieces the document XML is read in
+READ_SIZE = 64 * 1024
+
+# Class representing an HTML element being built from the document
+class HtmlElement():
+    __slots__ = ('tag', 'attributes', 'children', 'collapsible', 'forceWrite')
+
+    # Constructor
+    # Parameters:
+    #     tag:          The tag name
+    #     attributes:   dict of attributes (optional)
+    #     children:     [] of HtmlElement or str (optional)
+    #     collapsible:  Whether this element can be merged with an identical
+    #                   element straight before it (optional)
+    #     forceWrite:   Whether to keep this element even if it's empty
+    #                   (optional)
+    def __init__(self, tag, attributes=None, children=None, collapsible=False, forceWrite=False):
+        self.tag = tag
+        self.attributes = attributes or {}
+        self.children = children if children is not None else []
+        self.collapsible = collapsible
+        self.forceWrite = forceWrite
+
+    # Method to check whether this is a void element (one without an end tag)
+    # Returns: boolean
+    def isVoid(self):
+        return self.tag == 'br'
+
+# Function to remove empty text and elements from a list of nodes (other than
+# void elements, and elements which should be written even if empty)
+# Parameters:
+#     nodes:  [] of HtmlElement or str
+# Returns: [] of HtmlElement or str
+def stripEmpty(nodes):
+    stripped = []
+    for node in nodes:
+        if isinstance(node, str):
+            if node:
+                stripped.append(node)
+            continue
+
+        node.children = stripEmpty(node.children)
+        if node.children or node.isVoid() or node.forceWrite:
+            stripped.append(node)
+    return stripped
+
+# Function to merge adjacent collapsible elements which have the same tag and
+# attributes (so e.g. two bold runs become one <strong> element)
+# Parameters:
+#     nodes:  [] of HtmlElement or str
+# Returns: [] of HtmlElement or str
+def collapse(nodes):
+    collapsed = []
+    for node in nodes:
+        addCollapsing(collapsed, node)
+    return collapsed
+
+# Function to add a node to a collapsed list of nodes, merging it with the
+# last node if possible
+# Parameters:
+#     collapsed:  [] of HtmlElement or str, already collapsed
+#     node:       The node to add
+def addCollapsing(collapsed, node):
+    if isinstance(node, HtmlElement):
+        node.children = collapse(node.children)
+
+        last = collapsed[-1] if collapsed else None
+        if node.collapsible and isinstance(last, HtmlElement) and \
+                last.tag == node.tag and last.attributes == node.attributes:
+            for child in node.children:
+                addCollapsing(last.children, child)
+            return
+
+    collapsed.append(node)
+
+# Function to write nodes as HTML, in the same way mammoth does
+# Parameters:
+#     nodes:  [] of HtmlElement or str
+# Returns: str
+def writeHtml(nodes):
+    parts = []
+    writeNodes(nodes, parts)
+    return ''.join(parts)
+
+# Function to write nodes as HTML to a list of parts
+# Parameters:
+#     nodes:  [] of HtmlElement or str
+#     parts:  [] of str to add the HTML to
+def writeNodes(nodes, parts):
+    for node in nodes:
+        if isinstance(node, str):
+            parts.append(escapeHtml(node))
+            continue
+
+        attributes = ''.join(' ' + key + '="' + escapeHtml(node.attributes[key]) + '"'
+                             for key in sorted(node.attributes))
+        if node.isVoid():
+            parts.append('<' + node.tag + attributes + ' />')
+        else:
+            parts.append('<' + node.tag + attributes + '>')
+            writeNodes(node.children, parts)
+            parts.append('</' + node.tag + '>')
+
+# Function to escape text for HTML
+# Parameters:
+#     text:  The text
+# Returns: str
+def escapeHtml(text):
+    return escape(text, {'"': '&quot;'})
+
+# Function to check whether a Word on/ off property (e.g. <w:b/>) is on
+# Parameters:
+#     properties:  The properties element (or None)
+#     name:        The name of the property
+# Returns: boolean
+def isPropertyOn(properties, name):
+    if properties is None:
+        return False
+    element = properties.find(WORD_NAMESPACE + name)
+    return element is not None and element.get(W_VAL) not in ('false', '0')
+
+# Function to get the value of a Word property (e.g. <w:pStyle w:val="x"/>)
+# Parameters:
+#     properties:  The properties element (or None)
+#     path:        The path of the property, relative to the properties
+# Returns: str, or None if the property isn't set
+def getPropertyValue(properties, path):
+    if properties is None:
+        return None
+    element = properties.find(path)
+    return None if element is None else element.get(W_VAL)
+
+# Class representing a streaming reader for a .docx file
+class DocxStreamReader():
+    # Constructor. Reads the (small) parts needed to interpret the document -
+    # styles, numbering and relationships - straight away.
+    # Parameters:
+    #     filename:  The path of the .docx file
+    def __init__(self, filename):
+        self.filename = filename
+
+        # Number of bytes of document XML read so far, and in total
+        self.bytesRead = 0
+        self.bytesTotal = 0
+
+        with zipfile.ZipFile(filename) as docxZip:
+            self.documentPath = self.findDocumentPath(docxZip)
+            self.bytesTotal = docxZip.getinfo(self.documentPath).file_size
+
+            partDirectory = posixpath.dirname(self.documentPath)
+            self.styleNames = self.readStyleNames(docxZip, posixpath.join(partDirectory, 'styles.xml'))
+            self.relationships = self.readRelationships(
+                docxZip,
+                posixpath.join(partDirectory, '_rels',
+                               posixpath.basename(self.documentPath) + '.rels'))
+            self.listLevels, self.styleListLevels = self.readNumbering(
+                docxZip, posixpath.join(partDirectory, 'numbering.xml'))
+            self.unsupportedContent = self.findUnsupportedContent(
+                docxZip,
+                partDirectory,
+                posixpath.join(partDirectory, '_rels',
+                               posixpath.basename(self.documentPath) + '.rels'))
+
+    # Method to find the path of the main document part
+    # Parameters:
+    #     docxZip:  The open ZipFile
+    # Returns: str
+    def findDocumentPath(self, docxZip):
+        for relationship in self.readXmlPart(docxZip, '_rels/.rels'):
+            if relationship.get('Type') == OFFICE_DOCUMENT_TYPE:
+                path = relationship.get('Target').lstrip('/')
+                if path in docxZip.namelist():
+                    return path
+        return 'word/document.xml'
+
+    # Method to read a whole (small) XML part of the document
+    # Parameters:
+    #     docxZip:  The open ZipFile
+    #     path:     The path of the part
+    # Returns: xml.etree.ElementTree.Element, or an empty element if the part
+    #     doesn't exist
+    def readXmlPart(self, docxZip, path):
+        try:
+            with docxZip.open(path) as partFile:
+                return ElementTree.parse(partFile).getroot()
+        except KeyError:
+            return ElementTree.Element('empty')
+
+    # Method to read the names of the document's styles
+    # Parameters:
+    #     docxZip:  The open ZipFile
+    #     path:     The path of the styles part
+    # Returns: dict of str  Style names, keyed on style ID
+    def readStyleNames(self, docxZip, path):
+        styleNames = {}
+        for style in self.readXmlPart(docxZip, path).iter(WORD_NAMESPACE + 'style'):
+            styleNames[style.get(WORD_NAMESPACE + 'styleId')] = \
+                getPropertyValue(style, WORD_NAMESPACE + 'name')
+        return styleNames
+
+    # Method to read the targets of the document's relationships (used for
+    # hyperlinks)
+    # Parameters:
+    #     docxZip:  The open ZipFile
+    #     path:     The path of the relationships part
+    # Returns: dict of str  Targets, keyed on relationship ID
+    def readRelationships(self, docxZip, path):
+        return {relationship.get('Id'): relationship.get('Target')
+                for relationship in self.readXmlPart(docxZip, path)
+                if relationship.tag == PACKAGE_RELATIONSHIP_NAMESPACE + 'Relationship'}
+
+    # Method to find any content in the document which the streaming reader
+    # doesn't support (and would leave out)
+    # Parameters:
+    #     docxZip:        The open ZipFile
+    #     partDirectory:  The directory of the main document part
+    #     path:           The path of the relationships part
+    # Returns: [] of str  The types of unsupported content found (image,
+    #     footnotes, endnotes and/ or comments)
+    def findUnsupportedContent(self, docxZip, partDirectory, path):
+        found = []
+        for relationship in self.readXmlPart(docxZip, path):
+            relationshipType = relationship.get('Type', '')
+            if not relationshipType.startswith(RELATIONSHIP_TYPE_PREFIX):
+                continue
+            contentType = relationshipType[len(RELATIONSHIP_TYPE_PREFIX):]
+            if contentType not in UNSUPPORTED_PARTS or contentType in found:
+                continue
+
+            itemTag = UNSUPPORTED_PARTS[contentType]
+            if itemTag is not None:
+                target = relationship.get('Target', '')
+                if target.startswith('/'):
+                    partPath = target.lstrip('/')
+                else:
+                    partPath = posixpath.normpath(posixpath.join(partDirectory, target))
+                part = self.readXmlPart(docxZip, partPath)
+                if all(item.get(WORD_NAMESPACE + 'type') in NOTE_SEPARATOR_TYPES
+                       for item in part.iter(itemTag)):
+                    continue
+            found.append(contentType)
+        return found
+
+    # Method to read the document's list definitions
+    # Parameters:
+    #     docxZip:  The open ZipFile
+    #     path:     The path of the numbering part
+    # Returns: (dict, dict)  Whether each list level is ordered, keyed on
+    #     (numbering ID, level), and the (level, ordered) of each paragraph
+    #     style which is a list style
+    def readNumbering(self, docxZip, path):
+        numbering = self.readXmlPart(docxZip, path)
+
+        abstractLevels = {}
+        styleListLevels = {}
+        for abstractNum in numbering.iter(WORD_NAMESPACE + 'abstractNum'):
+            levels = {}
+            for level in abstractNum.iter(WORD_NAMESPACE + 'lvl'):
+                levelIndex = level.get(WORD_NAMESPACE + 'ilvl') or '0'
+                isOrdered = getPropertyValue(level, WORD_NAMESPACE + 'numFmt') != 'bullet'
+                levels.setdefault(levelIndex, isOrdered)
+                styleId = getPropertyValue(level, WORD_NAMESPACE + 'pStyle')
+                if styleId is not None:
+                    styleListLevels[styleId] = (int(levelIndex), isOrdered)
+            abstractLevels[abstractNum.get(WORD_NAMESPACE + 'abstractNumId')] = levels
+
+        listLevels = {}
+        for num in numbering.iter(WORD_NAMESPACE + 'num'):
+            abstractNumId = getPropertyValue(num, WORD_NAMESPACE + 'abstractNumId')
+            for levelIndex, isOrdered in abstractLevels.get(abstractNumId, {}).items():
+                listLevels[(num.get(WORD_NAMESPACE + 'numId'), levelIndex)] = isOrdered
+
+        return listLevels, styleListLevels
+
+    # Method to read the document's top-level elements as HTML, one at a time.
+    # Consecutive list paragraphs are returned together, as a single list.
+    # Returns: generator of str
+    def iterElements(self):
+        openLists = []
+        listItems = []
+
+        for element in self.iterBodyElements():
+            if element.tag == W_TABLE:
+                listHtml = self.closeLists(openLists, listItems)
+                if listHtml:
+                    yield listHtml
+                yield writeHtml(stripEmpty([self.convertTable(element)]))
+                continue
+
+            listLevel = self.getListLevel(element)
+            if listLevel is None:
+                listHtml = self.closeLists(openLists, listItems)
+                if listHtml:
+                    yield listHtml
+                paragraphHtml = writeHtml(collapse(stripEmpty([self.convertParagraph(element)])))
+                if paragraphHtml:
+                    yield paragraphHtml
+            else:
+                self.addListItem(element, listLevel, openLists, listItems)
+
+        listHtml = self.closeLists(openLists, listItems)
+        if listHtml:
+            yield listHtml
+
+    # Method to read the document body's top-level paragraphs and tables,
+    # discarding each one once the caller is done with it
+    # Returns: generator of xml.etree.ElementTree.Element
+    def iterBodyElements(self):
+        with zipfile.ZipFile(self.filename) as docxZip:
+            with docxZip.open(self.documentPath) as documentFile:
+                parser = ElementTree.XMLPullParser(events=('start', 'end'))
+                openElements = []
+                bodyDepth = None
+
+                while True:
+                    data = documentFile.read(READ_SIZE)
+                    if not data:
+                        break
+                    self.bytesRead += len(data)
+                    parser.feed(data)
+
+                    for event, element in parser.read_events():
+                        if event == 'start':
+                            openElements.append(element)
+                            if element.tag == W_BODY:
+                                bodyDepth = len(openElements)
+                            continue
+
+                        openElements.pop()
+                        if bodyDepth is None or len(openElements) < bodyDepth or \
+                                element.tag not in (W_PARAGRAPH, W_TABLE):
+                            continue
+
+                        # Only paragraphs and tables which aren't inside
+                        # another paragraph or table are top-level elements
+                        containers = openElements[bodyDepth:]
+                        if all(container.tag in BODY_CONTAINER_TAGS for container in containers):
+                            yield element
+                            openElements[-1].remove(element)
+
+                parser.close()
+
+    # Method to get the list level of a paragraph
+    # Parameters:
+    #     paragraph:  The paragraph element
+    # Returns: (int, boolean)  The level and whether the list is ordered, or
+    #     None if the paragraph isn't in a list (or is a heading)
+    def getListLevel(self, paragraph):
+        properties = paragraph.find(WORD_NAMESPACE + 'pPr')
+        styleId = getPropertyValue(properties, WORD_NAMESPACE + 'pStyle')
+        if self.getHeadingTag(styleId):
+            return None
+
+        numId = getPropertyValue(properties, WORD_NAMESPACE + 'numPr/' + WORD_NAMESPACE + 'numId')
+        levelIndex = getPropertyValue(properties, WORD_NAMESPACE + 'numPr/' + WORD_NAMESPACE + 'ilvl')
+        if numId is not None:
+            isOrdered = self.listLevels.get((numId, levelIndex or '0'))
+            if isOrdered is not None:
+                return (int(levelIndex or '0'), isOrdered)
+
+        return self.styleListLevels.get(styleId)
+
+    # Method to get the heading tag for a paragraph style
+    # Parameters:
+    #     styleId:  The ID of the paragraph style (or None)
+    # Returns: str  The tag (e.g. 'h1'), or None if it's not a heading style
+    def getHeadingTag(self, styleId):
+        if styleId is None:
+            return None
+        for name in (styleId, self.styleNames.get(styleId)):
+            if name == APPLE_HEADING_STYLE:
+                return 'h1'
+            match = HEADING_STYLE_REGEX.match(name or '')
+            if match:
+                return 'h' + match.group(1)
+        return None
+
+    # Method to add a list paragraph to the list(s) being built, in the same
+    # way mammoth nests lists
+    # Parameters:
+    #     paragraph:  The paragraph element
+    #     listLevel:  (int, boolean)  The level and whether the list is ordered
+    #     openLists:  [] of HtmlElement  The lists currently open, outermost
+    #                 first
+    #     listItems:  [] of HtmlElement  The top-level lists built so far
+    def addListItem(self, paragraph, listLevel, openLists, listItems):
+        level, isOrdered = listLevel
+        listTag = 'ol' if isOrdered else 'ul'
+
+        itemChildren = collapse(stripEmpty(self.convertInline(paragraph)))
+        if not itemChildren:
+            return
+        item = HtmlElement('li', children=itemChildren)
+
+        # Close any lists deeper than this item, or of the wrong type
+        del openLists[level + 1:]
+        if len(openLists) == level + 1 and openLists[-1].tag != listTag:
+            del openLists[level:]
+
+        # Open lists down to this item's level, each inside the last item of
+        # the list above it
+        while len(openLists) <= level:
+            newList = HtmlElement(listTag if len(openLists) == level else 'ul')
+            if openLists:
+                parentList = openLists[-1]
+                if not parentList.children:
+                    parentList.children.append(HtmlElement('li'))
+                parentList.children[-1].children.append(newList)
+            else:
+                listItems.append(newList)
+            openLists.append(newList)
+
+        openLists[-1].children.append(item)
+
+    # Method to close all the open lists
+    # Parameters:
+    #     openLists:  [] of HtmlElement  The lists currently open
+    #     listItems:  [] of HtmlElement  The top-level lists built so far
+    # Returns: str  The HTML of the lists (empty if there weren't any)
+    def closeLists(self, openLists, listItems):
+        listHtml = writeHtml(listItems)
+        del openLists[:]
+        del listItems[:]
+        return listHtml
+
+    # Method to convert a paragraph
+    # Parameters:
+    #     paragraph:  The paragraph element
+    # Returns: HtmlElement
+    def convertParagraph(self, paragraph):
+        properties = paragraph.find(WORD_NAMESPACE + 'pPr')
+        styleId = getPropertyValue(properties, WORD_NAMESPACE + 'pStyle')
+        return HtmlElement(self.getHeadingTag(styleId) or 'p',
+                           children=self.convertInline(paragraph))
+
+    # Method to convert a table
+    # Parameters:
+    #     table:  The table element
+    # Returns: HtmlElement
+    def convertTable(self, table):
+        headerRows = []
+        bodyRows = []
+        for row in table.iter(WORD_NAMESPACE + 'tr'):
+            isHeader = isPropertyOn(row.find(WORD_NAMESPACE + 'trPr'), 'tblHeader')
+            if isHeader and not bodyRows:
+                headerRows.append(self.convertTableRow(row, 'th'))
+            else:
+                bodyRows.append(self.convertTableRow(row, 'td'))
+
+        if headerRows:
+            children = [HtmlElement('thead', children=headerRows),
+                        HtmlElement('tbody', children=bodyRows)]
+        else:
+            children = bodyRows
+        return HtmlElement('table', children=children, forceWrite=True)
+
+    # Method to convert a table row
+    # Parameters:
+    #     row:      The row element
+    #     cellTag:  The tag to use for cells ('th' or 'td')
+    # Returns: HtmlElement
+    def convertTableRow(self, row, cellTag):
+        cells = []
+        for cell in row.findall(WORD_NAMESPACE + 'tc'):
+            properties = cell.find(WORD_NAMESPACE + 'tcPr')
+            if properties is not None:
+                verticalMerge = properties.find(WORD_NAMESPACE + 'vMerge')
+                if verticalMerge is not None and verticalMerge.get(W_VAL) != 'restart':
+                    continue
+
+            attributes = {}
+            colspan = getPropertyValue(properties, WORD_NAMESPACE + 'gridSpan')
+            if colspan and colspan != '1':
+                attributes['colspan'] = colspan
+
+            paragraphs = [self.convertParagraph(paragraph)
+                          for paragraph in cell.findall(W_PARAGRAPH)]
+            cells.append(HtmlElement(cellTag,
+                                     attributes,
+                                     collapse(stripEmpty(paragraphs)),
+                                     forceWrite=True))
+        return HtmlElement('tr', children=cells, forceWrite=True)
+
+    # Method to convert the content of a paragraph (or part of one)
+    # Parameters:
+    #     parent:  The element containing the content
+    # Returns: [] of HtmlElement or str
+    def convertInline(self, parent):
+        nodes = []
+        for child in parent:
+            tag = child.tag
+            if tag == W_RUN:
+                nodes.extend(self.convertRun(child))
+            elif tag == WORD_NAMESPACE + 'hyperlink':
+                nodes.append(self.convertHyperlink(child))
+            elif tag == WORD_NAMESPACE + 'bookmarkStart':
+                name = child.get(WORD_NAMESPACE + 'name')
+                if name != '_GoBack':
+                    nodes.append(HtmlElement('a', {'id': name}, collapsible=True, forceWrite=True))
+            elif tag == WORD_NAMESPACE + 'sdt':
+                content = child.find(WORD_NAMESPACE + 'sdtContent')
+                if content is not None:
+                    nodes.extend(self.convertInline(content))
+            elif tag == COMPATIBILITY_NAMESPACE + 'AlternateContent':
+                fallback = child.find(COMPATIBILITY_NAMESPACE + 'Fallback')
+                if fallback is not None:
+                    nodes.extend(self.convertInline(fallback))
+            elif tag in INLINE_CONTAINER_TAGS:
+                nodes.extend(self.convertInline(child))
+        return nodes
+
+    # Method to convert a run of text, wrapping it in tags for its formatting
+    # Parameters:
+    #     run:  The run element
+    # Returns: [] of HtmlElement or str
+    def convertRun(self, run):
+        nodes = []
+        for child in run:
+            tag = child.tag
+            if tag == W_TEXT:
+                nodes.append(child.text or '')
+            elif tag == WORD_NAMESPACE + 'tab':
+                nodes.append('\t')
+            elif tag == WORD_NAMESPACE + 'br':
+                if child.get(WORD_NAMESPACE + 'type') in (None, 'textWrapping'):
+                    nodes.append(HtmlElement('br'))
+            elif tag == WORD_NAMESPACE + 'noBreakHyphen':
+                nodes.append('\u2011')
+            elif tag == WORD_NAMESPACE + 'softHyphen':
+                nodes.append('\u00ad')
+            elif tag in INLINE_CONTAINER_TAGS or \
+                    tag == COMPATIBILITY_NAMESPACE + 'AlternateContent':
+                nodes.extend(self.convertInline(child))
+
+        # Wrap the text in the same order as mammoth, innermost first
+        properties = run.find(WORD_NAMESPACE + 'rPr')
+        wrappers = []
+        if isPropertyOn(properties, 'strike'):
+            wrappers.append('s')
+        verticalAlignment = getPropertyValue(properties, WORD_NAMESPACE + 'vertAlign')
+        if verticalAlignment == 'subscript':
+            wrappers.append('sub')
+        if verticalAlignment == 'superscript':
+            wrappers.append('sup')
+        if isPropertyOn(properties, 'i'):
+            wrappers.append('em')
+        if isPropertyOn(properties, 'b'):
+            wrappers.append('strong')
+        styleId = getPropertyValue(properties, WORD_NAMESPACE + 'rStyle')
+        if styleId is not None and self.styleNames.get(styleId) == 'Strong':
+            wrappers.append('strong')
+
+        for wrapper in wrappers:
+            nodes = [HtmlElement(wrapper, children=nodes, collapsible=True)]
+        return nodes
+
+    # Method to convert a hyperlink
+    # Parameters:
+    #     hyperlink:  The hyperlink element
+    # Returns: HtmlElement
+    def convertHyperlink(self, hyperlink):
+        anchor = hyperlink.get(WORD_NAMESPACE + 'anchor')
+        if anchor is not None:
+            href = '#' + anchor
+        else:
+            href = self.relationships.get(hyperlink.get(RELATIONSHIP_NAMESPACE + 'id'), '')
+
+        attributes = {'href': href}
+        targetFrame = hyperlink.get(WORD_NAMESPACE + 'tgtFrame')
+        if targetFrame:
+            attributes['target'] = targetFrame
+        return HtmlElement('a', attributes, self.convertInline(hyperlink), collapsible=True)
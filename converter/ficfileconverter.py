@@ -1,251 +1,650 @@
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, Tag
+import io
 import re
 import os
 from config.manager import getConfigManager, OUTPUT_DIR
+from converter.blockcache import blockCache, documentCache
+from converter.docxreader import DocxStreamReader
+from converter.htmlreader import HtmlStreamReader
+from converter.odtreader import OdtStreamReader
+from converter.formats import FORMAT_HTML, RENDER_HTML, RENDER_TEXT, createOutputWriters, getFormatPath, getRenderings, writeOutputs
+from converter.progress import checkCancelled
+from converter.tracing import traceSpan
+from converter.transforms import ChatState, getChatTransform
 import mammoth
 from common.definitions import *
 
-# Method to wrap the given element in a <span> with the specified class
+# Pattern matching the "|||" delimiter used to denote the start and end of
+# text blocks
+TEXT_DELIMITER_REGEX = re.compile('\|\|\|')
+
+# Version of the converter's output. Increase this whenever a change to the
+# converter changes its output, so that incremental builds (see
+# converter.project) know to rebuild everything.
+CONVERTER_VERSION = 2
+
+# Documents bigger than this (in bytes) are streamed through the converter one
+# block at a time, rather than being converted in memory. Only the block being
+# converted is held in memory, at the cost of the parts of mammoth's output
+# that the streaming reader doesn't support (see converter.docxreader).
+STREAMING_THRESHOLD_BYTES = 16 * 1024 * 1024
+
+# Amount of document HTML (in characters) parsed at a time when streaming
+STREAMING_BATCH_BYTES = 64 * 1024
+
+# The streaming reader for each type of document. .docx files are only read
+# with it when they're streamed (mammoth is used otherwise) - other documents
+# are always read with it, straight into the same HTML mammoth produces.
+STREAM_READERS = {'.docx': DocxStreamReader,
+                  '.odt': OdtStreamReader,
+                  '.html': HtmlStreamReader,
+                  '.htm': HtmlStreamReader}
+
+# Method to transform the chat blocks in the given soup into styled message
+# blocks, running each chat through the stages of the chat transform (see
+# converter.transforms)
 # Parameters:
-#     element:      The element to wrap
-#     classString:  The class to use for the parent <span>
-# Returns: bs4.element.Tag  The parent <span> wrapping the element
-def wrapWithClass(soup, element, classString):
-    element.wrap(soup.new_tag('span'))
-    parentSpan = element.parent
-    addClass(soup, parentSpan, classString)
-
-    return parentSpan
-
-# Method to insert a line break (<br> tag) into the given element at a specified
-# position. If the position is -1, add it to the end.
-# Parameters:
-#     parent:    The parent into which to insert the break
-#     hidden:    Whether the break should have the 'hide' class set
-#     position:  The position at which to insert the break
-def insertBreak(soup, parent, hidden, position):
-    breakTag = soup.new_tag('br')
-
-    if position == -1:
-        parent.append(breakTag)
-    else:
-        parent.insert(position, breakTag)
-
-    if hidden:
-        wrapWithClass(soup, breakTag, 'hide')
-
-# Method to add a class to a tag, preserving any classes which already exist
-# Parameters:
-#     element:      The tag
-#     classString:  The class to add
-def addClass(soup, element, classString):
-    element['class'] = ' '.join([element.get('class', ''), classString])
-
-# Method to end the given speaker block, adding it to the message block. Sets
-# "bottom-text" class on the last message in the block, which allows the "tail"
-# to be displayed on the last message from a given sender.
-# Parameters:
-#     speakerBlock:  The speaker block to end
-#     messageBlock:  The parent message block
-def endSpeakerBlock(soup, speakerBlock, messageBlock):
-    if speakerBlock:
-        addClass(soup, speakerBlock.find_all('span')[-1], 'bottom-text')
-        insertBreak(soup, speakerBlock, True, -1)
-        messageBlock.append(speakerBlock)
-
-# Method to start a new speaker block, which is a <span> tag containing a series
-# of messages from a single  sender. Initiates the tag, styles it appropriately
-# (taking into account whether the sender is the 'group leader', whose messages
-# appear on the right). Also adds a name-tag containing the sender's name,
-# and then first message.
-# Parameters:
-#     message:      The first message to be added to the block
-#     sender:       The name of the sender
-#     groupLeader:  The 'group leader' for the message block
-# Returns: bs4.element.Tag  The speaker block
-def startSpeakerBlock(soup, message, sender, groupLeader):
-    speakerBlock = soup.new_tag('span')
-    speakerBlock['class'] = 'sender-block ' + sender.lower()
-    if (sender == groupLeader):
-        speakerBlock['class'] = speakerBlock['class'] + ' group-leader'
-    addClass(soup, message, 'top-text')
-    nameTag = soup.new_tag('span')
-    nameTag['class'] = 'name-tag'
-    nameTag.string = sender
-    speakerBlock.append(nameTag)
-    nameTag.wrap(soup.new_tag('strong'))
-    insertBreak(soup, speakerBlock, False, -1)
-    speakerBlock.append(message)
-    insertBreak(soup, speakerBlock, False, -1)
-
-    return speakerBlock
-
-# Method to process a given .docx file
-# Parameters:
-#     filename:  The path of the file to process
-# Returns: [str, set(str)]  The output file path (str), and a set of names of
-#     senders of messages identified in this file
-def processFile(filename):
-    # Get the file contents and convert to HTML (using mammoth library)
-    with open(filename, 'rb') as docxFile:
-        result = mammoth.convert_to_html(docxFile)
-        htmlDoc = result.value
-
-    # Parse the HTML to BeautifulSoup
-    soup = BeautifulSoup(htmlDoc, 'html.parser', multi_valued_attributes=None)
-
-    # Keep track of any characters we find sending messages
-    characters = set()
+#     transform:   The compiled ChatTransform
+#     characters:  Set to add the names of any senders found to
+#     messages:    [] to add the sender as written, character and wrapped
+#                  <span> of each message found to (optional)
+def transformChatBlocks(soup, transform, characters, messages=None):
+    headerStages = transform.headerStages
+    messageStages = transform.messageStages
+    finishStages = transform.finishStages
 
     # Find all instances of the "|||" delimiter string used to denote the start
     # and end of text blocks
-    textDelimiters = soup.find_all(string=re.compile('\|\|\|'))
+    textDelimiters = soup.find_all(string=TEXT_DELIMITER_REGEX)
 
     # If delimiters still exist, we still have text blocks to process - do that
     while textDelimiters:
         # Get the message block header paragraph (starts with "|||")
         blockStart = textDelimiters[0]
-        parentPara = blockStart.find_parent('p')
-
-        # Replace the paragraph with a styled span
-        messagesHeader = wrapWithClass(soup, parentPara, 'messages-header')
-
-        # Add a 'chat name' prefix to the message header
-        chatNameSpan = soup.new_tag('span')
-        chatNameSpan.string = 'Chat name: '
-        addClass(soup, chatNameSpan, 'hide')
-        parentPara.insert(0, chatNameSpan)
-
-        # Get rid of the parent paragraph
-        parentPara.wrap(soup.new_tag('strong'))
-        parentPara.unwrap()
-
-        # Strip out the "|||" delimiter from the header
-        blockStart.replace_with(blockStart.strip('| '))
+        state = ChatState(soup, characters, blockStart.find_parent('p'), blockStart)
+        for stage in headerStages:
+            stage(state)
 
         # Build a list of messages we need to process - i.e. everything until
         # the next "|||" line
         messagesInBlock = []
-        for sibling in messagesHeader.find_next_siblings('p'):
+        for sibling in state.header.find_next_siblings('p'):
             if sibling.get_text().startswith('|||'):
                 sibling.decompose()
                 break
             else:
                 messagesInBlock.append(sibling)
 
-        # The person who sends the first message is assigned as the "group
-        # leader" - their texts appear on the right
-        groupLeader = None
-
-        # Set up a container for all the messages in this block
-        messageContainer = soup.new_tag('span')
-        messageContainer['class'] = 'message-block'
-
-        # Keep track of the currently active speaker and their message block
-        speakerBlock = None
-        lastSender = None
-
-        # Loop through and process the messages
+        # Loop through and process the messages, each by the first stage which
+        # handles it
         for message in messagesInBlock:
             # For our purposes, the interesting 'content' is the first bit of
-            # text within the tag
-            content = next(message.strings)
-
-            # See if we've got a comment
-            if (content).startswith('///'):
-                # Whoever was speaking has been interrupted
-                if speakerBlock:
-                    endSpeakerBlock(soup, speakerBlock, messageContainer)
-                    speakerBlock = None
-
-                # Handle the comment - wrap it in a styled <span> and ditch the
-                # <p> and "///"
-                wrappedMessage = wrapWithClass(soup, message, 'message-action')
-                message.wrap(soup.new_tag('i'))
-                message.unwrap()
-                content.replace_with(content.strip('/ '))
-                messageContainer.append(wrappedMessage)
-                insertBreak(soup, messageContainer, True, -1)
-                insertBreak(soup, messageContainer, True, -1)
-
-                # This was a comment so we're done processing it
+            # text within the tag. A paragraph with no text at all (e.g. just
+            # a line break) has nothing to show in a chat, so it's dropped.
+            content = next(message.strings, None)
+            if content is None:
+                message.decompose()
                 continue
+            for stage in messageStages:
+                if stage(state, message, content):
+                    break
 
-            # If we've got here, we've got a message (not a comment) - style it
-            # as such
-            wrappedMessage = wrapWithClass(soup, message, 'message')
-            message.unwrap()
+        # We're done processing messages - put the chat together
+        for stage in finishStages:
+            stage(state)
 
-            # Find out who sent the message (it should start with their name,
-            # followed by ": ")
-            result = re.match(r'([A-Za-z0-9]+?): .+', content)
+        if messages is not None:
+            messages.extend(state.messages)
 
-            # If this doesn't seem to be a message, the safest thing to do is to
-            # skip it
-            if not result:
-                continue
-
-            # Get the sender (we've already captured it, just assign it a nice
-            # name)
-            sender = result.group(1)
-
-            # Add the speaker to our running list
-            characters.add(sender)
-
-            # Strip the sender name from the message (this is crude but
-            # effective)
-            content.replace_with(content[len(sender) + 2:])
-
-            # If we don't have a main author yet, this sender can have the role
-            if not groupLeader:
-                groupLeader = sender
-
-            # If this is a new sender, close out the speaker block and start a
-            # new one
-            if (not sender == lastSender):
-                endSpeakerBlock(soup, speakerBlock, messageContainer)
-                speakerBlock = startSpeakerBlock(soup,
-                                                 wrappedMessage,
-                                                 sender,
-                                                 groupLeader)
-                lastSender = sender
+        # Re-scan for "|||" delimiters
+        textDelimiters = soup.find_all(string=TEXT_DELIMITER_REGEX)
+
+# Method to split the top-level elements of a converted document into blocks:
+# either a chat (a "|||" header paragraph and the message paragraphs after
+# it, up to the closing "|||" line), or a single element outside of any chat.
+# The closing "|||" line is dropped. Any non-paragraph elements found inside a
+# chat are moved to straight after it. Elements are only read as they're
+# needed, so they can be streamed in.
+# Parameters:
+#     elements:  Iterable of the document's top-level elements
+# Returns: generator of (boolean, [] of bs4.element.PageElement)  Whether the
+#     block is a chat, and the elements in the block
+def splitIntoBlocks(elements):
+    elements = iter(elements)
+
+    for element in elements:
+        if not (isinstance(element, Tag) and element.name == 'p' and
+                element.find(string=TEXT_DELIMITER_REGEX)):
+            yield False, [element]
+            continue
+
+        chatElements = [element]
+        otherElements = []
+        for sibling in elements:
+            if isinstance(sibling, Tag) and sibling.name == 'p':
+                if sibling.get_text().startswith('|||'):
+                    break
+                chatElements.append(sibling)
             else:
-                # Otherwise, add the message to the current speaker block
-                speakerBlock.append(wrappedMessage)
-                insertBreak(soup, speakerBlock, False, -1)
+                otherElements.append(sibling)
+
+        yield True, chatElements
+        for otherElement in otherElements:
+            yield False, [otherElement]
+
+# Method to get the output HTML for an element outside of any chat
+# Parameters:
+#     element:  The element
+# Returns: str
+def renderElement(element):
+    if isinstance(element, Tag):
+        return element.prettify()
+    return str(element)
+
+# Method to get the text of an element as a reader would see it: line breaks
+# kept, and anything hidden (e.g. the spacers in chats) left out
+# Parameters:
+#     element:  The element
+# Returns: str
+def getVisibleText(element):
+    parts = []
+    for child in element.children:
+        if not isinstance(child, Tag):
+            parts.append(str(child))
+        elif child.name == 'br':
+            parts.append('\n')
+        elif 'hide' not in (child.get('class') or '').split():
+            parts.append(getVisibleText(child))
+    return ''.join(parts)
+
+# Method to get the lines of text an element shows, without surrounding
+# whitespace (line breaks in the element split it into lines)
+# Parameters:
+#     element:  The element
+# Returns: [] of str
+def getVisibleLines(element):
+    return [line.strip() for line in getVisibleText(element).strip().split('\n')]
 
-        # We're done processing messages - close out the last speaker block
-        endSpeakerBlock(soup, speakerBlock, messageContainer)
+# Method to get the plain text for an element outside of any chat
+# Parameters:
+#     element:  The element
+# Returns: str
+def renderElementText(element):
+    if not isinstance(element, Tag):
+        text = str(element).strip()
+    elif element.name in ('ul', 'ol'):
+        text = '\n'.join(('%d. ' % number if element.name == 'ol' else '- ') +
+                         getVisibleText(item).strip()
+                         for number, item in enumerate(element.find_all('li'), 1))
+    elif element.name == 'table':
+        text = '\n'.join(' | '.join(getVisibleText(cell).strip()
+                                    for cell in row.find_all(['td', 'th']))
+                         for row in element.find_all('tr'))
+    elif element.name in ('h1', 'h2', 'h3', 'h4', 'h5', 'h6'):
+        text = getVisibleText(element).strip()
+        text = text + '\n' + ('=' if element.name == 'h1' else '-') * len(text)
+    else:
+        text = getVisibleText(element).strip()
 
-        # Add the message container to the HTML and move the header inside it
-        messagesHeader.insert_after(messageContainer)
-        insertBreak(soup, messageContainer, True, 0)
-        messageContainer.insert(1, messagesHeader)
-        insertBreak(soup, messageContainer, True, 2)
-        insertBreak(soup, messageContainer, True, 3)
+    return text + '\n\n' if text else ''
 
-        # Add a "delimiter bar" (which we'll style to act as a spacer) after the
-        # message block
-        delimiterBox = soup.new_tag('span')
-        delimiterBox['class'] = 'delimiter-bar'
-        messageContainer.append(delimiterBox)
+# Method to add the plain text lines for the (transformed) contents of an
+# element of a chat
+# Parameters:
+#     element:  The element
+#     lines:    [] of str  The lines to add to
+def addChatTextLines(element, lines):
+    for child in element.children:
+        if not isinstance(child, Tag):
+            if child.strip():
+                lines.append(child.strip())
+            continue
+
+        # Sender blocks also carry the sender's class, which could be anything,
+        # so they're checked for first
+        classes = (child.get('class') or '').split()
+        if 'sender-block' in classes:
+            addChatTextLines(child, lines)
+        elif 'hide' in classes or 'delimiter-bar' in classes:
+            continue
+        elif 'messages-header' in classes:
+            lines.append('[ ' + getVisibleText(child).strip() + ' ]')
+        elif 'name-tag' in classes:
+            lines.append(getVisibleText(child).strip() + ':')
+        elif 'message' in classes:
+            # Every line of a message is indented, so the lines after a line
+            # break still read as part of it
+            lines.append('    ' + '\n    '.join(getVisibleLines(child)))
+        elif 'message-action' in classes:
+            lines.append('* ' + '\n  '.join(getVisibleLines(child)) + ' *')
+        else:
+            addChatTextLines(child, lines)
+
+# Method to get the plain text for a transformed chat block, e.g.
+#     [ Besties ]
+#     Alice:
+#         Hi Frank!
+#         How are you?
+#     * Alice added Lily *
+# Parameters:
+#     soup:  The transformed chat block
+# Returns: str
+def renderChatText(soup):
+    lines = []
+    addChatTextLines(soup, lines)
+    return '\n'.join(lines) + '\n\n'
+
+# Functions to render a transformed chat block, and an element outside of any
+# chat, for each rendering
+CHAT_RENDERERS = {RENDER_HTML: lambda soup: soup.prettify(),
+                  RENDER_TEXT: renderChatText}
+ELEMENT_RENDERERS = {RENDER_HTML: renderElement,
+                     RENDER_TEXT: renderElementText}
+
+# Method to get the key a rendering of a block or document is cached under
+# (the HTML rendering keeps the plain roster digest)
+# Parameters:
+#     rosterDigest:  The digest of the roster
+#     rendering:     The rendering
+# Returns: str
+def getRenderingDigest(rosterDigest, rendering):
+    if rendering == RENDER_HTML:
+        return rosterDigest
+    return rosterDigest + '/' + rendering
+
+# Method to convert a single chat block to output HTML (and/ or any other
+# renderings). Converted blocks are cached, so a block which hasn't changed
+# since it was last converted (with the same character config) costs nothing.
+# Parameters:
+#     source:        The source HTML of the block
+#     transform:     The compiled ChatTransform
+#     rosterDigest:  The digest of the roster the transform was built from
+#                    (including its plugins' digest)
+#     renderings:    The renderings wanted (optional - defaults to HTML)
+# Returns: (tuple of str, frozenset(str), tuple)  The block in each
+#     rendering, the names of senders identified in the block, and the sender
+#     as written, character and text of each message in it
+def convertChatBlock(source, transform, rosterDigest, renderings=(RENDER_HTML,)):
+    keys = [blockCache.getKey(source, getRenderingDigest(rosterDigest, rendering))
+            for rendering in renderings]
+    cached = [blockCache.get(key) for key in keys]
+
+    if all(converted is not None for converted in cached):
+        return tuple(converted[0] for converted in cached), cached[0][1], cached[0][2]
+
+    with traceSpan('transform'):
+        soup = BeautifulSoup(source, 'html.parser', multi_valued_attributes=None)
+        characters = set()
+        messages = []
+        transformChatBlocks(soup, transform, characters, messages)
+    characters = frozenset(characters)
+    messages = tuple((sender, character, getVisibleText(message).strip())
+                     for sender, character, message in messages)
+
+    outputs = []
+    for rendering, key in zip(renderings, keys):
+        with traceSpan('serialize'):
+            output = CHAT_RENDERERS[rendering](soup)
+        blockCache.put(key, (output, characters, messages))
+        outputs.append(output)
+
+    return tuple(outputs), characters, messages
+
+# Method to convert blocks of a document to output HTML (and/ or any other
+# renderings), one at a time
+# Parameters:
+#     blocks:      Iterable of blocks, as produced by splitIntoBlocks
+#     roster:      The CharacterRoster to identify senders with
+#     characters:  Set to add the names of any senders found to
+#     renderings:  The renderings wanted (optional - defaults to HTML)
+#     plugins:     Iterable of str  The module names of the transform plugins
+#                  to use (optional)
+#     messages:    [] to add the block number (from 1), sender as written,
+#                  character and text of each message found to (optional)
+# Returns: generator of tuple of str  Each block in each rendering
+def convertBlocks(blocks, roster, characters, renderings=(RENDER_HTML,), plugins=(), messages=None):
+    # Get the (cached) chat transform for the character config and plugins
+    transform = getChatTransform(roster, plugins)
+    rosterDigest = roster.getDigest() + transform.digest
+    elementRenderers = [ELEMENT_RENDERERS[rendering] for rendering in renderings]
+
+    for blockNumber, (isChat, elements) in enumerate(blocks, 1):
+        if isChat:
+            source = ''.join(str(element) for element in elements)
+            outputs, blockCharacters, blockMessages = convertChatBlock(source,
+                                                                       transform,
+                                                                       rosterDigest,
+                                                                       renderings)
+            characters.update(blockCharacters)
+            if messages is not None:
+                messages.extend((blockNumber,) + message for message in blockMessages)
+            yield outputs
+        else:
+            yield tuple(renderer(elements[0]) for renderer in elementRenderers)
+
+# Method to convert a document's HTML (as produced by mammoth) to the output
+# HTML (and/ or any other renderings), one block at a time
+# Parameters:
+#     htmlDoc:      The document HTML
+#     roster:       The CharacterRoster to identify senders with
+#     renderings:   The renderings wanted
+#     progress:     Function called after each block with the number of
+#                   blocks done, the total number of blocks, and the number of
+#                   bytes of the input file read (optional)
+#     cancelToken:  CancellationToken checked between blocks (optional)
+#     bytesRead:    The size of the input file, for progress reports
+#     plugins:      Iterable of str  The module names of the transform
+#                   plugins to use (optional)
+#     messages:     [] to add the messages found to (optional - see
+#                   convertBlocks)
+# Returns: [tuple of str, set(str)]  The document in each rendering, and a set
+#     of names of senders of messages identified in the document
+def renderHtml(htmlDoc, roster, renderings, progress=None, cancelToken=None, bytesRead=0, plugins=(), messages=None):
+    # Parse the HTML to BeautifulSoup
+    with traceSpan('parse'):
+        soup = BeautifulSoup(htmlDoc, 'html.parser', multi_valued_attributes=None)
+        blocks = list(splitIntoBlocks(soup.contents))
+    checkCancelled(cancelToken)
+
+    # Keep track of any characters we find sending messages
+    characters = set()
+    outputParts = [[] for rendering in renderings]
 
-        # Pop the whole message block in a paragraph tag, else AO3 gets upset
-        messageContainer.wrap(soup.new_tag('p'))
+    for blockNumber, outputs in enumerate(convertBlocks(blocks, roster, characters, renderings, plugins, messages), 1):
+        for parts, output in zip(outputParts, outputs):
+            parts.append(output)
 
-        # Re-scan for "|||" delimiters
-        textDelimiters = soup.find_all(string=re.compile('\|\|\|'))
+        if progress is not None:
+            progress(blockNumber, len(blocks), bytesRead)
+        if cancelToken is not None:
+            cancelToken.check()
 
-    # We're done! Output the result to a file.
-    if not os.path.exists(OUTPUT_DIR):
-        os.makedirs(OUTPUT_DIR)
+    return [tuple(''.join(parts) for parts in outputParts), characters]
 
-    outfilePath = os.path.join(OUTPUT_DIR,
-                               os.path.basename(filename)[:-5] + '.html')
+# Method to convert a document's HTML (as produced by mammoth) to the output
+# HTML, one block at a time
+# Parameters:
+#     htmlDoc:      The document HTML
+#     roster:       The CharacterRoster to identify senders with
+#     progress:     Progress callback (optional - see renderHtml)
+#     cancelToken:  CancellationToken checked between blocks (optional)
+#     bytesRead:    The size of the input file, for progress reports
+#     plugins:      Iterable of str  The module names of the transform
+#                   plugins to use (optional)
+# Returns: [str, set(str)]  The output HTML, and a set of names of senders of
+#     messages identified in the document
+def convertHtml(htmlDoc, roster, progress=None, cancelToken=None, bytesRead=0, plugins=()):
+    outputs, characters = renderHtml(htmlDoc,
+                                     roster,
+                                     (RENDER_HTML,),
+                                     progress,
+                                     cancelToken,
+                                     bytesRead,
+                                     plugins)
+    return [outputs[0], characters]
+
+# Method to check whether a document is a .docx file (rather than another
+# type of document with only a streaming reader)
+# Parameters:
+#     filename:  The path of the document
+# Returns: boolean
+def isDocxFile(filename):
+    return os.path.splitext(filename)[1].lower() == '.docx'
 
-    with open(outfilePath, 'w') as outfile:
-        outfile.write(soup.prettify())
-        outfile.close()
+# Method to get a streaming reader for a document
+# Parameters:
+#     filename:  The path of the document
+#     source:    A binary file object with the document's contents, if
+#                they've already been read (optional)
+# Returns: DocxStreamReader/ OdtStreamReader/ HtmlStreamReader
+def getStreamReader(filename, source=None):
+    readerClass = STREAM_READERS.get(os.path.splitext(filename)[1].lower())
+    if readerClass is None:
+        raise ValueError('Unsupported type of document: ' + filename)
+    return readerClass(filename if source is None else source)
+
+# Method to check whether a document can be streamed through the converter
+# without changing its output. Other documents are always read with their
+# streaming reader anyway - but a .docx file with images, footnotes, endnotes
+# or comments (which the streaming reader leaves out) has to be converted in
+# memory with mammoth, however big it is.
+# Parameters:
+#     filename:  The path of the document
+# Returns: boolean
+def isStreamable(filename):
+    return not isDocxFile(filename) or not DocxStreamReader(filename).unsupportedContent
+
+# Method to read the top-level elements of a document with its streaming
+# reader. Elements are parsed a batch at a time, as setting up a parser for
+# every element would cost more than the parsing.
+# Parameters:
+#     reader:  The streaming reader for the file (see getStreamReader)
+# Returns: generator of bs4.element.PageElement
+def readStreamedElements(reader):
+    batch = []
+    batchSize = 0
+
+    for elementHtml in reader.iterElements():
+        batch.append(elementHtml)
+        batchSize += len(elementHtml)
+        if batchSize >= STREAMING_BATCH_BYTES:
+            with traceSpan('parse'):
+                elements = BeautifulSoup(''.join(batch), 'html.parser', multi_valued_attributes=None).contents
+            yield from elements
+            batch = []
+            batchSize = 0
+
+    if batch:
+        with traceSpan('parse'):
+            elements = BeautifulSoup(''.join(batch), 'html.parser', multi_valued_attributes=None).contents
+        yield from elements
+
+# Method to stream a document through the converter, as a pipeline of
+# generators: document elements, then blocks, then output fragments. Only the
+# block being converted is held in memory.
+# Parameters:
+#     filename:     The path of the file to convert
+#     roster:       The CharacterRoster to identify senders with
+#     characters:   Set to add the names of any senders found to
+#     progress:     Progress callback (optional - see renderHtml). The total
+#                   number of blocks isn't known until the end of the
+#                   document, so it's estimated from how much of the document
+#                   has been read, and the bytes read are the bytes of the
+#                   document's XML (or HTML).
+#     cancelToken:  CancellationToken checked between blocks (optional)
+#     renderings:   The renderings wanted (optional - defaults to HTML)
+#     plugins:      Iterable of str  The module names of the transform
+#                   plugins to use (optional)
+#     messages:     [] to add the messages found to (optional - see
+#                   convertBlocks)
+# Returns: generator of tuple of str  Each block in each rendering
+def streamDocument(filename, roster, characters, progress=None, cancelToken=None, renderings=(RENDER_HTML,), plugins=(), messages=None):
+    reader = getStreamReader(filename)
+    blocks = splitIntoBlocks(readStreamedElements(reader))
+
+    for blockNumber, outputs in enumerate(convertBlocks(blocks, roster, characters, renderings, plugins, messages), 1):
+        yield outputs
+
+        if progress is not None:
+            blocksTotal = blockNumber * reader.bytesTotal // max(reader.bytesRead, 1)
+            progress(blockNumber, max(blocksTotal, blockNumber), reader.bytesRead)
+        if cancelToken is not None:
+            cancelToken.check()
+
+# Method to convert a given document (.docx, .odt or exported HTML) to output
+# HTML (and/ or any other renderings), without writing it to a file
+# Parameters:
+#     filename:     The path of the file to convert
+#     roster:       The CharacterRoster to identify senders with
+#     renderings:   The renderings wanted
+#     progress:     Progress callback (optional - see renderHtml)
+#     cancelToken:  CancellationToken checked between stages and blocks
+#                   (optional)
+#     docxContent:  The contents of the file, if they've already been read
+#                   (optional)
+#     plugins:      Iterable of str  The module names of the transform
+#                   plugins to use (optional)
+#     messages:     [] to add the messages found to (optional - see
+#                   convertBlocks)
+# Returns: [tuple of str, set(str)]  The document in each rendering, and a set
+#     of names of senders of messages identified in this file
+def renderDocument(filename, roster, renderings, progress=None, cancelToken=None, docxContent=None, plugins=(), messages=None):
+    # Get the file contents
+    if docxContent is None:
+        with traceSpan('read', 'io'), open(filename, 'rb') as docxFile:
+            docxContent = docxFile.read()
+
+    # If we've converted exactly this document before (with the same
+    # characters and plugins), we're done already
+    rosterDigest = roster.getDigest() + getChatTransform(roster, plugins).digest
+    keys = [documentCache.getKey(docxContent, getRenderingDigest(rosterDigest, rendering))
+            for rendering in renderings]
+    cached = [documentCache.get(key) for key in keys]
+    if all(converted is not None for converted in cached):
+        if progress is not None:
+            progress(1, 1, len(docxContent))
+        if messages is not None:
+            messages.extend(cached[0][2])
+        return [tuple(converted[0] for converted in cached), set(cached[0][1])]
+
+    # Convert to HTML (using mammoth library for .docx files, or the
+    # document's streaming reader otherwise), then to the output renderings
+    checkCancelled(cancelToken)
+    if isDocxFile(filename):
+        with traceSpan('mammoth'):
+            htmlDoc = mammoth.convert_to_html(io.BytesIO(docxContent)).value
+    else:
+        reader = getStreamReader(filename, io.BytesIO(docxContent))
+        with traceSpan('read elements'):
+            htmlDoc = ''.join(reader.iterElements())
+    checkCancelled(cancelToken)
+
+    documentMessages = []
+    outputs, characters = renderHtml(htmlDoc,
+                                     roster,
+                                     renderings,
+                                     progress,
+                                     cancelToken,
+                                     len(docxContent),
+                                     plugins,
+                                     documentMessages)
+    documentMessages = tuple(documentMessages)
+    for key, output in zip(keys, outputs):
+        documentCache.put(key, (output, frozenset(characters), documentMessages))
+    if messages is not None:
+        messages.extend(documentMessages)
+    return [outputs, characters]
+
+# Method to convert a given document to output HTML, without writing it to a
+# file
+# Parameters:
+#     filename:     The path of the file to convert
+#     roster:       The CharacterRoster to identify senders with (optional -
+#                   defaults to the current config)
+#     progress:     Progress callback (optional - see renderHtml)
+#     cancelToken:  CancellationToken checked between stages and blocks
+#                   (optional)
+#     docxContent:  The contents of the file, if they've already been read
+#                   (optional)
+# Returns: [str, set(str)]  The output HTML, and a set of names of senders of
+#     messages identified in this file
+def convertDocument(filename, roster=None, progress=None, cancelToken=None, docxContent=None):
+    if roster is None:
+        roster = getConfigManager().snapshot()
+
+    outputs, characters = renderDocument(filename,
+                                         roster,
+                                         (RENDER_HTML,),
+                                         progress,
+                                         cancelToken,
+                                         docxContent)
+    return [outputs[0], characters]
+
+# Function to get the default output path for an input file: a file named
+# after it in the output directory
+# Parameters:
+#     filename:  The path of the input file
+# Returns: str
+def getOutputPath(filename):
+    return os.path.join(OUTPUT_DIR, os.path.splitext(os.path.basename(filename))[0] + '.html')
+
+# Method to process a given document (.docx, .odt or exported HTML)
+# Parameters:
+#     filename:     The path of the file to process
+#     roster:       The CharacterRoster to identify senders with (optional -
+#                   defaults to the current config)
+#     progress:     Function called as the conversion progresses, with the
+#                   number of blocks done, the total number of blocks, and the
+#                   number of bytes read (optional)
+#     cancelToken:  CancellationToken checked between pipeline stages and
+#                   between blocks - if it's cancelled, ConversionCancelled is
+#                   raised and no output is written (optional)
+#     docxContent:  The contents of the file, if they've already been read
+#                   (optional - ignored for files big enough to be streamed)
+#     outfilePath:  The path to write the output to (optional - defaults to
+#                   a file named after the input in the output directory)
+#     formats:      [] of str  The formats to write (optional - defaults to
+#                   just the AO3 HTML). Other formats are written alongside
+#                   outfilePath, with their own extensions, all from a single
+#                   conversion of the document.
+#     plugins:      [] of str  The module names of the transform plugins to
+#                   use (optional - see converter.transforms)
+#     messages:     [] to add the block number (from 1), sender as written,
+#                   character and text of each message in the document to,
+#                   e.g. for a converter.messageindex.MessageIndex (optional)
+# Returns: [str, set(str), boolean]  The path of the (first) output file, a
+#     set of names of senders of messages identified in this file, and whether
+#     any output file was written (False if they were all already up to date)
+def processFile(filename, roster=None, progress=None, cancelToken=None, docxContent=None, outfilePath=None, formats=None, plugins=None, messages=None):
+    if outfilePath is None:
+        outfilePath = getOutputPath(filename)
+    if os.path.abspath(outfilePath) == os.path.abspath(filename):
+        raise ValueError('Output would overwrite the document: ' + filename)
+    if not formats:
+        formats = [FORMAT_HTML]
+    if roster is None:
+        roster = getConfigManager().snapshot()
+    renderings = getRenderings(formats)
+    plugins = tuple(plugins or ())
+
+    # Big documents are streamed straight to the output files, a block at a
+    # time - the rest (and any the streaming reader can't fully convert) are
+    # converted in memory (and cached)
+    if os.path.getsize(filename) > STREAMING_THRESHOLD_BYTES and isStreamable(filename):
+        characters = set()
+        blocks = streamDocument(filename,
+                                roster,
+                                characters,
+                                progress,
+                                cancelToken,
+                                renderings,
+                                plugins,
+                                messages)
+        stage = 'stream'
+    else:
+        outputs, characters = renderDocument(filename,
+                                             roster,
+                                             renderings,
+                                             progress,
+                                             cancelToken,
+                                             docxContent,
+                                             plugins,
+                                             messages)
+        checkCancelled(cancelToken)
+        blocks = [outputs]
+        stage = 'write'
+
+    # We're done! Output the results to files. They're written atomically, so
+    # if the conversion is cancelled (or fails) part-way through a stream, any
+    # earlier output is left alone - and if an output hasn't changed, its file
+    # isn't touched at all.
+    writers = createOutputWriters(outfilePath,
+                                  formats,
+                                  os.path.splitext(os.path.basename(filename))[0],
+                                  roster,
+                                  characters)
+    with traceSpan(stage, 'io'):
+        written = writeOutputs(writers, blocks)
 
     # Return a list of character names from this document
-    return [outfilePath, characters]
+    return [getFormatPath(outfilePath, formats[0]), characters, written]
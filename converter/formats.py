@@ -0,0 +1,250 @@
+import io
+import os
+import uuid
+import zipfile
+from contextlib import ExitStack
+from html import escape
+
+from common.fileio import AtomicOutputFile, writeFileAtomic
+from config.manager import getWorkSkinCss
+
+# Output formats
+FORMAT_HTML = 'html'
+FORMAT_EPUB = 'epub'
+FORMAT_TEXT = 'txt'
+OUTPUT_FORMATS = [FORMAT_HTML, FORMAT_EPUB, FORMAT_TEXT]
+
+# Ways of rendering each block of a document (see
+# converter.ficfileconverter). A document is only parsed and transformed
+# once, however many renderings are needed.
+RENDER_HTML = 'html'
+RENDER_TEXT = 'text'
+
+# The block rendering each format is built from - EPUB reuses the AO3 HTML,
+# so it costs nothing but packaging
+FORMAT_RENDERINGS = {FORMAT_HTML: RENDER_HTML,
+                     FORMAT_EPUB: RENDER_HTML,
+                     FORMAT_TEXT: RENDER_TEXT}
+
+# Namespace used to derive a stable identifier for each EPUB from its title
+EPUB_NAMESPACE = uuid.UUID('6f1c5a52-1d0e-4c56-9d43-2b1f2a7c8e10')
+
+# Timestamp given to every file in an EPUB, so an unchanged book is written
+# byte-for-byte the same (and so isn't rewritten - see AtomicOutputFile)
+EPUB_FILE_DATE = (1980, 1, 1, 0, 0, 0)
+
+EPUB_CONTAINER_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles>
+    <rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>
+  </rootfiles>
+</container>
+"""
+
+EPUB_PACKAGE_OPF = """<?xml version="1.0" encoding="UTF-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="book-id">
+  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/">
+    <dc:identifier id="book-id">urn:uuid:BOOK_ID</dc:identifier>
+    <dc:title>BOOK_TITLE</dc:title>
+    <dc:language>en</dc:language>
+    <meta property="dcterms:modified">2000-01-01T00:00:00Z</meta>
+  </metadata>
+  <manifest>
+    <item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>
+    <item id="chapter" href="chapter.xhtml" media-type="application/xhtml+xml"/>
+    <item id="workskin" href="workskin.css" media-type="text/css"/>
+  </manifest>
+  <spine>
+    <itemref idref="chapter"/>
+  </spine>
+</package>
+"""
+
+EPUB_NAV_XHTML = """<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops">
+<head><title>BOOK_TITLE</title></head>
+<body>
+  <nav epub:type="toc"><ol><li><a href="chapter.xhtml">BOOK_TITLE</a></li></ol></nav>
+</body>
+</html>
+"""
+
+EPUB_CHAPTER_HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml">
+<head>
+<title>BOOK_TITLE</title>
+<link rel="stylesheet" type="text/css" href="workskin.css"/>
+</head>
+<body>
+"""
+
+EPUB_CHAPTER_FOOTER = """
+</body>
+</html>
+"""
+
+# Function to get the path of one format of an output file
+# Parameters:
+#     outfilePath:  The path of the (HTML) output file
+#     format:       The format
+# Returns: str
+def getFormatPath(outfilePath, format):
+    if format == FORMAT_HTML:
+        return outfilePath
+    return os.path.splitext(outfilePath)[0] + '.' + format
+
+# Function to get the block renderings needed for a set of formats, in the
+# order they're first needed
+# Parameters:
+#     formats:  [] of str  The formats
+# Returns: tuple of str
+def getRenderings(formats):
+    renderings = []
+    for format in formats:
+        if FORMAT_RENDERINGS[format] not in renderings:
+            renderings.append(FORMAT_RENDERINGS[format])
+    return tuple(renderings)
+
+# Class representing an output file written straight from one rendering of a
+# document's blocks (the AO3 HTML, or plain text)
+class RenderingOutputWriter():
+    # Constructor
+    # Parameters:
+    #     path:            The path of the output file
+    #     renderingIndex:  The position of the rendering in each block
+    def __init__(self, path, renderingIndex):
+        self.path = path
+        self.renderingIndex = renderingIndex
+        self.outputFile = AtomicOutputFile(path)
+        self.changed = False
+
+    def __enter__(self):
+        self.outputFile.__enter__()
+        return self
+
+    # Method to write a block of the document
+    # Parameters:
+    #     outputs:  tuple of str  The block in each rendering
+    def write(self, outputs):
+        self.outputFile.write(outputs[self.renderingIndex])
+
+    def __exit__(self, excType, excValue, traceback):
+        self.outputFile.__exit__(excType, excValue, traceback)
+        self.changed = self.outputFile.changed
+        return False
+
+# Class representing an EPUB output file: a single chapter of the document's
+# AO3 HTML, styled with a work skin for the characters in it. The book is
+# built up in memory (compressed) and written atomically once it's complete.
+class EpubOutputWriter():
+    # Constructor
+    # Parameters:
+    #     path:            The path of the output file
+    #     renderingIndex:  The position of the HTML rendering in each block
+    #     title:           The title of the book
+    #     roster:          The CharacterRoster to build the work skin from
+    #     characters:      Set of the names of senders in the document (only
+    #                      needs to be complete once all the blocks have been
+    #                      written)
+    def __init__(self, path, renderingIndex, title, roster, characters):
+        self.path = path
+        self.renderingIndex = renderingIndex
+        self.title = escape(title)
+        self.roster = roster
+        self.characters = characters
+        self.changed = False
+        self.buffer = None
+        self.zipFile = None
+        self.chapterFile = None
+
+    # Method to add a file to the book
+    # Parameters:
+    #     name:        The file's path within the book
+    #     content:     The file's content
+    #     compressed:  Whether to compress the file (optional)
+    def addFile(self, name, content, compressed=True):
+        fileInfo = zipfile.ZipInfo(name, EPUB_FILE_DATE)
+        fileInfo.compress_type = zipfile.ZIP_DEFLATED if compressed else zipfile.ZIP_STORED
+        self.zipFile.writestr(fileInfo, content)
+
+    def __enter__(self):
+        self.buffer = io.BytesIO()
+        self.zipFile = zipfile.ZipFile(self.buffer, 'w')
+
+        # The mimetype has to come first, uncompressed
+        self.addFile('mimetype', 'application/epub+zip', False)
+        self.addFile('META-INF/container.xml', EPUB_CONTAINER_XML)
+
+        chapterInfo = zipfile.ZipInfo('OEBPS/chapter.xhtml', EPUB_FILE_DATE)
+        chapterInfo.compress_type = zipfile.ZIP_DEFLATED
+        self.chapterFile = io.TextIOWrapper(self.zipFile.open(chapterInfo, 'w'),
+                                            encoding='utf-8')
+        self.chapterFile.write(EPUB_CHAPTER_HEADER.replace('BOOK_TITLE', self.title))
+        return self
+
+    # Method to write a block of the document
+    # Parameters:
+    #     outputs:  tuple of str  The block in each rendering
+    def write(self, outputs):
+        self.chapterFile.write(outputs[self.renderingIndex])
+
+    def __exit__(self, excType, excValue, traceback):
+        if excType is not None:
+            self.chapterFile.close()
+            self.zipFile.close()
+            return False
+
+        self.chapterFile.write(EPUB_CHAPTER_FOOTER)
+        self.chapterFile.close()
+
+        bookId = str(uuid.uuid5(EPUB_NAMESPACE, self.title))
+        self.addFile('OEBPS/content.opf',
+                     EPUB_PACKAGE_OPF.replace('BOOK_ID', bookId).replace('BOOK_TITLE', self.title))
+        self.addFile('OEBPS/nav.xhtml', EPUB_NAV_XHTML.replace('BOOK_TITLE', self.title))
+        self.addFile('OEBPS/workskin.css',
+                     getWorkSkinCss(self.characters, False, self.roster))
+        self.zipFile.close()
+
+        self.changed = writeFileAtomic(self.path, self.buffer.getvalue(), True)
+        return False
+
+# Function to create the writers for a document's outputs
+# Parameters:
+#     outfilePath:  The path of the (HTML) output file - other formats are
+#                   written alongside it
+#     formats:      [] of str  The formats to write
+#     title:        The title of the document
+#     roster:       The CharacterRoster the document is converted with
+#     characters:   Set of the names of senders in the document (filled in as
+#                   the document is converted)
+# Returns: [] of RenderingOutputWriter/ EpubOutputWriter
+def createOutputWriters(outfilePath, formats, title, roster, characters):
+    renderings = getRenderings(formats)
+    writers = []
+    for format in formats:
+        path = getFormatPath(outfilePath, format)
+        renderingIndex = renderings.index(FORMAT_RENDERINGS[format])
+        if format == FORMAT_EPUB:
+            writers.append(EpubOutputWriter(path, renderingIndex, title, roster, characters))
+        else:
+            writers.append(RenderingOutputWriter(path, renderingIndex))
+    return writers
+
+# Function to write a document's blocks to all of its outputs. If the blocks
+# can't all be converted, none of the outputs are written.
+# Parameters:
+#     writers:  The output writers (see createOutputWriters)
+#     blocks:   Iterable of tuple of str  Each block in each rendering
+# Returns: boolean  Whether any of the output files were written (False if
+#     they were all already up to date)
+def writeOutputs(writers, blocks):
+    with ExitStack() as stack:
+        for writer in writers:
+            stack.enter_context(writer)
+        for outputs in blocks:
+            for writer in writers:
+                writer.write(outputs)
+
+    return any(writer.changed for writer in writers)
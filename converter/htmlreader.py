@@ -0,0 +1,396 @@
+import codecs
+import os
+import re
+from html.parser import HTMLParser
+from urllib.parse import parse_qs, urlsplit
+
+from converter.docxreader import READ_SIZE, HtmlElement, collapse, stripEmpty, writeHtml
+
+# A streaming reader for documents exported as HTML (e.g. by Google Docs or
+# LibreOffice). It parses the file a piece at a time, producing the same HTML
+# that mammoth would for the equivalent .docx file - one top-level element
+# (paragraph, heading, list or table) at a time - so exported HTML goes
+# through exactly the same conversion as .docx files.
+#
+# Only the structure mammoth produces is kept: paragraphs, headings, bold/
+# italic/ strikethrough/ superscript/ subscript text (from tags, inline styles
+# or the document's CSS classes), line breaks, hyperlinks, bookmarks, lists and
+# simple tables. Everything else (images, fonts, colours, layout) is left out.
+
+# Tags which are converted to the same tag
+BLOCK_TAGS = {'p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+LIST_TAGS = {'ul', 'ol'}
+
+# Tags which just group other content, and are left out
+CONTAINER_TAGS = {'html', 'head', 'body', 'div', 'section', 'article', 'main', 'header',
+                  'footer', 'nav', 'aside', 'blockquote', 'center', 'figure'}
+
+# Tags whose content isn't part of the document
+SKIPPED_TAGS = {'title', 'script', 'style', 'template', 'noscript'}
+
+# Tags which never have any content
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link',
+             'meta', 'param', 'source', 'track', 'wbr'}
+
+# Elements which only contain other elements, rather than text
+STRUCTURE_TAGS = {'ul', 'ol', 'table', 'thead', 'tbody', 'tr'}
+
+# Elements which start a new line of text
+LINE_TAGS = BLOCK_TAGS | {'li', 'td', 'th'}
+
+# Formatting given by each formatting tag
+TAG_FORMATTING = {'b': 'strong', 'strong': 'strong',
+                  'i': 'em', 'em': 'em', 'cite': 'em',
+                  's': 's', 'strike': 's', 'del': 's',
+                  'sub': 'sub', 'sup': 'sup'}
+
+# Patterns matching CSS rules for a single class, and the white space which
+# is collapsed to a single space in HTML
+CSS_CLASS_RULE_REGEX = re.compile(r'\.([\w-]+)\s*\{([^{}]*)\}')
+WHITESPACE_REGEX = re.compile('[ \t\r\n\f]+')
+
+# Pattern matching the character set declared in an HTML file
+CHARSET_REGEX = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?([\w-]+)', re.IGNORECASE)
+
+# Google Docs links go through a redirect, with the real link as a parameter
+GOOGLE_REDIRECT_PREFIX = 'https://www.google.com/url?'
+
+# Function to get the formatting set by some CSS declarations
+# Parameters:
+#     declarations:  The declarations (e.g. 'font-weight:700;color:#000')
+# Returns: dict of str -> boolean  Whether the declarations turn each of 's',
+#     'sub', 'sup', 'em' and 'strong' on or off (formatting they don't set is
+#     left out)
+def getCssFormatting(declarations):
+    formatting = {}
+    for declaration in declarations.split(';'):
+        name, separator, value = declaration.partition(':')
+        name = name.strip().lower()
+        value = value.strip().lower()
+        if not separator:
+            continue
+
+        if name == 'font-weight':
+            formatting['strong'] = value in ('bold', 'bolder') or \
+                (value.isdigit() and int(value) >= 600)
+        elif name == 'font-style':
+            formatting['em'] = value in ('italic', 'oblique')
+        elif name in ('text-decoration', 'text-decoration-line'):
+            formatting['s'] = 'line-through' in value
+        elif name == 'vertical-align':
+            formatting['sup'] = value == 'super'
+            formatting['sub'] = value == 'sub'
+    return formatting
+
+# Function to get the real target of a link
+# Parameters:
+#     href:  The link's href
+# Returns: str
+def getLinkTarget(href):
+    if href.startswith(GOOGLE_REDIRECT_PREFIX):
+        targets = parse_qs(urlsplit(href).query).get('q')
+        if targets:
+            return targets[0]
+    return href
+
+# Class representing a streaming reader for an HTML document
+class HtmlStreamReader(HTMLParser):
+    # Constructor
+    # Parameters:
+    #     source:  The path of the HTML file, or a binary file object with its
+    #              contents
+    def __init__(self, source):
+        super().__init__()
+        self.source = source
+
+        # Number of bytes of the file read so far, and in total
+        self.bytesRead = 0
+        if isinstance(source, str):
+            self.bytesTotal = os.path.getsize(source)
+        else:
+            self.bytesTotal = source.seek(0, os.SEEK_END)
+            source.seek(0)
+
+        # The elements currently open, outermost first, and the tags they were
+        # opened by with how many of the elements each opened (a tag can open
+        # none, e.g. a <span> without formatting, or several)
+        self.openElements = []
+        self.openTags = []
+
+        # The HTML of the top-level elements finished but not yet read
+        self.finishedElements = []
+
+        # Tag whose content is being skipped (or None), and the CSS read from
+        # the document's <style> elements
+        self.skippedTag = None
+        self.styleText = []
+        self.classFormatting = {}
+
+        # Whether the text being read is at the start of a line, or straight
+        # after a space - so any white space is dropped
+        self.dropSpace = True
+
+    # Method to read the document's top-level elements as HTML, one at a time
+    # Returns: generator of str
+    def iterElements(self):
+        sourceFile = open(self.source, 'rb') if isinstance(self.source, str) else self.source
+        try:
+            data = sourceFile.read(READ_SIZE)
+            decoder = codecs.getincrementaldecoder(self.getEncoding(data))(errors='replace')
+
+            while data:
+                self.bytesRead += len(data)
+                self.feed(decoder.decode(data))
+                yield from self.takeFinishedElements()
+                data = sourceFile.read(READ_SIZE)
+
+            self.feed(decoder.decode(b'', True))
+            self.close()
+            while self.openTags:
+                self.closeTag()
+            yield from self.takeFinishedElements()
+        finally:
+            if sourceFile is not self.source:
+                sourceFile.close()
+
+    # Method to work out the encoding of the document, from its start
+    # Parameters:
+    #     data:  The start of the document
+    # Returns: str  The name of the encoding
+    def getEncoding(self, data):
+        if data.startswith(codecs.BOM_UTF8):
+            return 'utf-8-sig'
+        if data.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+            return 'utf-16'
+
+        match = CHARSET_REGEX.search(data)
+        if match:
+            try:
+                return codecs.lookup(match.group(1).decode('ascii')).name
+            except LookupError:
+                pass
+        return 'utf-8'
+
+    # Method to take the HTML of the top-level elements finished so far
+    # Returns: [] of str
+    def takeFinishedElements(self):
+        finished = self.finishedElements
+        self.finishedElements = []
+        return finished
+
+    # Method to get the tag of the innermost open element
+    # Returns: str, or None if no element is open
+    def getCurrentTag(self):
+        return self.openElements[-1].tag if self.openElements else None
+
+    # Method to add a node to the innermost open element (or, at the top
+    # level, to the document)
+    # Parameters:
+    #     node:  The HtmlElement or str
+    def addNode(self, node):
+        if self.openElements:
+            self.openElements[-1].children.append(node)
+        else:
+            elementHtml = writeHtml(collapse(stripEmpty([node])))
+            if elementHtml:
+                self.finishedElements.append(elementHtml)
+
+    # Method to open an element for a tag (or to note that a tag which isn't
+    # converted has been opened)
+    # Parameters:
+    #     tag:       The tag in the document (or None for an implied paragraph)
+    #     elements:  [] of HtmlElement  The elements the tag opens, outermost
+    #                first (optional)
+    def openTag(self, tag, elements=()):
+        for element in elements:
+            if not self.openElements:
+                self.openElements.append(element)
+            else:
+                self.addNode(element)
+                self.openElements.append(element)
+            if element.tag in LINE_TAGS:
+                self.dropSpace = True
+        self.openTags.append((tag, len(elements)))
+
+    # Method to close the most recently opened tag, and its elements. If this
+    # finishes a top-level element, its HTML is ready to be read.
+    def closeTag(self):
+        tag, elementCount = self.openTags.pop()
+        for elementNumber in range(elementCount):
+            element = self.openElements.pop()
+            if element.tag in LINE_TAGS:
+                self.stripTrailingSpace(element)
+                self.dropSpace = True
+            if not self.openElements:
+                self.addNode(element)
+
+    # Method to close tags until the innermost open element is one of a set
+    # (or there are none open)
+    # Parameters:
+    #     keepTags:  The tags of the elements to leave open
+    def closeTagsUntil(self, keepTags):
+        while self.openTags and self.openElements and \
+                self.openElements[-1].tag not in keepTags:
+            self.closeTag()
+
+    # Method to remove any space from the end of an element's text
+    # Parameters:
+    #     element:  The HtmlElement
+    def stripTrailingSpace(self, element):
+        while element.children:
+            last = element.children[-1]
+            if isinstance(last, str):
+                element.children[-1] = last.rstrip(' ')
+                return
+            if last.isVoid():
+                return
+            element = last
+
+    # Method to make sure text can be added, opening a paragraph if it's
+    # outside of one
+    # Returns: boolean  Whether text can be added (False inside lists and
+    #     tables, outside their items and cells)
+    def startInline(self):
+        currentTag = self.getCurrentTag()
+        if currentTag is None or currentTag in ('td', 'th'):
+            self.openTag(None, [HtmlElement('p')])
+            return True
+        return currentTag not in STRUCTURE_TAGS
+
+    # Method to get the formatting of an element, from its tag, classes and
+    # inline style
+    # Parameters:
+    #     tag:         The tag
+    #     attributes:  dict of the element's attributes
+    # Returns: dict of str -> boolean  (see getCssFormatting)
+    def getFormatting(self, tag, attributes):
+        formatting = {}
+        if tag in TAG_FORMATTING:
+            formatting[TAG_FORMATTING[tag]] = True
+        for className in (attributes.get('class') or '').split():
+            formatting.update(self.classFormatting.get(className, {}))
+        if attributes.get('style'):
+            formatting.update(getCssFormatting(attributes['style']))
+        return formatting
+
+    def handle_starttag(self, tag, attrs):
+        if self.skippedTag is not None:
+            return
+        if tag in SKIPPED_TAGS:
+            self.skippedTag = tag
+            return
+        attributes = dict(attrs)
+
+        if tag in BLOCK_TAGS:
+            self.closeTagsUntil(('li', 'td', 'th'))
+            if self.getCurrentTag() == 'li':
+                # Each list item is a single paragraph
+                self.openTag(tag)
+                self.dropSpace = True
+            else:
+                self.openTag(tag, [HtmlElement(tag)])
+        elif tag in LIST_TAGS:
+            self.closeTagsUntil(('li', 'td', 'th'))
+            self.openTag(tag, [HtmlElement(tag)])
+        elif tag == 'li':
+            self.closeTagsUntil(('ul', 'ol', 'td', 'th'))
+            self.openTag(tag, [HtmlElement('li' if self.getCurrentTag() in LIST_TAGS else 'p')])
+        elif tag == 'table':
+            self.closeTagsUntil(('li', 'td', 'th'))
+            self.openTag(tag, [HtmlElement('table', forceWrite=True)])
+        elif tag in ('thead', 'tbody', 'tfoot'):
+            self.closeTagsUntil(('table',))
+            table = self.openElements[-1] if self.getCurrentTag() == 'table' else None
+            # Tables only have a separate body if they have a header
+            if table is not None and \
+                    (tag == 'thead' or any(child.tag == 'thead' for child in table.children)):
+                self.openTag(tag, [HtmlElement('thead' if tag == 'thead' else 'tbody')])
+            else:
+                self.openTag(tag)
+        elif tag == 'tr':
+            self.closeTagsUntil(('table', 'thead', 'tbody'))
+            if self.getCurrentTag() in ('table', 'thead', 'tbody'):
+                self.openTag(tag, [HtmlElement('tr', forceWrite=True)])
+            else:
+                self.openTag(tag)
+        elif tag in ('td', 'th'):
+            self.closeTagsUntil(('tr',))
+            if self.getCurrentTag() == 'tr':
+                cellAttributes = {}
+                colspan = attributes.get('colspan')
+                if colspan and colspan != '1':
+                    cellAttributes['colspan'] = colspan
+                self.openTag(tag, [HtmlElement(tag, cellAttributes, forceWrite=True)])
+            else:
+                self.openTag(tag)
+        elif tag in CONTAINER_TAGS:
+            self.closeTagsUntil(('li', 'td', 'th'))
+            self.openTag(tag)
+        elif tag == 'hr':
+            self.closeTagsUntil(('li', 'td', 'th'))
+        elif tag == 'br':
+            if self.startInline():
+                self.addNode(HtmlElement('br'))
+                self.dropSpace = True
+        elif tag in VOID_TAGS:
+            return
+        elif not self.startInline():
+            self.openTag(tag)
+        elif tag == 'a' and attributes.get('href') is not None:
+            self.openTag(tag, [HtmlElement('a',
+                                           {'href': getLinkTarget(attributes['href'])},
+                                           collapsible=True)])
+        else:
+            if tag == 'a' and (attributes.get('id') or attributes.get('name')):
+                self.addNode(HtmlElement('a',
+                                         {'id': attributes.get('id') or attributes['name']},
+                                         collapsible=True,
+                                         forceWrite=True))
+
+            # Wrap the text in the same order as mammoth, innermost first
+            formatting = self.getFormatting(tag, attributes)
+            self.openTag(tag, [HtmlElement(wrapper, collapsible=True)
+                               for wrapper in ('strong', 'em', 'sup', 'sub', 's')
+                               if formatting.get(wrapper)])
+
+    def handle_endtag(self, tag):
+        if self.skippedTag is not None:
+            if tag == self.skippedTag:
+                self.skippedTag = None
+                if tag == 'style':
+                    self.readClassFormatting(''.join(self.styleText))
+                    self.styleText = []
+            return
+
+        # Close the tag, along with any tags left open inside it
+        if all(openTag != tag for openTag, elementCount in self.openTags):
+            return
+        while self.openTags:
+            openTag = self.openTags[-1][0]
+            self.closeTag()
+            if openTag == tag:
+                break
+
+    def handle_data(self, data):
+        if self.skippedTag is not None:
+            if self.skippedTag == 'style':
+                self.styleText.append(data)
+            return
+
+        text = WHITESPACE_REGEX.sub(' ', data)
+        if text == ' ' and self.getCurrentTag() in (None, 'td', 'th') or \
+                not self.startInline():
+            return
+        if self.dropSpace:
+            text = text.lstrip(' ')
+        if text:
+            self.addNode(text)
+            self.dropSpace = text.endswith(' ')
+
+    # Method to read the formatting given to each class by the document's CSS
+    # Parameters:
+    #     css:  The CSS
+    def readClassFormatting(self, css):
+        for match in CSS_CLASS_RULE_REGEX.finditer(css):
+            formatting = self.classFormatting.setdefault(match.group(1), {})
+            formatting.update(getCssFormatting(match.group(2)))
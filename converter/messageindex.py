@@ -0,0 +1,247 @@
+import os
+import re
+import sqlite3
+
+# How long (in milliseconds) to wait for another process to finish writing to
+# the index before giving up
+SQLITE_BUSY_TIMEOUT_MS = 5000
+
+# Default number of messages returned by a search
+DEFAULT_SEARCH_LIMIT = 50
+
+# Schema for the message index. Each converted chapter (input file) of each
+# work has a row in chapters, and each message found in it a row in messages,
+# with its block (its position among the chapter's blocks), its position in
+# the block, the sender as written and the character they were identified as.
+MESSAGE_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chapters
+(
+    chapterId INTEGER PRIMARY KEY,
+    work TEXT NOT NULL,
+    chapter TEXT NOT NULL,
+    UNIQUE (work, chapter)
+);
+
+CREATE TABLE IF NOT EXISTS messages
+(
+    messageId INTEGER PRIMARY KEY,
+    chapterId INTEGER NOT NULL,
+    block INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    sender TEXT NOT NULL COLLATE NOCASE,
+    character TEXT NOT NULL COLLATE NOCASE,
+    text TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS messagesByChapter ON messages (chapterId);
+CREATE INDEX IF NOT EXISTS messagesByCharacter ON messages (character, chapterId);
+CREATE INDEX IF NOT EXISTS messagesBySender ON messages (sender);
+"""
+
+# Full-text index of the messages' text (an external content FTS5 table, kept
+# in step with the messages table by triggers). If SQLite was built without
+# FTS5, text searches fall back to scanning the messages.
+MESSAGE_TEXT_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messageText USING fts5
+(
+    text,
+    content='messages',
+    content_rowid='messageId'
+);
+
+CREATE TRIGGER IF NOT EXISTS messagesInserted AFTER INSERT ON messages
+BEGIN
+    INSERT INTO messageText (rowid, text) VALUES (new.messageId, new.text);
+END;
+
+CREATE TRIGGER IF NOT EXISTS messagesDeleted AFTER DELETE ON messages
+BEGIN
+    INSERT INTO messageText (messageText, rowid, text)
+    VALUES ('delete', old.messageId, old.text);
+END;
+"""
+
+# Pattern matching the words of a text search
+SEARCH_WORD_REGEX = re.compile(r'\w+')
+
+# Class representing a message found in the index
+class IndexedMessage():
+    # Constructor
+    # Parameters:
+    #     work:       The name of the work
+    #     chapter:    The path of the chapter's input file
+    #     block:      The position of the message's block in the chapter
+    #                 (from 1)
+    #     position:   The position of the message in its block (from 1)
+    #     sender:     The sender's name as written
+    #     character:  The name of the character the sender was identified as
+    #     text:       The text of the message
+    def __init__(self, work, chapter, block, position, sender, character, text):
+        self.work = work
+        self.chapter = chapter
+        self.block = block
+        self.position = position
+        self.sender = sender
+        self.character = character
+        self.text = text
+
+# Class representing an index of the messages in converted works, kept in a
+# SQLite database. It's updated a chapter at a time as chapters are
+# (re)converted, and can find every message a character sent containing some
+# words, or count each character's messages, across any number of works.
+class MessageIndex():
+    # Constructor
+    # Parameters:
+    #     path:  The path of the index file (created if necessary)
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(MESSAGE_INDEX_SCHEMA)
+
+        try:
+            self.connection.executescript(MESSAGE_TEXT_SCHEMA)
+            self.hasFullText = True
+        except sqlite3.OperationalError:
+            self.hasFullText = False
+
+    # Method to close the index
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+        return False
+
+    # Method to get the key a chapter is stored under: the absolute path of
+    # its input file, so the index can be updated from any directory
+    # Parameters:
+    #     chapter:  The path of the chapter's input file
+    # Returns: str
+    def getChapterKey(self, chapter):
+        return os.path.abspath(chapter)
+
+    # Method to replace the messages of a chapter, e.g. because it has been
+    # (re)converted. The rest of the index is left alone.
+    # Parameters:
+    #     work:      The name of the work the chapter belongs to
+    #     chapter:   The path of the chapter's input file
+    #     messages:  [] of (int, str, str, str)  The block, sender as written,
+    #                character and text of each message, in order (see
+    #                converter.ficfileconverter.processFile)
+    def updateChapter(self, work, chapter, messages):
+        with self.connection:
+            self.connection.execute(
+                'INSERT OR IGNORE INTO chapters (work, chapter) VALUES (?, ?)',
+                (work, self.getChapterKey(chapter)))
+            chapterId = self.connection.execute(
+                'SELECT chapterId FROM chapters WHERE work = ? AND chapter = ?',
+                (work, self.getChapterKey(chapter))).fetchone()[0]
+
+            self.connection.execute('DELETE FROM messages WHERE chapterId = ?', (chapterId,))
+
+            rows = []
+            lastBlock = None
+            position = 0
+            for block, sender, character, text in messages:
+                position = position + 1 if block == lastBlock else 1
+                lastBlock = block
+                rows.append((chapterId, block, position, sender, character, text))
+            self.connection.executemany(
+                'INSERT INTO messages (chapterId, block, position, sender, character, text) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                rows)
+
+    # Method to check whether a chapter is in the index
+    # Parameters:
+    #     work:     The name of the work
+    #     chapter:  The path of the chapter's input file
+    # Returns: boolean
+    def hasChapter(self, work, chapter):
+        return self.connection.execute(
+            'SELECT 1 FROM chapters WHERE work = ? AND chapter = ?',
+            (work, self.getChapterKey(chapter))).fetchone() is not None
+
+    # Method to remove the chapters of a work which are no longer part of it
+    # Parameters:
+    #     work:      The name of the work
+    #     chapters:  [] of str  The paths of the work's current input files
+    # Returns: int  The number of chapters removed
+    def pruneChapters(self, work, chapters):
+        keep = {self.getChapterKey(chapter) for chapter in chapters}
+        with self.connection:
+            removed = [(chapterId,) for chapterId, chapter in self.connection.execute(
+                'SELECT chapterId, chapter FROM chapters WHERE work = ?', (work,))
+                       if chapter not in keep]
+            self.connection.executemany('DELETE FROM messages WHERE chapterId = ?', removed)
+            self.connection.executemany('DELETE FROM chapters WHERE chapterId = ?', removed)
+        return len(removed)
+
+    # Method to build the conditions selecting messages
+    # Parameters:
+    #     text:    Words the messages must all contain (or None)
+    #     sender:  The character (or name as written) who sent the messages
+    #              (or None)
+    #     work:    The work the messages are in (or None)
+    # Returns: (str, [] of str)  The SQL conditions, and their parameters
+    def getConditions(self, text, sender, work):
+        conditions = []
+        parameters = []
+
+        words = SEARCH_WORD_REGEX.findall(text or '')
+        if words and self.hasFullText:
+            conditions.append('messages.messageId IN '
+                              '(SELECT rowid FROM messageText WHERE messageText MATCH ?)')
+            parameters.append(' '.join('"' + word + '"' for word in words))
+        else:
+            for word in words:
+                conditions.append("messages.text LIKE ? ESCAPE '\\'")
+                parameters.append('%' + word.replace('\\', '\\\\').replace('_', '\\_') + '%')
+
+        if sender:
+            conditions.append('(messages.character = ? OR messages.sender = ?)')
+            parameters.extend([sender, sender])
+        if work:
+            conditions.append('chapters.work = ?')
+            parameters.append(work)
+
+        return ' AND '.join(conditions) or '1', parameters
+
+    # Method to find messages
+    # Parameters:
+    #     text:    Words the messages must all contain (optional)
+    #     sender:  The character (or name as written) who sent the messages
+    #              (optional)
+    #     work:    The work the messages are in (optional)
+    #     limit:   The maximum number of messages to return (optional)
+    # Returns: [] of IndexedMessage  In order of work, chapter and position
+    def search(self, text=None, sender=None, work=None, limit=DEFAULT_SEARCH_LIMIT):
+        conditions, parameters = self.getConditions(text, sender, work)
+        rows = self.connection.execute(
+            'SELECT chapters.work, chapters.chapter, messages.block, messages.position, '
+            'messages.sender, messages.character, messages.text '
+            'FROM messages JOIN chapters ON chapters.chapterId = messages.chapterId '
+            'WHERE ' + conditions + ' '
+            'ORDER BY chapters.work, chapters.chapter, messages.block, messages.position '
+            'LIMIT ?',
+            parameters + [limit])
+        return [IndexedMessage(*row) for row in rows]
+
+    # Method to count each character's messages
+    # Parameters:
+    #     text:    Words the messages must all contain (optional)
+    #     work:    The work to count messages in (optional)
+    # Returns: [] of (str, int)  Each character and their number of messages,
+    #     most first
+    def countMessages(self, text=None, work=None):
+        conditions, parameters = self.getConditions(text, None, work)
+        return self.connection.execute(
+            'SELECT messages.character, COUNT(*) AS messageCount '
+            'FROM messages JOIN chapters ON chapters.chapterId = messages.chapterId '
+            'WHERE ' + conditions + ' '
+            'GROUP BY messages.character ORDER BY messageCount DESC, messages.character',
+            parameters).fetchall()
@@ -0,0 +1,375 @@
+import re
+import zipfile
+from xml.etree import ElementTree
+
+from converter.docxreader import READ_SIZE, HtmlElement, collapse, stripEmpty, writeHtml
+
+# A streaming reader for OpenDocument text (.odt) files, as saved by
+# LibreOffice. It reads content.xml with iterparse, converting and then
+# discarding one top-level element (paragraph, heading, list or table) at a
+# time, and produces the same HTML that mammoth would for the equivalent .docx
+# file - so .odt files go through exactly the same conversion as .docx files.
+#
+# Paragraphs, headings, bold/ italic/ strikethrough/ superscript/ subscript
+# text (from automatic or named text styles), line breaks, tabs, hyperlinks,
+# bookmarks, lists and simple tables are supported. Images, notes, annotations
+# and tracked deletions are left out.
+
+# XML namespaces used in .odt files
+OFFICE_NAMESPACE = '{urn:oasis:names:tc:opendocument:xmlns:office:1.0}'
+TEXT_NAMESPACE = '{urn:oasis:names:tc:opendocument:xmlns:text:1.0}'
+TABLE_NAMESPACE = '{urn:oasis:names:tc:opendocument:xmlns:table:1.0}'
+STYLE_NAMESPACE = '{urn:oasis:names:tc:opendocument:xmlns:style:1.0}'
+FO_NAMESPACE = '{urn:oasis:names:tc:opendocument:xmlns:xsl-fo-compatible:1.0}'
+XLINK_NAMESPACE = '{http://www.w3.org/1999/xlink}'
+
+# Tag names, fully qualified
+OFFICE_TEXT = OFFICE_NAMESPACE + 'text'
+OFFICE_AUTOMATIC_STYLES = OFFICE_NAMESPACE + 'automatic-styles'
+TEXT_PARAGRAPH = TEXT_NAMESPACE + 'p'
+TEXT_HEADING = TEXT_NAMESPACE + 'h'
+TEXT_LIST = TEXT_NAMESPACE + 'list'
+TEXT_SPAN = TEXT_NAMESPACE + 'span'
+TEXT_STYLE_NAME = TEXT_NAMESPACE + 'style-name'
+TABLE_TABLE = TABLE_NAMESPACE + 'table'
+STYLE_NAME = STYLE_NAMESPACE + 'name'
+
+# The top-level elements of the document body, and the elements which just
+# contain other top-level elements
+BODY_ELEMENT_TAGS = {TEXT_PARAGRAPH, TEXT_HEADING, TEXT_LIST, TABLE_TABLE}
+BODY_CONTAINER_TAGS = {TEXT_NAMESPACE + 'section'}
+
+# Elements within a paragraph whose content isn't shown as part of the text
+SKIPPED_INLINE_TAGS = {TEXT_NAMESPACE + name for name in
+                       ('note', 'bookmark-end', 'soft-page-break', 'change',
+                        'change-start', 'change-end', 'reference-mark-end')} | \
+                      {OFFICE_NAMESPACE + 'annotation', OFFICE_NAMESPACE + 'annotation-end'}
+
+# Elements holding the rows of a table
+TABLE_ROW_CONTAINER_TAGS = {TABLE_NAMESPACE + name for name in
+                            ('table-rows', 'table-row-group')}
+
+# Pattern matching the white space which is collapsed to a single space in
+# OpenDocument text (repeated spaces are saved as <text:s/> instead)
+WHITESPACE_REGEX = re.compile('[ \t\r\n]+')
+
+# Function to get the formatting of a style, from its text properties
+# Parameters:
+#     style:  The style element
+# Returns: dict of str -> boolean  Whether the style turns each of 's', 'sub',
+#     'sup', 'em' and 'strong' on or off (formatting the style doesn't set is
+#     left out)
+def getStyleFormatting(style):
+    formatting = {}
+    properties = style.find(STYLE_NAMESPACE + 'text-properties')
+    if properties is None:
+        return formatting
+
+    fontWeight = properties.get(FO_NAMESPACE + 'font-weight')
+    if fontWeight is not None:
+        formatting['strong'] = fontWeight == 'bold' or \
+            (fontWeight.isdigit() and int(fontWeight) >= 600)
+    fontStyle = properties.get(FO_NAMESPACE + 'font-style')
+    if fontStyle is not None:
+        formatting['em'] = fontStyle in ('italic', 'oblique')
+    lineThrough = properties.get(STYLE_NAMESPACE + 'text-line-through-style')
+    if lineThrough is not None:
+        formatting['s'] = lineThrough != 'none'
+    position = properties.get(STYLE_NAMESPACE + 'text-position')
+    if position is not None:
+        offset = (position.split() or [''])[0]
+        isSuper = offset == 'super' or (offset.endswith('%') and not offset.startswith(('-', '0')))
+        isSub = offset == 'sub' or offset.startswith('-')
+        formatting['sup'] = isSuper
+        formatting['sub'] = isSub
+    return formatting
+
+# Function to wrap converted content in tags for its formatting, in the same
+# order as mammoth (and converter.docxreader), innermost first
+# Parameters:
+#     nodes:       [] of HtmlElement or str
+#     formatting:  dict of str -> boolean  The formatting (see
+#                  getStyleFormatting)
+# Returns: [] of HtmlElement or str
+def wrapFormatting(nodes, formatting):
+    for wrapper in ('s', 'sub', 'sup', 'em', 'strong'):
+        if formatting.get(wrapper):
+            nodes = [HtmlElement(wrapper, children=nodes, collapsible=True)]
+    return nodes
+
+# Class representing a streaming reader for a .odt file
+class OdtStreamReader():
+    # Constructor. Reads the named styles straight away - automatic styles
+    # are read from content.xml as it's streamed.
+    # Parameters:
+    #     source:  The path of the .odt file, or a binary file object with its
+    #              contents
+    def __init__(self, source):
+        self.source = source
+
+        # Number of bytes of document XML read so far, and in total
+        self.bytesRead = 0
+        self.bytesTotal = 0
+
+        # The formatting of each text and paragraph style, and whether each
+        # level of each list style is numbered, keyed on style name
+        self.textStyles = {}
+        self.paragraphStyles = {}
+        self.listStyles = {}
+
+        with zipfile.ZipFile(source) as odtZip:
+            self.bytesTotal = odtZip.getinfo('content.xml').file_size
+            try:
+                with odtZip.open('styles.xml') as stylesFile:
+                    styles = ElementTree.parse(stylesFile).getroot()
+            except KeyError:
+                styles = None
+
+        if styles is not None:
+            namedStyles = styles.find(OFFICE_NAMESPACE + 'styles')
+            if namedStyles is not None:
+                self.readStyles(namedStyles, False)
+
+    # Method to read a set of style definitions
+    # Parameters:
+    #     styles:       The element containing the styles
+    #     isAutomatic:  Whether they're automatic styles (direct formatting) -
+    #                   only the direct formatting of a paragraph applies to
+    #                   its text, as mammoth ignores paragraph styles' run
+    #                   properties
+    def readStyles(self, styles, isAutomatic):
+        parents = {}
+        for style in styles:
+            if style.tag == STYLE_NAMESPACE + 'style':
+                name = style.get(STYLE_NAME)
+                family = style.get(STYLE_NAMESPACE + 'family')
+                if family == 'text':
+                    self.textStyles[name] = getStyleFormatting(style)
+                    parents[name] = style.get(STYLE_NAMESPACE + 'parent-style-name')
+                elif family == 'paragraph' and isAutomatic:
+                    self.paragraphStyles[name] = getStyleFormatting(style)
+            elif style.tag == TEXT_NAMESPACE + 'list-style':
+                self.listStyles[style.get(STYLE_NAME)] = {
+                    int(level.get(TEXT_NAMESPACE + 'level', '1')):
+                        level.tag == TEXT_NAMESPACE + 'list-level-style-number'
+                    for level in style}
+
+        # Text styles inherit any formatting they don't set themselves
+        for name, parent in parents.items():
+            formatting = self.textStyles[name]
+            seen = {name}
+            while parent in self.textStyles and parent not in seen:
+                seen.add(parent)
+                for key, value in self.textStyles[parent].items():
+                    formatting.setdefault(key, value)
+                parent = parents.get(parent)
+
+    # Method to read the document's top-level elements as HTML, one at a time
+    # Returns: generator of str
+    def iterElements(self):
+        for element in self.iterBodyElements():
+            if element.tag == TEXT_LIST:
+                node = self.convertList(element, None, 1)
+            elif element.tag == TABLE_TABLE:
+                node = self.convertTable(element)
+            else:
+                node = self.convertParagraph(element)
+
+            elementHtml = writeHtml(collapse(stripEmpty([node])))
+            if elementHtml:
+                yield elementHtml
+
+    # Method to read the document body's top-level elements, discarding each
+    # one once the caller is done with it. The automatic styles, which come
+    # before the body, are read as they're reached.
+    # Returns: generator of xml.etree.ElementTree.Element
+    def iterBodyElements(self):
+        with zipfile.ZipFile(self.source) as odtZip:
+            with odtZip.open('content.xml') as contentFile:
+                parser = ElementTree.XMLPullParser(events=('start', 'end'))
+                openElements = []
+                bodyDepth = None
+
+                while True:
+                    data = contentFile.read(READ_SIZE)
+                    if not data:
+                        break
+                    self.bytesRead += len(data)
+                    parser.feed(data)
+
+                    for event, element in parser.read_events():
+                        if event == 'start':
+                            openElements.append(element)
+                            if element.tag == OFFICE_TEXT:
+                                bodyDepth = len(openElements)
+                            continue
+
+                        openElements.pop()
+                        if element.tag == OFFICE_AUTOMATIC_STYLES and bodyDepth is None:
+                            self.readStyles(element, True)
+                            element.clear()
+                            continue
+
+                        if bodyDepth is None or len(openElements) < bodyDepth or \
+                                element.tag not in BODY_ELEMENT_TAGS:
+                            continue
+
+                        # Only elements which aren't inside another paragraph,
+                        # list or table are top-level elements
+                        containers = openElements[bodyDepth:]
+                        if all(container.tag in BODY_CONTAINER_TAGS for container in containers):
+                            yield element
+                            openElements[-1].remove(element)
+
+                parser.close()
+
+    # Method to convert a paragraph or heading
+    # Parameters:
+    #     paragraph:  The paragraph element
+    # Returns: HtmlElement
+    def convertParagraph(self, paragraph):
+        tag = 'p'
+        if paragraph.tag == TEXT_HEADING:
+            level = paragraph.get(TEXT_NAMESPACE + 'outline-level', '1')
+            tag = 'h' + str(min(max(int(level) if level.isdigit() else 1, 1), 6))
+        return HtmlElement(tag, children=self.convertParagraphContent(paragraph))
+
+    # Method to convert the content of a paragraph, with the paragraph's own
+    # direct formatting
+    # Parameters:
+    #     paragraph:  The paragraph element
+    # Returns: [] of HtmlElement or str
+    def convertParagraphContent(self, paragraph):
+        formatting = self.paragraphStyles.get(paragraph.get(TEXT_STYLE_NAME), {})
+        return wrapFormatting(self.convertInline(paragraph), formatting)
+
+    # Method to convert a list, nesting lists in the same way mammoth does:
+    # each paragraph is an item, and a nested list goes in the item before it
+    # Parameters:
+    #     listElement:  The list element
+    #     styleName:    The name of the list style of the enclosing list (or
+    #                   None)
+    #     level:        The nesting level of the list (from 1)
+    # Returns: HtmlElement
+    def convertList(self, listElement, styleName, level):
+        styleName = listElement.get(TEXT_STYLE_NAME) or styleName
+        isOrdered = self.listStyles.get(styleName, {}).get(level, False)
+        htmlList = HtmlElement('ol' if isOrdered else 'ul')
+
+        for item in listElement:
+            if item.tag not in (TEXT_NAMESPACE + 'list-item', TEXT_NAMESPACE + 'list-header'):
+                continue
+            for child in item:
+                if child.tag in (TEXT_PARAGRAPH, TEXT_HEADING):
+                    itemChildren = collapse(stripEmpty(self.convertParagraphContent(child)))
+                    if itemChildren:
+                        htmlList.children.append(HtmlElement('li', children=itemChildren))
+                elif child.tag == TEXT_LIST:
+                    if not htmlList.children:
+                        htmlList.children.append(HtmlElement('li'))
+                    htmlList.children[-1].children.append(
+                        self.convertList(child, styleName, level + 1))
+        return htmlList
+
+    # Method to convert a table
+    # Parameters:
+    #     table:  The table element
+    # Returns: HtmlElement
+    def convertTable(self, table):
+        headerRows = []
+        bodyRows = []
+        for child in table:
+            if child.tag == TABLE_NAMESPACE + 'table-header-rows' and not bodyRows:
+                headerRows.extend(self.convertTableRow(row, 'th') for row in self.iterRows(child))
+            elif child.tag == TABLE_NAMESPACE + 'table-row' or \
+                    child.tag in TABLE_ROW_CONTAINER_TAGS or \
+                    child.tag == TABLE_NAMESPACE + 'table-header-rows':
+                bodyRows.extend(self.convertTableRow(row, 'td') for row in self.iterRows(child))
+
+        if headerRows:
+            children = [HtmlElement('thead', children=headerRows),
+                        HtmlElement('tbody', children=bodyRows)]
+        else:
+            children = bodyRows
+        return HtmlElement('table', children=children, forceWrite=True)
+
+    # Method to find the rows in (or making up) part of a table
+    # Parameters:
+    #     element:  A row, or an element containing rows
+    # Returns: generator of xml.etree.ElementTree.Element
+    def iterRows(self, element):
+        if element.tag == TABLE_NAMESPACE + 'table-row':
+            yield element
+            return
+        for child in element:
+            yield from self.iterRows(child)
+
+    # Method to convert a table row
+    # Parameters:
+    #     row:      The row element
+    #     cellTag:  The tag to use for cells ('th' or 'td')
+    # Returns: HtmlElement
+    def convertTableRow(self, row, cellTag):
+        cells = []
+        # Cells covered by a merged cell are left out
+        for cell in row.findall(TABLE_NAMESPACE + 'table-cell'):
+            attributes = {}
+            colspan = cell.get(TABLE_NAMESPACE + 'number-columns-spanned')
+            if colspan and colspan != '1':
+                attributes['colspan'] = colspan
+
+            paragraphs = []
+            for child in cell:
+                if child.tag in (TEXT_PARAGRAPH, TEXT_HEADING):
+                    paragraphs.append(self.convertParagraph(child))
+                elif child.tag == TEXT_LIST:
+                    paragraphs.append(self.convertList(child, None, 1))
+            # Identical cells in a row can be saved as one, repeated
+            repeat = cell.get(TABLE_NAMESPACE + 'number-columns-repeated', '1')
+            for cellNumber in range(int(repeat) if repeat.isdigit() else 1):
+                cells.append(HtmlElement(cellTag,
+                                         attributes,
+                                         collapse(stripEmpty(list(paragraphs))),
+                                         forceWrite=True))
+        return HtmlElement('tr', children=cells, forceWrite=True)
+
+    # Method to convert the content of a paragraph (or part of one)
+    # Parameters:
+    #     parent:  The element containing the content
+    # Returns: [] of HtmlElement or str
+    def convertInline(self, parent):
+        nodes = []
+        if parent.text:
+            nodes.append(WHITESPACE_REGEX.sub(' ', parent.text))
+
+        for child in parent:
+            tag = child.tag
+            if tag == TEXT_SPAN:
+                formatting = self.textStyles.get(child.get(TEXT_STYLE_NAME), {})
+                nodes.extend(wrapFormatting(self.convertInline(child), formatting))
+            elif tag == TEXT_NAMESPACE + 'a':
+                attributes = {'href': child.get(XLINK_NAMESPACE + 'href', '')}
+                targetFrame = child.get(OFFICE_NAMESPACE + 'target-frame-name')
+                if targetFrame and targetFrame != '_self':
+                    attributes['target'] = targetFrame
+                nodes.append(HtmlElement('a', attributes, self.convertInline(child), collapsible=True))
+            elif tag == TEXT_NAMESPACE + 's':
+                count = child.get(TEXT_NAMESPACE + 'c', '1')
+                nodes.append(' ' * (int(count) if count.isdigit() else 1))
+            elif tag == TEXT_NAMESPACE + 'tab':
+                nodes.append('\t')
+            elif tag == TEXT_NAMESPACE + 'line-break':
+                nodes.append(HtmlElement('br'))
+            elif tag in (TEXT_NAMESPACE + 'bookmark', TEXT_NAMESPACE + 'bookmark-start'):
+                nodes.append(HtmlElement('a',
+                                         {'id': child.get(TEXT_NAMESPACE + 'name', '')},
+                                         collapsible=True,
+                                         forceWrite=True))
+            elif tag.startswith(TEXT_NAMESPACE) and tag not in SKIPPED_INLINE_TAGS:
+                # Fields (dates, page numbers etc.) and other containers show
+                # their content as it was when the document was saved
+                nodes.extend(self.convertInline(child))
+
+            if child.tail:
+                nodes.append(WHITESPACE_REGEX.sub(' ', child.tail))
+        return nodes
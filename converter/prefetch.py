@@ -0,0 +1,90 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from converter.ficfileconverter import STREAMING_THRESHOLD_BYTES
+from converter.tracing import traceSpan
+
+# Default number of documents to read ahead of the one being converted, and
+# number of threads to read them with
+DEFAULT_READ_AHEAD = 4
+DEFAULT_READ_THREADS = 2
+
+# Function to read a document ready for conversion
+# Parameters:
+#     filename:  The path of the document
+# Returns: bytes  The document's contents, or None if the document is big
+#     enough to be streamed (so shouldn't be read into memory)
+def readDocument(filename):
+    if not os.path.isfile(filename):
+        raise FileNotFoundError('File not found: ' + filename)
+
+    if os.path.getsize(filename) > STREAMING_THRESHOLD_BYTES:
+        return None
+
+    with traceSpan('read', 'io', {'file': filename}), open(filename, 'rb') as docxFile:
+        return docxFile.read()
+
+# Class representing a read-ahead stage for a batch of documents. While one
+# document is being converted, the next few are read in on a small pool of
+# threads, so that slow storage (network drives, USB sticks) doesn't hold up
+# the conversion. The time spent waiting for documents to be read - time the
+# converter is stalled - is recorded for each document.
+class DocumentPrefetcher():
+    # Constructor
+    # Parameters:
+    #     filenames:  The paths of the documents, in the order they'll be
+    #                 converted
+    #     readAhead:  The number of documents to read ahead of the one being
+    #                 converted
+    #     threads:    The number of threads to read with (0 to read each
+    #                 document only when it's needed)
+    def __init__(self, filenames, readAhead=DEFAULT_READ_AHEAD, threads=DEFAULT_READ_THREADS):
+        self.filenames = filenames
+        self.readAhead = readAhead
+        self.executor = None
+        if threads > 0:
+            self.executor = ThreadPoolExecutor(max_workers=threads,
+                                               thread_name_prefix='prefetch')
+
+        # Reads in progress, keyed on the document's position in the batch
+        self.reads = {}
+        self.nextRead = 0
+
+        # Total time spent waiting for documents to be read
+        self.stallSeconds = 0.0
+
+    # Method to get a document's contents, waiting for it to be read if
+    # necessary, and starting reads of the documents after it
+    # Parameters:
+    #     fileNumber:  The position of the document in the batch
+    # Returns: (bytes, float)  The document's contents (or None if it should
+    #     be streamed), and the time spent waiting for it
+    def getDocument(self, fileNumber):
+        startTime = time.perf_counter()
+
+        with traceSpan('read wait', 'io'):
+            if self.executor is None:
+                content = readDocument(self.filenames[fileNumber])
+            else:
+                # Start reading any documents in the read-ahead window which
+                # aren't being read already
+                self.nextRead = max(self.nextRead, fileNumber)
+                while self.nextRead < min(fileNumber + 1 + self.readAhead, len(self.filenames)):
+                    self.reads[self.nextRead] = self.executor.submit(readDocument,
+                                                                    self.filenames[self.nextRead])
+                    self.nextRead += 1
+
+                content = self.reads.pop(fileNumber).result()
+
+        stallSeconds = time.perf_counter() - startTime
+        self.stallSeconds += stallSeconds
+        return content, stallSeconds
+
+    # Method to stop reading ahead, dropping any documents read but not used
+    def close(self):
+        if self.executor is not None:
+            for read in self.reads.values():
+                read.cancel()
+            self.reads.clear()
+            self.executor.shutdown(wait=False)
@@ -0,0 +1,169 @@
+import cProfile
+import linecache
+import os
+import threading
+import tracemalloc
+
+# Extensions added to an output file's path for its profiling reports
+PROFILE_STATS_EXTENSION = '.pstats'
+MEMORY_REPORT_EXTENSION = '.memory.txt'
+
+# Number of allocation sites listed in a memory report, and number of frames
+# of traceback shown for each
+MEMORY_REPORT_SITES = 25
+MEMORY_REPORT_FRAMES = 6
+
+# How often (in seconds) traced memory is sampled during a conversion, and
+# how much it has to have grown since the last snapshot (as a factor) for a
+# new snapshot to be taken
+MEMORY_SAMPLE_SECONDS = 0.05
+MEMORY_SNAPSHOT_GROWTH = 1.1
+
+# Class representing which profilers to run a conversion under
+class ProfileOptions():
+    # Constructor
+    # Parameters:
+    #     cpu:     Whether to profile where time is spent (with cProfile)
+    #     memory:  Whether to profile where memory is allocated (with
+    #              tracemalloc)
+    def __init__(self, cpu=False, memory=False):
+        self.cpu = cpu
+        self.memory = memory
+
+    # Method to check whether any profiling is switched on
+    # Returns: boolean
+    def isEnabled(self):
+        return self.cpu or self.memory
+
+# Class representing a sampler which keeps the top allocation sites from when
+# traced memory was highest during a conversion. tracemalloc can't report what
+# was allocated at its peak, so traced memory is sampled on a background
+# thread, and a snapshot taken each time it reaches a new high. Each snapshot
+# is reduced to its top allocation sites straight away, and the peak is reset
+# afterwards, so snapshots don't inflate the memory they measure.
+class PeakMemorySampler(threading.Thread):
+    # Constructor
+    def __init__(self):
+        super().__init__(name='PeakMemorySampler', daemon=True)
+        self.stopping = threading.Event()
+        self.peak = 0
+        self.snapshotMemory = 0
+        self.statistics = []
+
+    def run(self):
+        while not self.stopping.wait(MEMORY_SAMPLE_SECONDS):
+            self.sample()
+
+    # Method to sample traced memory, taking a snapshot if it has grown enough
+    # since the last one
+    def sample(self):
+        current, peak = tracemalloc.get_traced_memory()
+        self.peak = max(self.peak, peak)
+        if current <= self.snapshotMemory * MEMORY_SNAPSHOT_GROWTH:
+            return
+
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, linecache.__file__),
+            tracemalloc.Filter(False, __file__)])
+        self.statistics = snapshot.statistics('traceback')[:MEMORY_REPORT_SITES]
+        self.snapshotMemory = current
+        del snapshot
+        # Memory may have kept growing while the snapshot was taken
+        self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+
+    # Method to stop sampling, taking a last sample (in case memory was
+    # highest at the end)
+    # Returns: int  The peak traced memory, in bytes
+    def stop(self):
+        self.stopping.set()
+        self.join()
+        self.sample()
+        return self.peak
+
+# Class representing a profiling session around one conversion. The reports
+# are written next to the output file (whether or not the conversion
+# succeeds), so that a slow document can be diagnosed from the reports alone:
+#     output/chapter.html.pstats      cProfile stats (load with pstats or
+#                                     snakeviz)
+#     output/chapter.html.memory.txt  Peak memory and the top allocation
+#                                     sites when memory was highest
+# Used as a context manager:
+#     with ConversionProfiler(outfilePath, options):
+#         processFile(...)
+class ConversionProfiler():
+    # Constructor
+    # Parameters:
+    #     outfilePath:  The path of the output file being profiled
+    #     options:      The ProfileOptions (or None not to profile at all)
+    def __init__(self, outfilePath, options):
+        self.outfilePath = outfilePath
+        self.options = options or ProfileOptions()
+        self.profiler = None
+        self.sampler = None
+        self.reportPaths = []
+
+    def __enter__(self):
+        if self.options.memory:
+            tracemalloc.start(MEMORY_REPORT_FRAMES)
+            self.sampler = PeakMemorySampler()
+            self.sampler.start()
+        if self.options.cpu:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        # The conversion may have failed before creating the output directory
+        directory = os.path.dirname(self.outfilePath)
+        if self.options.isEnabled() and directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        if self.profiler is not None:
+            self.profiler.disable()
+            path = self.outfilePath + PROFILE_STATS_EXTENSION
+            self.profiler.dump_stats(path)
+            self.reportPaths.append(path)
+
+        if self.sampler is not None:
+            current = tracemalloc.get_traced_memory()[0]
+            peak = self.sampler.stop()
+            tracemalloc.stop()
+
+            path = self.outfilePath + MEMORY_REPORT_EXTENSION
+            with open(path, 'w') as reportFile:
+                reportFile.write(getMemoryReport(self.sampler.statistics,
+                                                 self.sampler.snapshotMemory,
+                                                 peak,
+                                                 current))
+            self.reportPaths.append(path)
+
+        return False
+
+# Function to get a readable report of where memory was allocated. Tracing
+# starts with the conversion, so everything traced was allocated by it.
+# Parameters:
+#     statistics:      [] of tracemalloc.Statistic  The top allocation sites
+#                      from when traced memory was highest
+#     snapshotMemory:  The memory traced when they were taken, in bytes
+#     peak:            The peak memory traced during the conversion, in bytes
+#     current:         The memory still traced at the end, in bytes
+# Returns: str
+def getMemoryReport(statistics, snapshotMemory, peak, current):
+    lines = ['Peak traced memory: %.1f MB' % (peak / 1024 / 1024),
+             'Traced memory at end: %.1f MB' % (current / 1024 / 1024),
+             '',
+             'Top %d allocation sites held when traced memory was highest '
+             '(%.1f MB, sampled every %gs):' % (MEMORY_REPORT_SITES,
+                                                snapshotMemory / 1024 / 1024,
+                                                MEMORY_SAMPLE_SECONDS)]
+
+    for number, statistic in enumerate(statistics):
+        lines.append('')
+        lines.append('#%d: %.1f KB in %d blocks' % (number + 1,
+                                                    statistic.size / 1024,
+                                                    statistic.count))
+        lines.extend('    ' + line for line in statistic.traceback.format(most_recent_first=True))
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,35 @@
+import threading
+
+# Exception raised when a conversion is cancelled part-way through
+class ConversionCancelled(Exception):
+    pass
+
+# Class representing a cancellation token, used to ask a running conversion
+# (possibly on another thread) to stop. The converter checks it between
+# pipeline stages and between blocks.
+class CancellationToken():
+    # Constructor
+    def __init__(self):
+        self.event = threading.Event()
+
+    # Method to request cancellation
+    def cancel(self):
+        self.event.set()
+
+    # Method to check whether cancellation has been requested
+    # Returns: boolean
+    def isCancelled(self):
+        return self.event.is_set()
+
+    # Method to stop the conversion (by raising ConversionCancelled) if
+    # cancellation has been requested
+    def check(self):
+        if self.event.is_set():
+            raise ConversionCancelled('Conversion cancelled')
+
+# Function to check a (possibly missing) cancellation token
+# Parameters:
+#     cancelToken:  The CancellationToken, or None
+def checkCancelled(cancelToken):
+    if cancelToken is not None:
+        cancelToken.check()
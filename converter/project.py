@@ -0,0 +1,442 @@
+import glob
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from common.definitions import OUTPUT_DIR
+from common.fileio import writeFileIfChanged
+from config.classes import CharacterRoster
+from config.manager import getConfigManager, getWorkSkinCss
+from config.stores import JsonCharacterStore
+from converter.batch import findOutputCollisions
+from converter.ficfileconverter import CONVERTER_VERSION, processFile
+from converter.formats import FORMAT_HTML, OUTPUT_FORMATS, getFormatPath
+from converter.messageindex import MessageIndex
+from converter.tracing import addTraceEvents, isTracing, startTracing, takeTraceEvents, traceFile
+from converter.transforms import getPluginDigest
+
+# Default name of a project manifest, and name of the build database kept
+# alongside it
+MANIFEST_FILE_NAME = 'textfic.json'
+BUILD_DATABASE_FILE_NAME = '.textficbuild.json'
+
+# Default output naming for a work's chapters and work skin. {work} is the
+# name of the work, {name} the name of the input file (without its extension) and
+# {number} the position of the input in the work (from 1).
+DEFAULT_OUTPUT_TEMPLATE = os.path.join(OUTPUT_DIR, '{name}.html')
+DEFAULT_SKIN_TEMPLATE = os.path.join(OUTPUT_DIR, '{work}-workskin.css')
+
+# Pattern used to sort input files naturally (so chapter2 comes before
+# chapter10)
+NUMBER_REGEX = re.compile('([0-9]+)')
+
+# Class representing one work in a project: a set of chapter files, converted
+# with one roster, sharing one work skin
+class Work():
+    # Constructor
+    # Parameters:
+    #     name:            The name of the work
+    #     inputs:          [] of str  The paths of the work's input files, in
+    #                      order
+    #     outputTemplate:  The output file naming template
+    #     skinPath:        The path of the work skin
+    #     rosterPath:      The path of the work's character file (a JSON
+    #                      config file), or None to use the app's characters
+    #     minify:          Whether to minify the work skin
+    #     formats:         [] of str  The output formats to write (other formats
+    #                      are written alongside the HTML output path)
+    #     plugins:         [] of str  The module names of the transform plugins to
+    #                      convert with
+    def __init__(self, name, inputs, outputTemplate, skinPath, rosterPath, minify, formats, plugins):
+        self.name = name
+        self.inputs = inputs
+        self.outputTemplate = outputTemplate
+        self.skinPath = skinPath
+        self.rosterPath = rosterPath
+        self.minify = minify
+        self.formats = formats
+        self.plugins = plugins
+
+    # Method to get the output path for one of the work's inputs
+    # Parameters:
+    #     inputPath:  The path of the input file
+    # Returns: str
+    def getOutputPath(self, inputPath):
+        return self.outputTemplate.format(
+            work=self.name,
+            name=os.path.splitext(os.path.basename(inputPath))[0],
+            number=self.inputs.index(inputPath) + 1)
+
+    # Method to load the roster to convert the work with
+    # Returns: CharacterRoster
+    def loadRoster(self):
+        if self.rosterPath is None:
+            return getConfigManager().snapshot()
+        if not os.path.isfile(self.rosterPath):
+            raise FileNotFoundError('Character file not found: ' + self.rosterPath)
+        return CharacterRoster.fromCharacters(JsonCharacterStore(self.rosterPath).loadCharacters())
+
+# Class representing the outcome of a build
+class BuildReport():
+    # Constructor
+    def __init__(self):
+        self.built = []
+        self.upToDate = 0
+        self.failed = []
+        self.skinsWritten = []
+
+# Function to get a key for sorting file names naturally
+# Parameters:
+#     path:  The file path
+# Returns: [] of str and int
+def getNaturalSortKey(path):
+    return [int(part) if part.isdigit() else part.lower()
+            for part in NUMBER_REGEX.split(path)]
+
+# Function to read a project manifest. Paths in the manifest are relative to
+# the directory it's in, and are returned relative to the current directory.
+# A manifest looks like:
+#     {
+#         "works": [
+#             {
+#                 "name": "my-work",
+#                 "inputs": ["chapters/*.docx"],
+#                 "output": "output/my-work/{number}.html",
+#                 "skin": "output/my-work/workskin.css",
+#                 "characters": "my-work-characters.json",
+#                 "minify": true,
+#                 "formats": ["html", "epub", "txt"],
+#                 "plugins": ["myplugins.timestamps"]
+#             }
+#         ]
+#     }
+# Only "name" and "inputs" are required.
+# Parameters:
+#     manifestPath:  The path of the manifest
+# Returns: [] of Work
+def readManifest(manifestPath):
+    projectDir = os.path.dirname(manifestPath)
+
+    with open(manifestPath, 'r') as manifestFile:
+        manifest = json.load(manifestFile)
+
+    works = []
+    for workConfig in manifest.get('works', []):
+        name = workConfig['name']
+
+        inputs = []
+        for pattern in workConfig['inputs']:
+            for inputPath in sorted(glob.glob(os.path.join(projectDir, pattern)),
+                                    key=getNaturalSortKey):
+                inputPath = os.path.normpath(inputPath)
+                if inputPath not in inputs:
+                    inputs.append(inputPath)
+
+        rosterPath = workConfig.get('characters')
+        if rosterPath is not None:
+            rosterPath = os.path.join(projectDir, rosterPath)
+
+        formats = workConfig.get('formats', [FORMAT_HTML])
+        for format in formats:
+            if format not in OUTPUT_FORMATS:
+                raise ValueError('Unknown output format for ' + name + ': ' + format)
+
+        # Load the plugins now, so a missing one is reported before building
+        plugins = workConfig.get('plugins', [])
+        getPluginDigest(plugins)
+
+        works.append(Work(name,
+                          inputs,
+                          os.path.join(projectDir, workConfig.get('output', DEFAULT_OUTPUT_TEMPLATE)),
+                          os.path.join(projectDir, workConfig.get('skin', DEFAULT_SKIN_TEMPLATE)).format(work=name),
+                          rosterPath,
+                          workConfig.get('minify', True),
+                          formats,
+                          plugins))
+
+    return works
+
+# Function to get the hash of a file's contents
+# Parameters:
+#     path:  The path of the file
+# Returns: str
+def getFileHash(path):
+    with open(path, 'rb') as inputFile:
+        return hashlib.sha1(inputFile.read()).hexdigest()
+
+# Function to convert one input file, in a worker process
+# Parameters:
+#     inputPath:   The path of the input file
+#     outputPath:  The path to write the output to
+#     roster:      The CharacterRoster to identify senders with
+#     formats:     [] of str  The output formats to write
+#     plugins:     [] of str  The module names of the transform plugins to use
+#     index:       Whether to collect the file's messages for the message index
+# Returns: ([] of str, [] of dict, [] of tuple)  The names of senders
+#     identified in the file, the trace events recorded converting it (if
+#     tracing is on), and the file's messages (or None if not collected - see
+#     converter.ficfileconverter.processFile)
+def buildOutput(inputPath, outputPath, roster, formats, plugins, index):
+    startTime = time.perf_counter()
+    messages = [] if index else None
+    try:
+        characters = processFile(inputPath,
+                                 roster,
+                                 outfilePath=outputPath,
+                                 formats=formats,
+                                 plugins=plugins,
+                                 messages=messages)[1]
+    finally:
+        traceFile(inputPath, startTime, time.perf_counter())
+    return sorted(characters), takeTraceEvents(), messages
+
+# Function to convert a list of input files, spread over a pool of worker
+# processes if there's more than one. If tracing is on, it's switched on in
+# the workers too, and the events they record are collected here.
+# Parameters:
+#     staleInputs:  [] of (str, str, CharacterRoster, [] of str, [] of str,
+#                   boolean)
+#                   The input path, output path, roster, output formats,
+#                   transform plugins and whether to collect the messages of
+#                   each file to convert
+#     jobs:         The number of processes to convert with (or None for one
+#                   per CPU)
+# Returns: generator of ((str, str, CharacterRoster, [] of str, [] of str,
+#     boolean), [] of str, [] of tuple, Exception)
+#     Each file's details, the senders found in it, its messages (if
+#     collected), and the error raised converting it (or None), as each file
+#     finishes
+def runBuilds(staleInputs, jobs):
+    jobs = min(jobs or os.cpu_count() or 1, len(staleInputs))
+
+    if jobs <= 1:
+        for staleInput in staleInputs:
+            try:
+                senders, events, messages = buildOutput(*staleInput)
+            except Exception as error:
+                yield staleInput, None, None, error
+                continue
+            addTraceEvents(events)
+            yield staleInput, senders, messages, None
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs,
+                             initializer=startTracing if isTracing() else None) as executor:
+        futures = {executor.submit(buildOutput, *staleInput): staleInput
+                   for staleInput in staleInputs}
+        for future in as_completed(futures):
+            error = future.exception()
+            if error is not None:
+                yield futures[future], None, None, error
+                continue
+            senders, events, messages = future.result()
+            addTraceEvents(events)
+            yield futures[future], senders, messages, None
+
+# Class representing the dependency database of a project: what each output
+# was built from (input file details, roster and plugin digest and converter
+# version), and the characters each work skin was built for
+class BuildDatabase():
+    # Constructor. Paths are stored relative to the project directory, so the
+    # project can be built from anywhere (or moved).
+    # Parameters:
+    #     projectDir:  The project directory
+    def __init__(self, projectDir):
+        self.projectDir = projectDir
+        self.path = os.path.join(projectDir, BUILD_DATABASE_FILE_NAME)
+        self.inputs = {}
+        self.skins = {}
+
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as databaseFile:
+                database = json.load(databaseFile)
+
+            # Outputs built by another version of the converter are all stale
+            if database.get('converterVersion') == CONVERTER_VERSION:
+                self.inputs = database.get('inputs', {})
+                self.skins = database.get('skins', {})
+
+    # Method to get the path stored in the database for a file
+    # Parameters:
+    #     path:  The path of the file
+    # Returns: str
+    def getKey(self, path):
+        return os.path.relpath(path, self.projectDir or '.')
+
+    # Method to check whether an input's output is up to date. An input whose
+    # modification time has changed is hashed, so files which have been
+    # touched but not changed aren't rebuilt.
+    # Parameters:
+    #     inputPath:     The path of the input file
+    #     outputPath:    The path of the output file
+    #     rosterDigest:  The digest of the roster (and plugins) it would be
+    #                    built with
+    #     formats:       [] of str  The output formats it would be built in
+    # Returns: boolean
+    def isUpToDate(self, inputPath, outputPath, rosterDigest, formats):
+        record = self.inputs.get(self.getKey(inputPath))
+        if not record or record['output'] != self.getKey(outputPath) or \
+                record['rosterDigest'] != rosterDigest or \
+                record.get('formats', [FORMAT_HTML]) != formats or \
+                not all(os.path.exists(getFormatPath(outputPath, format))
+                        for format in formats):
+            return False
+
+        stat = os.stat(inputPath)
+        if [stat.st_mtime_ns, stat.st_size] == [record['mtime'], record['size']]:
+            return True
+
+        if getFileHash(inputPath) != record['hash']:
+            return False
+
+        record['mtime'], record['size'] = stat.st_mtime_ns, stat.st_size
+        return True
+
+    # Method to record that an output has been built
+    # Parameters:
+    #     inputPath:     The path of the input file
+    #     outputPath:    The path of the output file
+    #     rosterDigest:  The digest of the roster (and plugins) it was built
+    #                    with
+    #     formats:       [] of str  The output formats it was built in
+    #     senders:       [] of str  The names of senders found in the input
+    def recordOutput(self, inputPath, outputPath, rosterDigest, formats, senders):
+        stat = os.stat(inputPath)
+        self.inputs[self.getKey(inputPath)] = {'mtime': stat.st_mtime_ns,
+                                               'size': stat.st_size,
+                                               'hash': getFileHash(inputPath),
+                                               'rosterDigest': rosterDigest,
+                                               'output': self.getKey(outputPath),
+                                               'formats': formats,
+                                               'senders': senders}
+
+    # Method to forget an input's output (e.g. because building it failed)
+    # Parameters:
+    #     inputPath:  The path of the input file
+    def forgetOutput(self, inputPath):
+        self.inputs.pop(self.getKey(inputPath), None)
+
+    # Method to get the senders found in an input when it was last built
+    # Parameters:
+    #     inputPath:  The path of the input file
+    # Returns: [] of str
+    def getSenders(self, inputPath):
+        return self.inputs.get(self.getKey(inputPath), {}).get('senders', [])
+
+    # Method to save the database (only written if it has changed)
+    def save(self):
+        writeFileIfChanged(self.path, json.dumps({'converterVersion': CONVERTER_VERSION,
+                                                  'inputs': self.inputs,
+                                                  'skins': self.skins},
+                                                 indent=1,
+                                                 sort_keys=True))
+
+# Function to check that no two inputs of a project would be built to the same
+# output file (e.g. a/ch1.docx and b/ch1.docx with the default output
+# template), as one chapter's output would silently overwrite the other's.
+# Raises a ValueError listing the inputs if any share an output file.
+# Parameters:
+#     works:  The project's Works
+def checkOutputCollisions(works):
+    outputPaths = {}
+    inputs = []
+    for work in works:
+        for inputPath in work.inputs:
+            outputPaths[(work.name, inputPath)] = work.getOutputPath(inputPath)
+            inputs.append((work.name, inputPath))
+
+    collisions = findOutputCollisions(inputs, outputPaths.get)
+    if collisions:
+        raise ValueError('; '.join('inputs would be built to the same output (' +
+                                   outputPaths[group[0]] + '): ' +
+                                   ', '.join(inputPath for workName, inputPath in group)
+                                   for group in collisions))
+
+# Function to build a project: convert every input whose output is missing or
+# stale (in parallel), then rewrite the work skin of any work whose set of
+# characters (or their colors) has changed
+# Parameters:
+#     manifestPath:  The path of the project manifest
+#     jobs:          The number of processes to convert with (optional -
+#                    defaults to one per CPU)
+#     force:         Whether to rebuild everything (optional)
+#     indexPath:     The path of a message index to keep up to date with the
+#                    project's chapters (optional - see
+#                    converter.messageindex). Chapters missing from the index
+#                    are rebuilt, so an index can be added to a built project.
+# Returns: BuildReport
+def buildProject(manifestPath, jobs=None, force=False, indexPath=None):
+    works = readManifest(manifestPath)
+    checkOutputCollisions(works)
+    database = BuildDatabase(os.path.dirname(manifestPath))
+    report = BuildReport()
+    index = MessageIndex(indexPath) if indexPath else None
+
+    # Work out what needs building
+    rosters = {}
+    workNames = {}
+    staleInputs = []
+    for work in works:
+        roster = rosters[work.name] = work.loadRoster()
+        # Outputs are rebuilt if the plugins they were built with change too
+        digest = roster.getDigest() + getPluginDigest(work.plugins)
+        for inputPath in work.inputs:
+            workNames[inputPath] = work.name
+            outputPath = work.getOutputPath(inputPath)
+            if not force and database.isUpToDate(inputPath, outputPath, digest, work.formats) and \
+                    (index is None or index.hasChapter(work.name, inputPath)):
+                report.upToDate += 1
+            else:
+                staleInputs.append((inputPath, outputPath, roster, work.formats, work.plugins,
+                                    index is not None))
+
+    # Build it, in parallel if there's more than one file
+    for (inputPath, outputPath, roster, formats, plugins, indexed), senders, messages, error in \
+            runBuilds(staleInputs, jobs):
+        if error is not None:
+            report.failed.append((inputPath, str(error)))
+            database.forgetOutput(inputPath)
+            continue
+        database.recordOutput(inputPath,
+                              outputPath,
+                              roster.getDigest() + getPluginDigest(plugins),
+                              formats,
+                              senders)
+        if indexed:
+            index.updateChapter(workNames[inputPath], inputPath, messages)
+        report.built.append((inputPath, outputPath))
+
+    # Drop any chapters which are no longer part of their work from the
+    # index
+    if index is not None:
+        for work in works:
+            index.pruneChapters(work.name, work.inputs)
+        index.close()
+
+    # Rebuild the work skins whose characters have changed
+    for work in works:
+        roster = rosters[work.name]
+        names = set()
+        for inputPath in work.inputs:
+            for sender in database.getSenders(inputPath):
+                character = roster.getCharacter(sender)
+                if character:
+                    names.add(character.name)
+
+        skinRecord = {'characters': sorted(names),
+                      'rosterDigest': roster.getDigest(),
+                      'path': database.getKey(work.skinPath),
+                      'minify': work.minify}
+        if force or database.skins.get(work.name) != skinRecord or \
+                not os.path.exists(work.skinPath):
+            writeFileIfChanged(work.skinPath,
+                               getWorkSkinCss(names, work.minify, roster))
+            database.skins[work.name] = skinRecord
+            report.skinsWritten.append(work.skinPath)
+
+    database.save()
+    return report
+
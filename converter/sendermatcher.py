@@ -0,0 +1,87 @@
+import re
+import weakref
+
+# Separator between a sender's name and their message
+SENDER_SEPARATOR = ': '
+
+# Fallback pattern used to spot senders who aren't configured as characters
+# (these can only be detected if their name is a single word)
+UNKNOWN_SENDER_REGEX = re.compile(r'([A-Za-z0-9]+?): .+')
+
+# Key used to mark the end of a name in the trie (no real character can be
+# None, so it can't clash)
+END_OF_NAME = None
+
+# Cache of built matchers, one per roster snapshot. Rosters are immutable, so
+# a matcher only needs rebuilding when the config changes (i.e. when there's a
+# new roster).
+matcherCache = weakref.WeakKeyDictionary()
+
+# Class used to find who sent a message. The names and aliases of every
+# configured character are compiled into a single prefix tree (trie), so
+# finding the sender only requires walking along the start of the line once -
+# however many characters are configured.
+class SenderMatcher():
+    # Constructor
+    # Parameters:
+    #     roster:  The CharacterRoster to match senders against
+    def __init__(self, roster):
+        self.trie = {}
+        for character in roster:
+            for alias in character.getAllNames():
+                # Each character of the alias is one edge, keyed on its
+                # lower case form - as in match - even where that's more than
+                # one code point (e.g. 'İ')
+                node = self.trie
+                for char in alias:
+                    node = node.setdefault(char.lower(), {})
+
+                # If two characters share an alias, the first one wins
+                node.setdefault(END_OF_NAME, character)
+
+    # Method to find the sender of a message line, i.e. the longest configured
+    # name/ alias at the start of the line which is followed by ": " and some
+    # message text. If no configured name matches, fall back to looking for an
+    # unknown single-word sender.
+    # Parameters:
+    #     line:  The text of the message
+    # Returns: (str, str) The sender's name as written in the line, and the
+    #     CSS class for the sender - or None if the line isn't a message
+    def match(self, line):
+        node = self.trie
+        matchLength = 0
+        matchedCharacter = None
+
+        for position, char in enumerate(line):
+            node = node.get(char.lower())
+            if node is None:
+                break
+
+            character = node.get(END_OF_NAME)
+            nameEnd = position + 1
+            if character is not None and \
+                    line.startswith(SENDER_SEPARATOR, nameEnd) and \
+                    len(line) > nameEnd + 2 and line[nameEnd + 2] != '\n':
+                matchLength = nameEnd
+                matchedCharacter = character
+
+        if matchedCharacter:
+            return line[:matchLength], matchedCharacter.name
+
+        result = UNKNOWN_SENDER_REGEX.match(line)
+        if result:
+            return result.group(1), result.group(1).lower()
+
+        return None
+
+# Function to get the SenderMatcher for the given roster, building it if it
+# hasn't been used before
+# Parameters:
+#     roster:  The CharacterRoster to match senders against
+# Returns: SenderMatcher
+def getSenderMatcher(roster):
+    matcher = matcherCache.get(roster)
+    if matcher is None:
+        matcher = SenderMatcher(roster)
+        matcherCache[roster] = matcher
+    return matcher
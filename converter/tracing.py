@@ -0,0 +1,225 @@
+import json
+import os
+import threading
+import time
+
+from common.fileio import writeFileAtomic
+
+# Process ID used for the per-file tracks in a trace (real process IDs are
+# never 0)
+FILES_PROCESS_ID = 0
+
+# The trace recorder for this process, or None if tracing is switched off.
+# The converter checks this before recording anything, so tracing costs
+# nothing when it's off.
+recorder = None
+
+# Class representing a recorder of trace events, in the Chrome trace event
+# format (viewable in Perfetto, chrome://tracing or any compatible viewer).
+# Spans are recorded on a track for the thread they ran on, grouped by
+# process - and each file's conversion as a whole is also recorded on a track
+# of its own.
+class TraceRecorder():
+    # Constructor
+    def __init__(self):
+        self.events = []
+        self.threadNames = {}
+
+    # Method to record a span of time on the current thread's track
+    # Parameters:
+    #     name:       The name of the span
+    #     category:   The category of the span
+    #     startTime:  The time the span started (from time.perf_counter)
+    #     endTime:    The time the span ended
+    #     args:       dict of details to show with the span (optional)
+    def addSpan(self, name, category, startTime, endTime, args=None):
+        threadId = threading.get_ident()
+        if threadId not in self.threadNames:
+            self.threadNames[threadId] = threading.current_thread().name
+
+        event = {'name': name,
+                 'cat': category,
+                 'ph': 'X',
+                 'ts': startTime * 1000000,
+                 'dur': (endTime - startTime) * 1000000,
+                 'pid': os.getpid(),
+                 'tid': threadId}
+        if args:
+            event['args'] = args
+        self.events.append(event)
+
+    # Method to record the conversion of a file, on the file's track
+    # Parameters:
+    #     filename:   The path of the file
+    #     startTime:  The time the conversion started (from time.perf_counter)
+    #     endTime:    The time the conversion ended
+    def addFileSpan(self, filename, startTime, endTime):
+        self.events.append({'name': os.path.basename(filename),
+                            'cat': 'file',
+                            'ph': 'X',
+                            'ts': startTime * 1000000,
+                            'dur': (endTime - startTime) * 1000000,
+                            'pid': FILES_PROCESS_ID,
+                            'tid': filename,
+                            'args': {'file': filename,
+                                     'worker': os.getpid()}})
+
+    # Method to take the events recorded so far (e.g. to send them from a
+    # worker process back to the main process), leaving the recorder empty
+    # Returns: [] of dict
+    def takeEvents(self):
+        events = self.events
+        self.events = []
+        for threadId, threadName in self.threadNames.items():
+            events.append({'name': 'thread_name',
+                           'ph': 'M',
+                           'pid': os.getpid(),
+                           'tid': threadId,
+                           'args': {'name': threadName}})
+        return events
+
+# Class representing a span being timed, used as a context manager:
+#     with traceSpan('parse'):
+#         ...
+class TraceSpan():
+    # Constructor
+    # Parameters:
+    #     recorder:  The TraceRecorder to record the span with
+    #     name:      The name of the span
+    #     category:  The category of the span
+    #     args:      dict of details to show with the span
+    def __init__(self, recorder, name, category, args):
+        self.recorder = recorder
+        self.name = name
+        self.category = category
+        self.args = args
+        self.startTime = 0.0
+
+    def __enter__(self):
+        self.startTime = time.perf_counter()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.recorder.addSpan(self.name,
+                              self.category,
+                              self.startTime,
+                              time.perf_counter(),
+                              self.args)
+        return False
+
+# Class representing a span which isn't recorded, used when tracing is off
+class NullSpan():
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        return False
+
+NULL_SPAN = NullSpan()
+
+# Function to switch tracing on for this process, discarding anything
+# recorded before. Also used to initialise worker processes.
+def startTracing():
+    global recorder
+    recorder = TraceRecorder()
+
+# Function to switch tracing off for this process
+# Returns: [] of dict  The events recorded
+def stopTracing():
+    global recorder
+    events = takeTraceEvents()
+    recorder = None
+    return events
+
+# Function to check whether tracing is switched on for this process
+# Returns: boolean
+def isTracing():
+    return recorder is not None
+
+# Function to start timing a span of the conversion, if tracing is on
+# Parameters:
+#     name:      The name of the span
+#     category:  The category of the span (optional)
+#     args:      dict of details to show with the span (optional)
+# Returns: TraceSpan (or NULL_SPAN)  Context manager covering the span
+def traceSpan(name, category='convert', args=None):
+    if recorder is None:
+        return NULL_SPAN
+    return TraceSpan(recorder, name, category, args)
+
+# Function to record the conversion of a file on the file's track, if tracing
+# is on
+# Parameters:
+#     filename:   The path of the file
+#     startTime:  The time the conversion started (from time.perf_counter)
+#     endTime:    The time the conversion ended
+def traceFile(filename, startTime, endTime):
+    if recorder is not None:
+        recorder.addFileSpan(filename, startTime, endTime)
+
+# Function to take the events recorded in this process so far
+# Returns: [] of dict  The events (empty if tracing is off)
+def takeTraceEvents():
+    if recorder is None:
+        return []
+    return recorder.takeEvents()
+
+# Function to add events recorded in another process to this process's
+# recorder, if tracing is on
+# Parameters:
+#     events:  [] of dict  The events
+def addTraceEvents(events):
+    if recorder is not None:
+        recorder.events.extend(events)
+
+# Function to write trace events to a JSON file in the Chrome trace event
+# format. Timestamps are made relative to the first event, and the file
+# tracks are numbered and named after their files.
+# Parameters:
+#     path:    The path of the trace file
+#     events:  [] of dict  The events
+def writeTrace(path, events):
+    timedEvents = [event for event in events if 'ts' in event]
+    startTime = min((event['ts'] for event in timedEvents), default=0)
+
+    fileTracks = {}
+    processIds = set()
+    metadata = set()
+    traceEvents = []
+    for event in events:
+        # Thread names are sent with every batch of events from a process
+        if event['ph'] == 'M':
+            key = (event['pid'], event['tid'], event['name'])
+            if key in metadata:
+                continue
+            metadata.add(key)
+
+        event = dict(event)
+        if 'ts' in event:
+            event['ts'] = round(event['ts'] - startTime, 3)
+            event['dur'] = round(event['dur'], 3)
+        if event['pid'] == FILES_PROCESS_ID:
+            if event['tid'] not in fileTracks:
+                fileTracks[event['tid']] = len(fileTracks) + 1
+            event['tid'] = fileTracks[event['tid']]
+        else:
+            processIds.add(event['pid'])
+        traceEvents.append(event)
+
+    traceEvents.append({'name': 'process_name', 'ph': 'M',
+                        'pid': FILES_PROCESS_ID, 'tid': 0,
+                        'args': {'name': 'Files'}})
+    for filename, trackId in fileTracks.items():
+        traceEvents.append({'name': 'thread_name', 'ph': 'M',
+                            'pid': FILES_PROCESS_ID, 'tid': trackId,
+                            'args': {'name': os.path.basename(filename)}})
+        traceEvents.append({'name': 'thread_sort_index', 'ph': 'M',
+                            'pid': FILES_PROCESS_ID, 'tid': trackId,
+                            'args': {'sort_index': trackId}})
+    for processId in sorted(processIds):
+        traceEvents.append({'name': 'process_name', 'ph': 'M',
+                            'pid': processId, 'tid': 0,
+                            'args': {'name': 'Worker ' + str(processId)}})
+
+    writeFileAtomic(path, json.dumps({'traceEvents': traceEvents,
+                                      'displayTimeUnit': 'ms'}))
@@ -0,0 +1,418 @@
+import importlib
+import weakref
+
+from converter.sendermatcher import getSenderMatcher
+
+# The chat transform is made up of stages, run in three phases for each chat:
+#   - header stages, run once the "|||" header paragraph has been found
+#   - message stages, run for each message paragraph in turn until one of them
+#     handles it
+#   - finish stages, run once all of the messages have been handled
+# The built-in stages (header styling, "///" actions, sender detection and
+# speaker blocks, delimiter bars) are always active. Plugins add their own
+# stages (e.g. timestamps, read receipts or image messages), slotted in
+# between the built-in ones by their order.
+#
+# A plugin is a module with a function getTransformStages(), returning a list
+# of TransformStage. It can also set TRANSFORM_VERSION, which should be
+# increased whenever a change to the plugin changes its output (so that cached
+# conversions and incremental builds aren't reused).
+#
+# The active stages are resolved once per conversion (per roster and set of
+# plugins) into a flat list of functions for each phase, so there's no lookup
+# or dispatch per message beyond calling them.
+PHASE_HEADER = 'header'
+PHASE_MESSAGE = 'message'
+PHASE_FINISH = 'finish'
+PHASES = [PHASE_HEADER, PHASE_MESSAGE, PHASE_FINISH]
+
+# Orders of the built-in stages
+ORDER_HEADER = 100
+ORDER_ACTION = 100
+ORDER_SENDER = 200
+ORDER_SPEAKER_BLOCKS = 100
+ORDER_DELIMITER_BAR = 200
+ORDER_PARAGRAPH = 1000
+
+# Cache of compiled transforms, one per roster snapshot and set of plugins (see
+# converter.sendermatcher)
+transformCache = weakref.WeakKeyDictionary()
+
+# Method to wrap the given element in a <span> with the specified class
+# Parameters:
+#     element:      The element to wrap
+#     classString:  The class to use for the parent <span>
+# Returns: bs4.element.Tag  The parent <span> wrapping the element
+def wrapWithClass(soup, element, classString):
+    element.wrap(soup.new_tag('span'))
+    parentSpan = element.parent
+    addClass(soup, parentSpan, classString)
+
+    return parentSpan
+
+# Method to insert a line break (<br> tag) into the given element at a specified
+# position. If the position is -1, add it to the end.
+# Parameters:
+#     parent:    The parent into which to insert the break
+#     hidden:    Whether the break should have the 'hide' class set
+#     position:  The position at which to insert the break
+def insertBreak(soup, parent, hidden, position):
+    breakTag = soup.new_tag('br')
+
+    if position == -1:
+        parent.append(breakTag)
+    else:
+        parent.insert(position, breakTag)
+
+    if hidden:
+        wrapWithClass(soup, breakTag, 'hide')
+
+# Method to add a class to a tag, preserving any classes which already exist
+# Parameters:
+#     element:      The tag
+#     classString:  The class to add
+def addClass(soup, element, classString):
+    element['class'] = ' '.join([element.get('class', ''), classString])
+
+# Method to end the given speaker block, adding it to the message block. Sets
+# "bottom-text" class on the last message in the block, which allows the "tail"
+# to be displayed on the last message from a given sender.
+# Parameters:
+#     speakerBlock:  The speaker block to end
+#     messageBlock:  The parent message block
+def endSpeakerBlock(soup, speakerBlock, messageBlock):
+    if speakerBlock:
+        addClass(soup, speakerBlock.find_all('span')[-1], 'bottom-text')
+        insertBreak(soup, speakerBlock, True, -1)
+        messageBlock.append(speakerBlock)
+
+# Method to start a new speaker block, which is a <span> tag containing a series
+# of messages from a single  sender. Initiates the tag, styles it appropriately
+# (taking into account whether the sender is the 'group leader', whose messages
+# appear on the right). Also adds a name-tag containing the sender's name,
+# and then first message.
+# Parameters:
+#     message:      The first message to be added to the block
+#     sender:       The name of the sender (as written in the document)
+#     senderClass:  The CSS class of the sender
+#     groupLeader:  The CSS class of the 'group leader' for the message block
+# Returns: bs4.element.Tag  The speaker block
+def startSpeakerBlock(soup, message, sender, senderClass, groupLeader):
+    speakerBlock = soup.new_tag('span')
+    speakerBlock['class'] = 'sender-block ' + senderClass
+    if (senderClass == groupLeader):
+        speakerBlock['class'] = speakerBlock['class'] + ' group-leader'
+    addClass(soup, message, 'top-text')
+    nameTag = soup.new_tag('span')
+    nameTag['class'] = 'name-tag'
+    nameTag.string = sender
+    speakerBlock.append(nameTag)
+    nameTag.wrap(soup.new_tag('strong'))
+    insertBreak(soup, speakerBlock, False, -1)
+    speakerBlock.append(message)
+    insertBreak(soup, speakerBlock, False, -1)
+
+    return speakerBlock
+
+# Class representing a stage of the chat transform
+class TransformStage():
+    # Constructor
+    # Parameters:
+    #     name:         The name of the stage
+    #     phase:        The phase the stage runs in (see PHASES)
+    #     order:        The position of the stage in its phase - stages run in
+    #                   increasing order, and plugin stages run after built-in
+    #                   stages of the same order
+    #     createStage:  Function called with the CharacterRoster once per
+    #                   conversion, returning the function to run. Header and
+    #                   finish stages are called with the ChatState; message
+    #                   stages with the ChatState, the message paragraph and
+    #                   its first piece of text, and return True if they've
+    #                   handled the message (so no later stage sees it).
+    #                   Returning None leaves the stage out.
+    def __init__(self, name, phase, order, createStage):
+        if phase not in PHASES:
+            raise ValueError('Unknown transform phase for ' + name + ': ' + phase)
+        self.name = name
+        self.phase = phase
+        self.order = order
+        self.createStage = createStage
+
+# Class representing the state of the transform of a single chat, shared by
+# its stages
+class ChatState():
+    # Constructor
+    # Parameters:
+    #     soup:        The BeautifulSoup the chat is in
+    #     characters:  Set to add the names of any senders found to
+    #     header:      The "|||" header paragraph
+    #     delimiter:   The text in the header containing the "|||" delimiter
+    def __init__(self, soup, characters, header, delimiter):
+        self.soup = soup
+        self.characters = characters
+        self.header = header
+        self.delimiter = delimiter
+
+        # Container for all the messages in the chat
+        self.messageContainer = soup.new_tag('span')
+        self.messageContainer['class'] = 'message-block'
+
+        # The currently active speaker and their speaker block, and the CSS
+        # class of the "group leader" (the sender of the first message), whose
+        # texts appear on the right
+        self.speakerBlock = None
+        self.lastSender = None
+        self.groupLeader = None
+
+        # The messages found, in order: their sender as written, the character
+        # they were identified as and their wrapped <span>
+        self.messages = []
+
+    # Method to end the current speaker block (e.g. because the speaker has
+    # been interrupted), so the next message starts a new one
+    def interruptSpeaker(self):
+        if self.speakerBlock:
+            endSpeakerBlock(self.soup, self.speakerBlock, self.messageContainer)
+        self.speakerBlock = None
+        self.lastSender = None
+
+# Class representing a compiled chat transform: the functions for each phase,
+# in order
+class ChatTransform():
+    # Constructor
+    # Parameters:
+    #     headerStages:   [] of function  The header stages
+    #     messageStages:  [] of function  The message stages
+    #     finishStages:   [] of function  The finish stages
+    #     digest:         String identifying the plugins (and their versions)
+    #                     the transform was built with - empty if there are
+    #                     none
+    def __init__(self, headerStages, messageStages, finishStages, digest):
+        self.headerStages = headerStages
+        self.messageStages = messageStages
+        self.finishStages = finishStages
+        self.digest = digest
+
+# Function to style the "|||" header paragraph of a chat
+# Parameters:
+#     roster:  The CharacterRoster
+# Returns: function
+def createHeaderStage(roster):
+    def styleHeader(state):
+        soup = state.soup
+        parentPara = state.header
+
+        # Replace the paragraph with a styled span
+        messagesHeader = wrapWithClass(soup, parentPara, 'messages-header')
+
+        # Add a 'chat name' prefix to the message header
+        chatNameSpan = soup.new_tag('span')
+        chatNameSpan.string = 'Chat name: '
+        addClass(soup, chatNameSpan, 'hide')
+        parentPara.insert(0, chatNameSpan)
+
+        # Get rid of the parent paragraph
+        parentPara.wrap(soup.new_tag('strong'))
+        parentPara.unwrap()
+
+        # Strip out the "|||" delimiter from the header
+        state.delimiter.replace_with(state.delimiter.strip('| '))
+        state.header = messagesHeader
+
+    return styleHeader
+
+# Function to handle "///" action lines (e.g. "/// Alice added Lily")
+# Parameters:
+#     roster:  The CharacterRoster
+# Returns: function
+def createActionStage(roster):
+    def handleAction(state, message, content):
+        if not content.startswith('///'):
+            return False
+
+        # Whoever was speaking has been interrupted
+        state.interruptSpeaker()
+
+        # Handle the comment - wrap it in a styled <span> and ditch the <p>
+        # and "///"
+        soup = state.soup
+        wrappedMessage = wrapWithClass(soup, message, 'message-action')
+        message.wrap(soup.new_tag('i'))
+        message.unwrap()
+        content.replace_with(content.strip('/ '))
+        state.messageContainer.append(wrappedMessage)
+        insertBreak(soup, state.messageContainer, True, -1)
+        insertBreak(soup, state.messageContainer, True, -1)
+        return True
+
+    return handleAction
+
+# Function to handle messages: find who sent each one, and group consecutive
+# messages from the same sender into speaker blocks
+# Parameters:
+#     roster:  The CharacterRoster to identify senders with
+# Returns: function
+def createSenderStage(roster):
+    senderMatcher = getSenderMatcher(roster)
+
+    def handleMessage(state, message, content):
+        # Style the message as such
+        soup = state.soup
+        wrappedMessage = wrapWithClass(soup, message, 'message')
+        message.unwrap()
+
+        # Find out who sent the message (it should start with their name or
+        # one of their aliases, followed by ": ")
+        result = senderMatcher.match(content)
+
+        # If this doesn't seem to be a message, the safest thing to do is to
+        # skip it
+        if not result:
+            return True
+
+        # Get the sender as written, and the CSS class for them (all of a
+        # character's aliases share the same class)
+        sender, senderClass = result
+
+        # Add the speaker to our running list
+        state.characters.add(sender)
+        state.messages.append((sender, senderClass, wrappedMessage))
+
+        # Strip the sender name from the message (this is crude but effective)
+        content.replace_with(content[len(sender) + 2:])
+
+        # If we don't have a main author yet, this sender can have the role
+        if not state.groupLeader:
+            state.groupLeader = senderClass
+
+        # If this is a new sender, close out the speaker block and start a new
+        # one
+        if senderClass != state.lastSender:
+            endSpeakerBlock(soup, state.speakerBlock, state.messageContainer)
+            state.speakerBlock = startSpeakerBlock(soup,
+                                                   wrappedMessage,
+                                                   sender,
+                                                   senderClass,
+                                                   state.groupLeader)
+            state.lastSender = senderClass
+        else:
+            # Otherwise, add the message to the current speaker block
+            state.speakerBlock.append(wrappedMessage)
+            insertBreak(soup, state.speakerBlock, False, -1)
+        return True
+
+    return handleMessage
+
+# Function to close out the last speaker block and put the chat together:
+# the header inside the message container, straight after the header's
+# original position
+# Parameters:
+#     roster:  The CharacterRoster
+# Returns: function
+def createSpeakerBlocksStage(roster):
+    def finishMessages(state):
+        soup = state.soup
+        messageContainer = state.messageContainer
+        endSpeakerBlock(soup, state.speakerBlock, messageContainer)
+        state.speakerBlock = None
+
+        # Add the message container to the HTML and move the header inside it
+        state.header.insert_after(messageContainer)
+        insertBreak(soup, messageContainer, True, 0)
+        messageContainer.insert(1, state.header)
+        insertBreak(soup, messageContainer, True, 2)
+        insertBreak(soup, messageContainer, True, 3)
+
+    return finishMessages
+
+# Function to add a "delimiter bar" (styled to act as a spacer) after the
+# messages of a chat
+# Parameters:
+#     roster:  The CharacterRoster
+# Returns: function
+def createDelimiterBarStage(roster):
+    def addDelimiterBar(state):
+        delimiterBox = state.soup.new_tag('span')
+        delimiterBox['class'] = 'delimiter-bar'
+        state.messageContainer.append(delimiterBox)
+
+    return addDelimiterBar
+
+# Function to put the finished chat in a paragraph, else AO3 gets upset
+# Parameters:
+#     roster:  The CharacterRoster
+# Returns: function
+def createParagraphStage(roster):
+    def wrapInParagraph(state):
+        state.messageContainer.wrap(state.soup.new_tag('p'))
+
+    return wrapInParagraph
+
+# The built-in stages, which are always active
+BUILTIN_STAGES = [TransformStage('header', PHASE_HEADER, ORDER_HEADER, createHeaderStage),
+                  TransformStage('action', PHASE_MESSAGE, ORDER_ACTION, createActionStage),
+                  TransformStage('sender', PHASE_MESSAGE, ORDER_SENDER, createSenderStage),
+                  TransformStage('speaker blocks', PHASE_FINISH, ORDER_SPEAKER_BLOCKS, createSpeakerBlocksStage),
+                  TransformStage('delimiter bar', PHASE_FINISH, ORDER_DELIMITER_BAR, createDelimiterBarStage),
+                  TransformStage('paragraph', PHASE_FINISH, ORDER_PARAGRAPH, createParagraphStage)]
+
+# Function to load the stages of a set of plugins
+# Parameters:
+#     plugins:  Iterable of str  The module names of the plugins
+# Returns: ([] of TransformStage, str)  The plugins' stages, and the digest
+#     identifying the plugins and their versions (empty if there are none)
+def loadPluginStages(plugins):
+    stages = []
+    digestParts = []
+    for plugin in plugins:
+        module = importlib.import_module(plugin)
+        getTransformStages = getattr(module, 'getTransformStages', None)
+        if getTransformStages is None:
+            raise ValueError('Not a transform plugin (no getTransformStages): ' + plugin)
+        stages.extend(getTransformStages())
+        digestParts.append(plugin + '@' + str(getattr(module, 'TRANSFORM_VERSION', 1)))
+
+    return stages, '+'.join([''] + digestParts)
+
+# Function to get the digest identifying a set of plugins, to add to the
+# roster digest when caching conversions or recording builds
+# Parameters:
+#     plugins:  Iterable of str  The module names of the plugins
+# Returns: str  (empty if there are no plugins)
+def getPluginDigest(plugins):
+    return loadPluginStages(plugins)[1] if plugins else ''
+
+# Function to compile the chat transform for a roster and set of plugins
+# Parameters:
+#     roster:   The CharacterRoster to identify senders with
+#     plugins:  Iterable of str  The module names of the plugins
+# Returns: ChatTransform
+def compileTransform(roster, plugins):
+    pluginStages, digest = loadPluginStages(plugins)
+
+    # Sorting is stable, so plugin stages come after built-in stages of the
+    # same order (and after earlier plugins' stages)
+    phaseStages = {phase: [] for phase in PHASES}
+    for stage in sorted(BUILTIN_STAGES + pluginStages, key=lambda stage: stage.order):
+        function = stage.createStage(roster)
+        if function is not None:
+            phaseStages[stage.phase].append(function)
+
+    return ChatTransform(phaseStages[PHASE_HEADER],
+                         phaseStages[PHASE_MESSAGE],
+                         phaseStages[PHASE_FINISH],
+                         digest)
+
+# Function to get the compiled chat transform for a roster and set of plugins,
+# compiling it if it hasn't been used before
+# Parameters:
+#     roster:   The CharacterRoster to identify senders with
+#     plugins:  Iterable of str  The module names of the plugins (optional)
+# Returns: ChatTransform
+def getChatTransform(roster, plugins=()):
+    plugins = tuple(plugins)
+    transforms = transformCache.setdefault(roster, {})
+    transform = transforms.get(plugins)
+    if transform is None:
+        transform = transforms[plugins] = compileTransform(roster, plugins)
+    return transform
@@ -2,14 +2,19 @@ import sys
 from math import floor
 from functools import partial
 import os
+from PySide2.QtCore import Qt, QSortFilterProxyModel
 from PySide2.QtWidgets import *
-from PySide2.QtGui import QIcon
+from PySide2.QtGui import QIcon, QKeySequence
 
 from common.definitions import *
 from common import resources
-from config.manager import getConfigManager
-from converter.ficfileconverter import processFile
-from gui.filepreview import FilePreviewWindow
+from config.manager import getConfigManager, generateWorkSkin
+from config.importexport import exportCharacters, importCharacters, createCharactersFromSenders
+from converter.batch import countOutputsWritten
+from converter.profiling import ProfileOptions
+from gui.filepreview import showFilePreview, showHtmlPreview
+from gui.resultsmodel import ResultsTableModel
+from gui.workers import BatchConversionWorker, DocumentPreviewWorker
 from gui.miniwidgets import *
 from gui.styles import getAppStyleSheet, getCharacterButtonStyle, URGENCY_COLORS
 
@@ -32,6 +37,15 @@ class ListCharactersPanel(QWidget):
         # Create a button to add a new character       
         addButton = ClickyButton('Add Character', self, 'content-action-button')
         addButton.clicked.connect(mainWindow.addEditCharacter)
+
+        # Create buttons to import/ export the whole character list
+        importButton = ClickyButton('Import Characters', self, 'content-action-button')
+        importButton.clicked.connect(self.importCharacters)
+        exportButton = ClickyButton('Export Characters', self, 'content-action-button')
+        exportButton.clicked.connect(self.exportCharacters)
+
+        # Store the parent application window for later
+        self.mainWindow = mainWindow
         
         # Do layout for the panel
         layout = QGridLayout()
@@ -57,6 +71,43 @@ class ListCharactersPanel(QWidget):
                        floor(index/5)+1, 
                        4)
         layout.addWidget(addButton, floor(index/5)+2, 1, 1, 3)
+        layout.addWidget(importButton, floor(index/5)+3, 1)
+        layout.addWidget(exportButton, floor(index/5)+3, 3)
+
+    # Method to import characters from a CSV/ JSON file
+    def importCharacters(self):
+        filename = QFileDialog.getOpenFileName(self,
+                                               'Import characters',
+                                               os.path.expanduser('~/Documents'),
+                                               'Character files (*.csv *.json)')[0]
+        if not filename:
+            return
+
+        count, errors = importCharacters(filename)
+
+        if errors:
+            # Nothing was imported - show every problem at once
+            QMessageBox.warning(self,
+                                'Import failed',
+                                'No characters were imported, because the '
+                                'following rows are invalid:\n\n' +
+                                '\n'.join(errors))
+            self.mainWindow.sendMessage('ERROR: Character import failed', URGENCY_WARN)
+        else:
+            self.mainWindow.sendMessage(str(count) + ' characters imported successfully', URGENCY_ALERT)
+            self.mainWindow.listCharacters(False)
+
+    # Method to export all characters to a CSV/ JSON file
+    def exportCharacters(self):
+        filename = QFileDialog.getSaveFileName(self,
+                                               'Export characters',
+                                               os.path.expanduser('~/Documents/characters.csv'),
+                                               'CSV files (*.csv);;JSON files (*.json)')[0]
+        if not filename:
+            return
+
+        count = exportCharacters(filename)
+        self.mainWindow.sendMessage(str(count) + ' characters exported successfully', URGENCY_ALERT)
 
 # Class representing the Add/ Edit Character sub-panel
 class AddEditCharacterPanel(QWidget):
@@ -71,9 +122,12 @@ class AddEditCharacterPanel(QWidget):
         # Store the parent application window for later
         self.mainWindow = mainWindow      
                       
-        # Create input boxes for the character's name and bubble color
+        # Create input boxes for the character's name, bubble color and
+        # aliases (other names they use in messages, comma separated)
         self.nameEntryBox = QLineEdit()       
         self.colorEntryBox = ColorPickerEntry(self)
+        self.aliasesEntryBox = QLineEdit()
+        self.aliasesEntryBox.setPlaceholderText('Other names (comma separated)')
         
         # Create save button
         saveButton = ClickyButton('Save', self, 'content-action-button')
@@ -88,6 +142,7 @@ class AddEditCharacterPanel(QWidget):
         if character:
             self.nameEntryBox.setText(character.getDisplayName())
             self.colorEntryBox.setText(character.color)
+            self.aliasesEntryBox.setText(', '.join(character.aliases))
         
         # Set up the widget layout
         vBoxWidget = QWidget()
@@ -99,6 +154,7 @@ class AddEditCharacterPanel(QWidget):
         vBoxLayout.addStretch(1)
         vBoxLayout.addWidget(self.nameEntryBox)
         vBoxLayout.addWidget(self.colorEntryBox)
+        vBoxLayout.addWidget(self.aliasesEntryBox)
         vBoxLayout.addWidget(saveButton)
         
         # Only show the delete button if we're editing an existing character
@@ -118,7 +174,8 @@ class AddEditCharacterPanel(QWidget):
     def saveCharacter(self):
         # Try to add the character
         success = getConfigManager().addCharacter(self.nameEntryBox.text(),
-                                             self.colorEntryBox.text())
+                                             self.colorEntryBox.text(),
+                                             self.aliasesEntryBox.text().split(','))
         
         if success:
             # Show success message and return to character list
@@ -159,11 +216,20 @@ class FilePreviewPanel(QWidget):
                                         'content-action-button')
                                         
         selectFileButton.clicked.connect(self.getFileAndPreview)
+
+        # Create a button to preview a document directly, without processing
+        # it to an output file first
+        previewDocumentButton = ClickyButton('Preview document',
+                                             self,
+                                             'content-action-button')
+
+        previewDocumentButton.clicked.connect(self.getDocumentAndPreview)
         
         # Setup the layout of the panel
         vBoxLayout = QVBoxLayout()
         vBoxLayout.addStretch(1)
         vBoxLayout.addWidget(selectFileButton)
+        vBoxLayout.addWidget(previewDocumentButton)
         vBoxLayout.addStretch(2)
         self.setLayout(vBoxLayout)
 
@@ -176,7 +242,17 @@ class FilePreviewPanel(QWidget):
                                                'HTML files (*.html)')[0]
         
         if filename and os.path.isfile(filename):
-            filePreviewWindow = FilePreviewWindow(filename, self.mainWindow)
+            showFilePreview(filename, self.mainWindow)
+
+    # Method to select a document and preview it (converted in the background)
+    def getDocumentAndPreview(self):
+        filename = QFileDialog.getOpenFileName(self,
+                                               'Open file',
+                                               os.path.expanduser('~/Documents'),
+                                               DOCUMENT_FILE_FILTER)[0]
+
+        if filename and os.path.isfile(filename):
+            self.mainWindow.previewDocument(filename)
 
 # Class representing the Process Files sub-panel
 class FileProcessPanel(QWidget):
@@ -210,70 +286,109 @@ class FileProcessPanel(QWidget):
         inputList = QFileDialog.getOpenFileNames(self, 
                                                  'Open file',
                                                  os.path.expanduser('~/Documents'),
-                                                 'Documents (*.docx)')[0]
+                                                 DOCUMENT_FILE_FILTER)[0]
         
         # If ths list is empty, we're done here
         if not inputList:
             return
-        
-        resultMessages = []
-        
-        for filename in inputList:
-            if (os.path.isfile(filename)):
-                # Process the file
-                result = processFile(filename)
-                outfile = result[0]
-                characters = result[1]
-                
-                # Assume success (ew, but currently failures crash the app, so...)
-                # Build a label to report the (presumed) success. Include a 
-                # hyperlink to preview the results.
-                miniMessageLabel = QLabel(self)
-                message = 'File processed successfully: ' + \
-                          os.path.basename(filename) + \
-                          ' (<a href="' + outfile + '">Preview</a>)'
-                miniMessageLabel.setText(message)
-                miniMessageLabel.linkActivated.connect(self.mainWindow.handlePreviewClick)
-                resultMessages.append(miniMessageLabel)
-                
-                # Warn the user if there are any unknown characters
-                if (characters):
-                    knownCharacters = []
-                    unknownCharacters = []
-                    for character in characters:
-                        if getConfigManager().getCharacter(character):
-                            knownCharacters.append(character)
-                        else:
-                            unknownCharacters.append(character)
-                    
-                    if unknownCharacters:
-                        # Build a message label - indent it so that it's 
-                        # obvious which file it pertains to.
-                        charactersLabel = QLabel(self)
-                        charactersLabel.setWordWrap(True)
-                        message = 'File contained unknown characters: ' + \
-                                  ', '.join(unknownCharacters)
-                        charactersLabel.setText(message)
-                        charactersLabel.setProperty('class', 'indent')
-                        resultMessages.append(charactersLabel)
-        
-        # Display the results
-        self.mainWindow.displayResults(True, resultMessages)  
-
-# Class representing the results sub-panel after a Process Files operation
+
+        # Process the files in the background, showing results as they come in
+        self.mainWindow.processFileList(inputList)
+
+# Class representing the results sub-panel after a Process Files operation. It
+# shows a sortable, filterable table of the results, which is added to as
+# each file is processed.
 class DisplayResultsPanel(QWidget):
-    def __init__(self, mainWindow, resultMessages):
+    # Constructor
+    # Parameters:
+    #     mainWindow:    The parent application window
+    #     resultsModel:  The ResultsTableModel holding the results
+    def __init__(self, mainWindow, resultsModel):
         # Call superconstructor to initialise the widget
         super().__init__()
-        
+
+        # Store the parent application window and results for later
+        self.mainWindow = mainWindow
+        self.resultsModel = resultsModel
+
+        # Sort and filter the results through a proxy model. Sorting uses the
+        # raw values (Qt.UserRole), so numbers sort as numbers.
+        self.proxyModel = QSortFilterProxyModel(self)
+        self.proxyModel.setSourceModel(resultsModel)
+        self.proxyModel.setSortRole(Qt.UserRole)
+        self.proxyModel.setFilterKeyColumn(-1)
+        self.proxyModel.setFilterCaseSensitivity(Qt.CaseInsensitive)
+
+        # Create a box to filter the results
+        filterEntryBox = QLineEdit()
+        filterEntryBox.setPlaceholderText('Filter results')
+        filterEntryBox.textChanged.connect(self.proxyModel.setFilterFixedString)
+
+        # Create the results table - clicking a row previews its output
+        tableView = QTableView()
+        tableView.setModel(self.proxyModel)
+        tableView.setSortingEnabled(True)
+        tableView.setSelectionBehavior(QAbstractItemView.SelectRows)
+        tableView.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        tableView.verticalHeader().hide()
+        tableView.horizontalHeader().setStretchLastSection(True)
+        tableView.clicked.connect(self.previewResult)
+
+        # Show how far through the batch we are, with a button to stop it
+        self.progressBar = QProgressBar(self)
+        self.cancelButton = ClickyButton('Cancel', self, 'content-action-button')
+        self.cancelButton.clicked.connect(self.mainWindow.cancelBatch)
+
+        progressLayout = QHBoxLayout()
+        progressLayout.addWidget(self.progressBar)
+        progressLayout.addWidget(self.cancelButton)
+
+        # Create a label for the work skin details (filled in when the batch
+        # is finished)
+        self.skinLabel = QLabel(self)
+
+        # Offer to set up any unknown characters in one go
+        self.createButton = ClickyButton('Create unknown characters',
+                                         self,
+                                         'content-action-button')
+        self.createButton.clicked.connect(self.createUnknownCharacters)
+        self.createButton.hide()
+
         # Setup the layout of the panel
         vBoxLayout = QVBoxLayout()
+        vBoxLayout.addLayout(progressLayout)
+        vBoxLayout.addWidget(filterEntryBox)
+        vBoxLayout.addWidget(tableView)
+        vBoxLayout.addWidget(self.skinLabel)
+        vBoxLayout.addWidget(self.createButton)
         self.setLayout(vBoxLayout)
-    
-        # Add the results to the layout
-        for resultMessage in resultMessages:
-            self.layout().addWidget(resultMessage)
-        self.layout().addStretch(1)           
+
+    # Method to update the panel once the batch is finished
+    # Parameters:
+    #     skinPath:  The path of the work skin for the batch
+    #     fullSize:  The size of the full stylesheet (bytes)
+    #     skinSize:  The size of the work skin (bytes)
+    def showBatchFinished(self, skinPath, fullSize, skinSize):
+        self.progressBar.hide()
+        self.cancelButton.hide()
+        self.skinLabel.setText('Work skin for these files written to ' + skinPath +
+                               ' (' + str(skinSize) + ' bytes, down from ' +
+                               str(fullSize) + ' bytes)')
+        self.createButton.setVisible(bool(self.resultsModel.getUnknownCharacters()))
+
+    # Method to preview the output for a clicked row
+    # Parameters:
+    #     index:  The (proxy model) index that was clicked
+    def previewResult(self, index):
+        result = self.resultsModel.getResult(self.proxyModel.mapToSource(index).row())
+        if result.succeeded():
+            showFilePreview(result.outfilePath, self.mainWindow)
+
+    # Method to create all of the unknown characters, with automatic colors
+    def createUnknownCharacters(self):
+        characters = createCharactersFromSenders(self.resultsModel.getUnknownCharacters())
+        self.mainWindow.sendMessage(str(len(characters)) + ' characters created - edit them to change their colors', URGENCY_ALERT)
+        self.mainWindow.listCharacters(False)
 
 # Class representing the main window of the app
 class AppMainWindow(QMainWindow):
@@ -311,10 +426,6 @@ class AppMainWindow(QMainWindow):
         exitButton = ClickyButton('EXIT', sideBar, 'exit-button')
         exitButton.clicked.connect(sys.exit)
         
-        # Content panel items
-        contentPanel = QWidget()
-        contentPanel.setProperty('class', 'content-panel')
-                
         # Layout for the top bar
         messageBarLayout = QHBoxLayout()
         messageBarLayout.addWidget(self.messageBarLabel)
@@ -329,8 +440,24 @@ class AppMainWindow(QMainWindow):
         sideBarLayout.addWidget(exitButton)
         sideBar.setLayout(sideBarLayout)
         
-        # Content panel (blank for now, but used later)
-        self.contentPanel = QWidget()
+        # Content panels are kept in a stack, which shows the content panel
+        # background until the first panel is shown. Panels showing data (e.g.
+        # the character list) are cached there, and only rebuilt when their
+        # data changes, so switching between panels doesn't rebuild them every
+        # time.
+        self.contentStack = QStackedWidget()
+        self.contentStack.setProperty('class', 'content-panel')
+        self.contentPanel = None
+        self.cachedPanels = {}
+
+        # Background workers for the current batch and document preview
+        self.batchWorker = None
+        self.previewWorker = None
+
+        # Hidden toggle (Ctrl+Shift+P) to profile batches, for diagnosing
+        # documents that are slow to convert
+        self.profileOptions = ProfileOptions()
+        QShortcut(QKeySequence('Ctrl+Shift+P'), self, self.toggleProfiling)
                 
         # Layout for the whole window
         self.mainLayout = QGridLayout()
@@ -341,7 +468,7 @@ class AppMainWindow(QMainWindow):
         
         self.mainLayout.addWidget(topBar, 0, 0, 1, 2)
         self.mainLayout.addWidget(sideBar, 1, 0)
-        self.mainLayout.addWidget(contentPanel, 1, 1)
+        self.mainLayout.addWidget(self.contentStack, 1, 1)
         
         mainPanel = QWidget()
         mainPanel.setLayout(self.mainLayout)
@@ -373,36 +500,180 @@ class AppMainWindow(QMainWindow):
     def clearMessage(self):
         self.sendMessage('', 0)
 
-    # Method to replace the content panel with a new widget
+    # Method to replace the content panel with a new widget. The panel it
+    # replaces is deleted, unless it's cached.
+    # Parameters:
+    #     widget:  The new panel
     def setContentPanel(self, widget):
-        if self.contentPanel:
-            self.mainLayout.removeWidget(self.contentPanel)
-            self.contentPanel.deleteLater()
+        widget.setProperty('class', 'content-panel')
+        self.contentStack.addWidget(widget)
+        self.showContentPanel(widget)
+
+    # Method to show a panel which is already in the content stack
+    # Parameters:
+    #     widget:  The panel
+    def showContentPanel(self, widget):
+        previousPanel = self.contentPanel
+        self.contentStack.setCurrentWidget(widget)
         self.contentPanel = widget
-        self.mainLayout.addWidget(widget, 1, 1)
-        self.contentPanel.setProperty('class', 'content-panel')
+
+        if previousPanel is not None and previousPanel is not widget and \
+                not self.isCachedPanel(previousPanel):
+            self.removeContentPanel(previousPanel)
+
+    # Method to remove a panel from the content stack and delete it
+    # Parameters:
+    #     widget:  The panel
+    def removeContentPanel(self, widget):
+        self.contentStack.removeWidget(widget)
+        widget.deleteLater()
+        if self.contentPanel is widget:
+            self.contentPanel = None
+
+    # Method to check whether a panel is cached
+    # Parameters:
+    #     widget:  The panel
+    # Returns: boolean
+    def isCachedPanel(self, widget):
+        return any(panel is widget for panel, version in self.cachedPanels.values())
+
+    # Method to show a cached panel, building it first if it hasn't been built
+    # yet or the data it shows has changed since it was built
+    # Parameters:
+    #     name:         The name the panel is cached under
+    #     version:      The version of the data the panel shows (e.g. the
+    #                   roster version)
+    #     createPanel:  Function called to build the panel
+    def showCachedPanel(self, name, version, createPanel):
+        panel, panelVersion = self.cachedPanels.get(name, (None, None))
+
+        if panel is None or panelVersion != version:
+            newPanel = createPanel()
+            newPanel.setProperty('class', 'content-panel')
+            self.contentStack.addWidget(newPanel)
+            self.cachedPanels[name] = (newPanel, version)
+            if panel is not None:
+                self.removeContentPanel(panel)
+            panel = newPanel
+
+        self.showContentPanel(panel)
 
     # Method used by action button: display process files panel
     def processFiles(self):
         self.clearMessage()
-        self.setContentPanel(FileProcessPanel(self))
-    
-    # Method to display results of a process files operation
-    def displayResults(self, success, resultMessages):
-        if success:
-            self.sendMessage('Files processed successfully', URGENCY_ALERT)
-        
-        self.setContentPanel(DisplayResultsPanel(self, resultMessages))
-    
-    # Method to handle a click on one of the 'preview' links in the results
-    def handlePreviewClick(self, link):
-        FilePreviewWindow(link, self)
+        self.showCachedPanel('processFiles', None, partial(FileProcessPanel, self))
     
+    # Method to process a list of files in the background, displaying the
+    # results panel straight away and adding each result to it as it comes in
+    # Parameters:
+    #     inputList:  The paths of the files to process
+    def processFileList(self, inputList):
+        self.sendMessage('Processing ' + str(len(inputList)) + ' files...', URGENCY_MESSAGE)
+
+        # The results panel is cached until the next batch, so it stays up to
+        # date even if another panel is shown in the meantime
+        self.resultsModel = ResultsTableModel(self)
+        self.showCachedPanel('results',
+                             self.resultsModel,
+                             partial(DisplayResultsPanel, self, self.resultsModel))
+        self.resultsPanel = self.contentPanel
+
+        # Stop any batch that's still running - its results would be mixed up
+        # with this one's
+        if self.batchWorker is not None:
+            self.batchWorker.fileConverted.disconnect()
+            self.batchWorker.progressed.disconnect()
+            self.batchWorker.finished.disconnect()
+            self.batchWorker.cancel()
+
+        # The worker is owned by the main window (rather than a panel), as the
+        # panel could be replaced before the batch finishes
+        self.batchWorker = BatchConversionWorker(inputList,
+                                                 getConfigManager().snapshot(),
+                                                 self,
+                                                 self.profileOptions)
+        self.batchWorker.fileConverted.connect(self.resultsModel.appendResult)
+        self.batchWorker.progressed.connect(self.resultsPanel.progressBar.setValue)
+        self.batchWorker.finished.connect(self.handleBatchFinished)
+        self.batchWorker.start()
+
+    # Method used by the hidden profiling shortcut: switch profiling of
+    # batches (time and memory) on or off
+    def toggleProfiling(self):
+        enabled = not self.profileOptions.isEnabled()
+        self.profileOptions = ProfileOptions(enabled, enabled)
+        if enabled:
+            self.sendMessage('Profiling on - reports will be written next to each output file', URGENCY_WARN)
+        else:
+            self.sendMessage('Profiling off', URGENCY_MESSAGE)
+
+    # Method used by the results panel's Cancel button: stop the batch after
+    # the block being converted
+    def cancelBatch(self):
+        if self.batchWorker is not None:
+            self.batchWorker.cancel()
+            self.sendMessage('Cancelling...', URGENCY_MESSAGE)
+
+    # Method to finish off a batch once all the files have been processed
+    def handleBatchFinished(self):
+        cancelled = self.batchWorker.cancelToken.isCancelled()
+        self.batchWorker = None
+
+        # Write a size-optimized work skin for just the characters used in
+        # these files
+        skinPath, fullSize, skinSize = generateWorkSkin(self.resultsModel.getSenders())
+
+        failures = [result for result in self.resultsModel.results
+                    if not result.succeeded()]
+        if cancelled:
+            self.sendMessage('Processing cancelled - ' + str(len(self.resultsModel.results) - len(failures)) + ' files processed', URGENCY_WARN)
+        elif failures:
+            self.sendMessage(str(len(failures)) + ' files failed to process', URGENCY_WARN)
+        else:
+            written, skipped = countOutputsWritten(self.resultsModel.results)
+            self.sendMessage('Files processed successfully (' + str(written) + ' written, ' + str(skipped) + ' unchanged)', URGENCY_ALERT)
+
+        self.resultsPanel.showBatchFinished(skinPath, fullSize, skinSize)
+
+    # Method to convert a document in the background and preview the result,
+    # without writing an output file
+    # Parameters:
+    #     filename:  The path of the document
+    def previewDocument(self, filename):
+        self.sendMessage('Converting ' + os.path.basename(filename) + ' for preview...', URGENCY_MESSAGE)
+
+        # Only the latest preview is wanted, so stop any earlier conversion
+        if self.previewWorker is not None:
+            self.previewWorker.converted.disconnect()
+            self.previewWorker.failed.disconnect()
+            self.previewWorker.cancel()
+
+        # The worker is owned by the main window (rather than a panel), as the
+        # panel could be replaced before the conversion finishes
+        self.previewWorker = DocumentPreviewWorker(filename,
+                                                   getConfigManager().snapshot(),
+                                                   self)
+        self.previewWorker.converted.connect(self.handleDocumentConverted)
+        self.previewWorker.failed.connect(self.handleDocumentFailed)
+        self.previewWorker.start()
+
+    # Method to show a document preview once its conversion has finished
+    # Parameters:
+    #     html:  The output HTML
+    def handleDocumentConverted(self, html):
+        self.clearMessage()
+        showHtmlPreview(html, self)
+
+    # Method to report a failed document preview
+    # Parameters:
+    #     error:  The error message
+    def handleDocumentFailed(self, error):
+        self.sendMessage('ERROR: Could not convert document - ' + error, URGENCY_WARN)
+
     # Method used by action button: display preview output panel
     def previewOutput(self):
         self.clearMessage()     
-        contentPanel = FilePreviewPanel(self)
-        self.setContentPanel(contentPanel)
+        self.showCachedPanel('previewOutput', None, partial(FilePreviewPanel, self))
     
     # Method used by action button: display add/ edit character panel
     def addEditCharacter(self, character=None):
@@ -417,5 +688,6 @@ class AppMainWindow(QMainWindow):
     def listCharacters(self, clearMessage=True):
         if clearMessage:
             self.clearMessage()
-        contentPanel = ListCharactersPanel(self)
-        self.setContentPanel(contentPanel)   
+        self.showCachedPanel('listCharacters',
+                             getConfigManager().getVersion(),
+                             partial(ListCharactersPanel, self))   
@@ -1,47 +1,241 @@
+import io
+import locale
+import os
+from PySide2.QtCore import QByteArray, QBuffer, QIODevice, QUrl, QUrlQuery
 from PySide2.QtWidgets import QMainWindow
-from PySide2.QtWebEngineWidgets import QWebEngineView
+from PySide2.QtWebEngineCore import QWebEngineUrlScheme, QWebEngineUrlSchemeHandler
+from PySide2.QtWebEngineWidgets import QWebEngineProfile, QWebEngineView
 
-# Class representing the pop-up window used to preview output files
 from common.definitions import PREVIEW_CSS_CLASSES
 from config.manager import generateCss
+from gui.previewpages import buildPreviewIndex, buildPreviewPage, getFileIndex, readChunk
 
+# URL scheme used to load previews into the web view, e.g.
+#     textfic://preview/document?path=/path/to/output.html
+#     textfic://preview/chunk?path=/path/to/output.html&chunk=3
+#     textfic://preview/live?id=1
+#     textfic://preview/livechunk?id=1&chunk=3
+#     textfic://preview/style.css
+# Documents are served as a page containing the first few blocks, which then
+# loads the remaining blocks (chunks) as the user scrolls.
+PREVIEW_SCHEME = b'textfic'
+PREVIEW_HOST = 'preview'
+
+# The single, reused preview window (created on first use)
+previewWindow = None
+
+# Function to register the preview URL scheme. This must be called before the
+# QApplication is created.
+def registerPreviewScheme():
+    scheme = QWebEngineUrlScheme(PREVIEW_SCHEME)
+    scheme.setSyntax(QWebEngineUrlScheme.Syntax.Host)
+    scheme.setFlags(QWebEngineUrlScheme.SecureScheme |
+                    QWebEngineUrlScheme.LocalScheme |
+                    QWebEngineUrlScheme.CorsEnabled)
+    QWebEngineUrlScheme.registerScheme(scheme)
+
+# Function to get the preview URL for a path on the preview host
+# Parameters:
+#     path:   The path (e.g. '/style.css')
+#     query:  dict of query parameters (optional)
+# Returns: QUrl
+def getPreviewUrl(path, query=None):
+    url = QUrl()
+    url.setScheme(PREVIEW_SCHEME.decode())
+    url.setHost(PREVIEW_HOST)
+    url.setPath(path)
+    if query:
+        urlQuery = QUrlQuery()
+        for key, value in query.items():
+            urlQuery.addQueryItem(key, value)
+        url.setQuery(urlQuery)
+    return url
+
+# Class which answers the web view's requests for preview URLs
+class PreviewSchemeHandler(QWebEngineUrlSchemeHandler):
+    # Constructor
+    # Parameters:
+    #     parent:  The parent object
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        # Devices being read by in-progress requests. They aren't parented to
+        # their jobs, so are kept here (to stop Python garbage collecting them
+        # while Qt is still using them) until the job is destroyed.
+        self.devices = set()
+
+        # The stylesheet, as served - rebuilt only when the CSS changes
+        self.css = None
+        self.cssBytes = None
+
+        # The latest document converted in memory for a live preview, and its
+        # block index
+        self.liveDocumentId = 0
+        self.liveDocument = None
+        self.liveIndex = None
+
+    # Method to handle a request
+    # Parameters:
+    #     job:  The QWebEngineUrlRequestJob for the request
+    def requestStarted(self, job):
+        url = job.requestUrl()
+        path = url.path()
+        query = QUrlQuery(url)
+
+        if path == '/style.css':
+            self.replyWithBytes(job, b'text/css', self.getStylesheet())
+            return
+
+        # Find the document being asked for - a file, or the live document
+        if path in ('/document', '/chunk'):
+            source = query.queryItemValue('path', QUrl.FullyDecoded)
+            if not os.path.isfile(source):
+                job.fail(job.UrlNotFound)
+                return
+            index = getFileIndex(source, locale.getpreferredencoding(False))
+            chunkUrl = getPreviewUrl('/chunk', {'path': source})
+        elif path in ('/live', '/livechunk') and \
+                self.liveDocument is not None and \
+                query.queryItemValue('id') == str(self.liveDocumentId):
+            source = self.liveDocument
+            index = self.liveIndex
+            chunkUrl = getPreviewUrl('/livechunk', {'id': query.queryItemValue('id')})
+        else:
+            job.fail(job.UrlNotFound)
+            return
+
+        if path in ('/document', '/live'):
+            page = buildPreviewPage(source,
+                                    index,
+                                    getPreviewUrl('/style.css').toString(),
+                                    chunkUrl.toString(QUrl.FullyEncoded) +
+                                    '&chunk=')
+            self.replyWithBytes(job, b'text/html', page)
+        else:
+            chunkNumber = query.queryItemValue('chunk')
+            if not chunkNumber.isdigit() or \
+                    int(chunkNumber) >= len(index.chunks):
+                job.fail(job.UrlNotFound)
+                return
+            self.replyWithBytes(job,
+                                b'text/html',
+                                readChunk(source, index, int(chunkNumber)))
+
+    # Method to set the document to serve for a live preview
+    # Parameters:
+    #     html:  The output HTML
+    # Returns: QUrl  The URL to load the document from
+    def setLiveDocument(self, html):
+        self.liveDocumentId += 1
+        self.liveDocument = html.encode('utf-8')
+        self.liveIndex = buildPreviewIndex(io.BytesIO(self.liveDocument),
+                                           'utf-8')
+        return getPreviewUrl('/live', {'id': str(self.liveDocumentId)})
+
+    # Method to get the stylesheet to serve (regenerating it only if the
+    # config has changed)
+    # Returns: bytes
+    def getStylesheet(self):
+        css = generateCss()
+        if css is not self.css:
+            self.css = css
+            self.cssBytes = (css + PREVIEW_CSS_CLASSES).encode('utf-8')
+        return self.cssBytes
+
+    # Method to reply to a request with some bytes held in memory
+    # Parameters:
+    #     job:          The request job
+    #     contentType:  The MIME type of the content
+    #     content:      The content (bytes)
+    def replyWithBytes(self, job, contentType, content):
+        device = QBuffer()
+        device.setData(QByteArray(content))
+        device.open(QIODevice.ReadOnly)
+        self.devices.add(device)
+        job.destroyed.connect(lambda *args: self.releaseDevice(device))
+        job.reply(contentType, device)
+
+    # Method to clean up a device once its request has finished
+    # Parameters:
+    #     device:  The device
+    def releaseDevice(self, device):
+        device.close()
+        device.deleteLater()
+        self.devices.discard(device)
+
+# Class representing the pop-up window used to preview output files. A single
+# window (and web view) is created and then reused for every preview.
 class FilePreviewWindow(QMainWindow):
     # Constructor
-    # Parameters: 
-    #     filename: The name (path) of the file to preview
+    # Parameters:
     #     parent: The parent application window (instance of AppMainWindow)
-    def __init__(self, filename, parent):
+    def __init__(self, parent):
         # Call superconstructor to initialise the widget
         super().__init__(parent)
 
-        # Regenerate the stylesheet to make sure it matches current config
-        generateCss()
-        
-        # Load the generated stylesheet and append the extra classes that the
-        # preview window will need
-        with open('output/style.css', 'r') as cssFile:
-            css = cssFile.read() + PREVIEW_CSS_CLASSES
-
-        # Load the HTML file that's being previewed
-        with open(filename, 'r') as htmlFile:
-            html = htmlFile.read()
-
-        # Add a <head> tag containing the CSS style to the HTML. We need to do
-        # this here because the output files don't reference the stylesheet
-        # (since it will be set as a work skin), and in any case the 
-        # QWebEngineView widget refuses to load an external stylesheet.
-        html = '<!DOCTYPE html><head><style>' + css + '</style></head>' + html
-
-        # Get the QWebEngineView widget and give it the HTML
-        webView = QWebEngineView()
-        webView.setHtml(html)
-        
-        # Put the QWebEngineView widget into the file preview window
-        self.setCentralWidget(webView)
-        
+        # Serve previews through our URL scheme, so that files are streamed
+        # from disk (QWebEngineView.setHtml can't handle more than 2MB)
+        self.schemeHandler = PreviewSchemeHandler(self)
+        QWebEngineProfile.defaultProfile().installUrlSchemeHandler(PREVIEW_SCHEME,
+                                                                   self.schemeHandler)
+
+        # Put a QWebEngineView widget into the file preview window
+        self.webView = QWebEngineView()
+        self.setCentralWidget(self.webView)
+
         # Name the window and put it in a nice position
         self.setWindowTitle('TextFic Wizard File Preview')
         self.setGeometry(parent.geometry().adjusted(150, 100, 150, 100))
-        
-        # Show the window
-        self.showMaximized()
\ No newline at end of file
+
+    # Method to preview a file
+    # Parameters:
+    #     filename: The name (path) of the file to preview
+    def previewFile(self, filename):
+        self.webView.load(getPreviewUrl('/document',
+                                        {'path': os.path.abspath(filename)}))
+
+        self.showPreview()
+
+    # Method to preview output HTML held in memory
+    # Parameters:
+    #     html:  The output HTML
+    def previewHtml(self, html):
+        self.webView.load(self.schemeHandler.setLiveDocument(html))
+        self.showPreview()
+
+    # Method to show the window
+    def showPreview(self):
+        self.showMaximized()
+        self.raise_()
+        self.activateWindow()
+
+# Function to get the (shared) preview window, creating it if necessary
+# Parameters:
+#     parent: The parent application window (instance of AppMainWindow)
+# Returns: FilePreviewWindow
+def getPreviewWindow(parent):
+    global previewWindow
+    if previewWindow is None:
+        previewWindow = FilePreviewWindow(parent)
+    return previewWindow
+
+# Function to preview a file in the (shared) preview window
+# Parameters:
+#     filename: The name (path) of the file to preview
+#     parent: The parent application window (instance of AppMainWindow)
+# Returns: FilePreviewWindow
+def showFilePreview(filename, parent):
+    window = getPreviewWindow(parent)
+    window.previewFile(filename)
+    return window
+
+# Function to preview output HTML held in memory in the (shared) preview
+# window
+# Parameters:
+#     html:    The output HTML
+#     parent:  The parent application window (instance of AppMainWindow)
+# Returns: FilePreviewWindow
+def showHtmlPreview(html, parent):
+    window = getPreviewWindow(parent)
+    window.previewHtml(html)
+    return window
@@ -0,0 +1,260 @@
+import html
+import json
+import os
+import re
+
+# Size of the first page of a preview - enough blocks to fill the first
+# screen are sent straight away, and the rest are loaded as the user scrolls
+FIRST_PAGE_BYTES = 64 * 1024
+
+# Number of blocks to load each time the user scrolls near the end of the
+# loaded content
+CHUNKS_PER_LOAD = 4
+
+# Markers used to find block boundaries and headers in the output HTML. The
+# output is prettified, so each top-level element starts and ends at the
+# start of a line.
+DELIMITER_BAR_MARKER = b'delimiter-bar'
+HEADER_MARKER = b'messages-header'
+HEADER_END_MARKER = b'</strong>'
+TAG_REGEX = re.compile(r'<[^>]+>')
+
+# Cache of the indexes of output files, keyed on path (and checked against
+# the file's modification time and size)
+fileIndexes = {}
+
+# Extra styles for the preview page's block navigator
+PREVIEW_NAVIGATOR_CSS = """
+#preview-navigator
+{
+    position: fixed;
+    top: 0;
+    right: 0;
+    max-height: 100%;
+    max-width: 16em;
+    overflow-y: auto;
+    background: #f6f6f6;
+    border-left: 1px solid #b2b2b2;
+    font-size: 0.8em;
+    padding: 0.5em;
+}
+
+#preview-navigator a
+{
+    display: block;
+    padding: 0.2em 0;
+    color: #22174F;
+    cursor: pointer;
+}
+"""
+
+# Script which lazy-loads the rest of the blocks as the user scrolls, and
+# handles jumping to a block from the navigator. CHUNK_URL, TOTAL_CHUNKS,
+# LOADED_CHUNKS and CHUNKS_PER_LOAD are replaced when the page is built.
+PREVIEW_SCRIPT = """
+(function () {
+    var chunkUrl = CHUNK_URL;
+    var total = TOTAL_CHUNKS;
+    var next = LOADED_CHUNKS;
+    var content = document.getElementById('preview-content');
+    var sentinel = document.getElementById('preview-sentinel');
+    var pending = Promise.resolve();
+
+    function loadChunk(index) {
+        return new Promise(function (resolve) {
+            var request = new XMLHttpRequest();
+            request.open('GET', chunkUrl + index);
+            request.overrideMimeType('text/html; charset=utf-8');
+            request.onloadend = function () {
+                content.insertAdjacentHTML('beforeend', request.responseText);
+                resolve();
+            };
+            request.send();
+        });
+    }
+
+    function loadUpTo(index) {
+        pending = pending.then(function loop() {
+            if (next > index || next >= total) {
+                return;
+            }
+            return loadChunk(next++).then(loop);
+        });
+        return pending;
+    }
+
+    function nearEnd() {
+        return sentinel.getBoundingClientRect().top < window.innerHeight * 2;
+    }
+
+    function fill() {
+        if (next < total && nearEnd()) {
+            loadUpTo(next + CHUNKS_PER_LOAD - 1).then(fill);
+        }
+    }
+
+    window.textficJumpTo = function (index) {
+        loadUpTo(index).then(function () {
+            document.getElementById('block-' + index).scrollIntoView();
+        });
+    };
+
+    window.addEventListener('scroll', fill);
+    window.addEventListener('resize', fill);
+    fill();
+})();
+"""
+
+# Class representing the index of an output document's blocks: the byte
+# range of each block (chunk) in the document, and its chat name (if any).
+# Chunks end at the end of each message block (i.e. after its delimiter bar),
+# and include any other content before the block; the last chunk holds
+# whatever follows the last message block.
+class PreviewIndex():
+    # Constructor
+    # Parameters:
+    #     chunks:    [] of (int, int, str)  The start and end offsets and the
+    #                chat name of each chunk
+    #     encoding:  The encoding of the document
+    def __init__(self, chunks, encoding):
+        self.chunks = chunks
+        self.encoding = encoding
+
+# Function to get the chat name from the lines of a block's header
+# Parameters:
+#     headerLines:  [] of bytes
+#     encoding:     The encoding of the document
+# Returns: str
+def getHeaderTitle(headerLines, encoding):
+    text = TAG_REGEX.sub(' ', b''.join(headerLines).decode(encoding, 'replace'))
+    text = ' '.join(html.unescape(text).split())
+    if text.startswith('Chat name:'):
+        text = text[len('Chat name:'):].strip()
+    return text
+
+# Function to build the block index of an output document, reading it one line
+# at a time (so only a line is in memory at once)
+# Parameters:
+#     lines:     Iterable of the document's lines (bytes, with line endings)
+#     encoding:  The encoding of the document
+# Returns: PreviewIndex
+def buildPreviewIndex(lines, encoding):
+    chunks = []
+    chunkStart = 0
+    offset = 0
+    title = ''
+    headerLines = None
+    inDelimitedElement = False
+
+    for line in lines:
+        offset += len(line)
+
+        # Collect the lines of the header, until the end of the chat name
+        if headerLines is not None:
+            headerLines.append(line)
+            if HEADER_END_MARKER in line:
+                title = getHeaderTitle(headerLines, encoding)
+                headerLines = None
+        elif HEADER_MARKER in line and not title:
+            headerLines = []
+
+        if DELIMITER_BAR_MARKER in line:
+            inDelimitedElement = True
+
+        # The end of a top-level element which contains a delimiter bar is the
+        # end of a message block, so end the chunk there
+        if inDelimitedElement and line.startswith(b'</'):
+            chunks.append((chunkStart, offset, title))
+            chunkStart = offset
+            title = ''
+            inDelimitedElement = False
+
+    if offset > chunkStart:
+        chunks.append((chunkStart, offset, title))
+
+    return PreviewIndex(chunks, encoding)
+
+# Function to get the (cached) block index of an output file
+# Parameters:
+#     filename:  The path of the file
+#     encoding:  The encoding of the file
+# Returns: PreviewIndex
+def getFileIndex(filename, encoding):
+    stat = os.stat(filename)
+    fileDetails = (stat.st_mtime_ns, stat.st_size, encoding)
+
+    cached = fileIndexes.get(filename)
+    if cached and cached[0] == fileDetails:
+        return cached[1]
+
+    with open(filename, 'rb') as htmlFile:
+        index = buildPreviewIndex(htmlFile, encoding)
+
+    fileIndexes[filename] = (fileDetails, index)
+    return index
+
+# Function to read a chunk of a document, wrapped in an element that the
+# navigator can jump to
+# Parameters:
+#     source:       The path of the document file, or its content (bytes)
+#     index:        The document's PreviewIndex
+#     chunkNumber:  The number of the chunk to read
+# Returns: bytes  The chunk, encoded as UTF-8
+def readChunk(source, index, chunkNumber):
+    start, end, title = index.chunks[chunkNumber]
+
+    if isinstance(source, bytes):
+        content = source[start:end]
+    else:
+        with open(source, 'rb') as htmlFile:
+            htmlFile.seek(start)
+            content = htmlFile.read(end - start)
+
+    return ('<div id="block-' + str(chunkNumber) + '">' +
+            content.decode(index.encoding, 'replace') +
+            '</div>').encode('utf-8')
+
+# Function to build the preview page for a document: the stylesheet link, a
+# navigator listing every block, the first page of blocks, and the script
+# which loads the rest
+# Parameters:
+#     source:         The path of the document file, or its content (bytes)
+#     index:          The document's PreviewIndex
+#     stylesheetUrl:  The URL of the stylesheet
+#     chunkUrl:       The URL to load chunks from (the chunk number is
+#                     appended to it)
+# Returns: bytes  The page, encoded as UTF-8
+def buildPreviewPage(source, index, stylesheetUrl, chunkUrl):
+    # Send enough blocks to fill the first screen (always at least one)
+    firstChunks = []
+    firstPageSize = 0
+    for chunkNumber, (start, end, title) in enumerate(index.chunks):
+        if firstChunks and firstPageSize >= FIRST_PAGE_BYTES:
+            break
+        firstChunks.append(readChunk(source, index, chunkNumber))
+        firstPageSize += end - start
+
+    navigatorLinks = ['<a onclick="textficJumpTo(' + str(chunkNumber) + ')">' +
+                      html.escape(title) + '</a>'
+                      for chunkNumber, (start, end, title)
+                      in enumerate(index.chunks) if title]
+
+    script = PREVIEW_SCRIPT
+    script = script.replace('CHUNK_URL',
+                            json.dumps(chunkUrl).replace('</', '<\\/'))
+    script = script.replace('TOTAL_CHUNKS', str(len(index.chunks)))
+    script = script.replace('LOADED_CHUNKS', str(len(firstChunks)))
+    script = script.replace('CHUNKS_PER_LOAD', str(CHUNKS_PER_LOAD))
+
+    page = ['<!DOCTYPE html><html><head><meta charset="utf-8">'
+            '<link rel="stylesheet" href="' + stylesheetUrl + '">'
+            '<style>' + PREVIEW_NAVIGATOR_CSS + '</style></head><body>']
+    if navigatorLinks:
+        page.append('<nav id="preview-navigator">' + ''.join(navigatorLinks) +
+                    '</nav>')
+    page.append('<div id="preview-content">')
+
+    return (''.join(page).encode('utf-8') +
+            b''.join(firstChunks) +
+            ('</div><div id="preview-sentinel"></div><script>' + script +
+             '</script></body></html>').encode('utf-8'))
@@ -0,0 +1,92 @@
+import os
+from PySide2.QtCore import QAbstractTableModel, QModelIndex, Qt
+
+# Columns shown in the results table
+RESULT_COLUMNS = ['File', 'Status', 'Time (s)', 'Read wait (s)', 'Output size', 'Unknown characters']
+
+# Class representing a table of the results of a batch of conversions. Rows
+# are appended as results come in.
+class ResultsTableModel(QAbstractTableModel):
+    # Constructor
+    # Parameters:
+    #     parent:  The parent object
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.results = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.results)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(RESULT_COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return RESULT_COLUMNS[section]
+        return None
+
+    # Method to get the data for a cell. Qt.UserRole gives the raw value, which
+    # is used for sorting (so that e.g. sizes sort numerically).
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        result = self.results[index.row()]
+        column = index.column()
+
+        if role == Qt.UserRole:
+            return [os.path.basename(result.filename),
+                    result.status,
+                    result.seconds,
+                    result.stallSeconds,
+                    result.outputSize,
+                    len(result.unknownCharacters)][column]
+
+        if role == Qt.DisplayRole:
+            return [os.path.basename(result.filename),
+                    result.status,
+                    '%.2f' % result.seconds,
+                    '%.2f' % result.stallSeconds,
+                    str(result.outputSize),
+                    ', '.join(result.unknownCharacters)][column]
+
+        if role == Qt.ToolTipRole:
+            if column == 1 and result.error:
+                return result.error
+            return result.filename
+
+        return None
+
+    # Method to add a result to the end of the table
+    # Parameters:
+    #     result:  The ConversionResult
+    def appendResult(self, result):
+        row = len(self.results)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.results.append(result)
+        self.endInsertRows()
+
+    # Method to get the result shown in a row
+    # Parameters:
+    #     row:  The row number
+    # Returns: ConversionResult
+    def getResult(self, row):
+        return self.results[row]
+
+    # Method to get the names of every unknown character in the results
+    # Returns: [] of str
+    def getUnknownCharacters(self):
+        unknownCharacters = []
+        for result in self.results:
+            for name in result.unknownCharacters:
+                if name not in unknownCharacters:
+                    unknownCharacters.append(name)
+        return unknownCharacters
+
+    # Method to get the names of every sender in the results
+    # Returns: set(str)
+    def getSenders(self):
+        senders = set()
+        for result in self.results:
+            senders.update(result.characters)
+        return senders
@@ -0,0 +1,94 @@
+from PySide2.QtCore import QThread, Signal
+
+from converter.batch import convertFiles
+from converter.ficfileconverter import convertDocument
+from converter.progress import CancellationToken, ConversionCancelled
+
+# Class representing a background thread which converts a document for
+# previewing, without writing any output files
+class DocumentPreviewWorker(QThread):
+    # Signals emitted when the conversion is done: the output HTML, or an
+    # error message if the conversion failed
+    converted = Signal(str)
+    failed = Signal(str)
+
+    # Constructor
+    # Parameters:
+    #     filename:  The path of the document to convert
+    #     roster:    The CharacterRoster snapshot to convert with
+    #     parent:    The parent object
+    def __init__(self, filename, roster, parent=None):
+        super().__init__(parent)
+        self.filename = filename
+        self.roster = roster
+        self.cancelToken = CancellationToken()
+
+    # Method to stop the conversion (nothing is emitted once it has stopped)
+    def cancel(self):
+        self.cancelToken.cancel()
+
+    # Method run on the background thread
+    def run(self):
+        try:
+            html = convertDocument(self.filename,
+                                   self.roster,
+                                   cancelToken=self.cancelToken)[0]
+        except ConversionCancelled:
+            return
+        except Exception as error:
+            self.failed.emit(str(error))
+            return
+
+        self.converted.emit(html)
+
+# Class representing a background thread which converts a batch of files,
+# reporting each result as soon as it's ready
+class BatchConversionWorker(QThread):
+    # Signal emitted with the ConversionResult for each file
+    fileConverted = Signal(object)
+
+    # Signal emitted with the percentage of the batch done, whenever it
+    # changes
+    progressed = Signal(int)
+
+    # Constructor
+    # Parameters:
+    #     filenames:  The paths of the files to convert
+    #     roster:     The CharacterRoster snapshot to convert with
+    #     parent:     The parent object
+    #     profile:    ProfileOptions to profile each file's conversion with
+    #                 (optional)
+    def __init__(self, filenames, roster, parent=None, profile=None):
+        super().__init__(parent)
+        self.filenames = filenames
+        self.roster = roster
+        self.profile = profile
+        self.cancelToken = CancellationToken()
+        self.percentDone = 0
+
+    # Method to stop the batch after the current block
+    def cancel(self):
+        self.cancelToken.cancel()
+
+    # Method to report the progress of a file in the batch. Called for every
+    # block, so the signal is only emitted when the percentage changes.
+    # Parameters:
+    #     fileNumber:   The number of the file in the batch
+    #     fileCount:    The number of files in the batch
+    #     blocksDone:   The number of blocks of the file converted so far
+    #     blocksTotal:  The number of blocks in the file
+    #     bytesRead:    The number of bytes of the file read so far
+    def reportProgress(self, fileNumber, fileCount, blocksDone, blocksTotal, bytesRead):
+        percentDone = (100 * fileNumber + 100 * blocksDone // blocksTotal) // fileCount
+        if percentDone != self.percentDone:
+            self.percentDone = percentDone
+            self.progressed.emit(percentDone)
+
+    # Method run on the background thread
+    def run(self):
+        for result in convertFiles(self.filenames,
+                                   self.roster,
+                                   self.reportProgress,
+                                   self.cancelToken,
+                                   profile=self.profile):
+            self.fileConverted.emit(result)
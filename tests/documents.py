@@ -0,0 +1,100 @@
+import zipfile
+from xml.sax.saxutils import escape
+
+from benchmarks.synthetic import writeSyntheticDocx
+
+# The fixed parts of a minimal .odt file, as LibreOffice writes them: bold and
+# italic text are automatic text styles
+ODT_CONTENT_START = ('<?xml version="1.0" encoding="UTF-8"?>'
+                     '<office:document-content'
+                     ' xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0"'
+                     ' xmlns:style="urn:oasis:names:tc:opendocument:xmlns:style:1.0"'
+                     ' xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0"'
+                     ' xmlns:fo="urn:oasis:names:tc:opendocument:xmlns:xsl-fo-compatible:1.0"'
+                     ' office:version="1.3">'
+                     '<office:automatic-styles>'
+                     '<style:style style:name="P1" style:family="paragraph" style:parent-style-name="Standard"/>'
+                     '<style:style style:name="T1" style:family="text"><style:text-properties fo:font-weight="bold"/></style:style>'
+                     '<style:style style:name="T2" style:family="text"><style:text-properties fo:font-style="italic"/></style:style>'
+                     '<style:style style:name="T3" style:family="text"><style:text-properties fo:font-weight="bold" fo:font-style="italic"/></style:style>'
+                     '</office:automatic-styles>'
+                     '<office:body><office:text><text:sequence-decls/>')
+ODT_CONTENT_END = '</office:text></office:body></office:document-content>'
+ODT_STYLES = ('<?xml version="1.0" encoding="UTF-8"?>'
+              '<office:document-styles'
+              ' xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0"'
+              ' xmlns:style="urn:oasis:names:tc:opendocument:xmlns:style:1.0">'
+              '<office:styles><style:style style:name="Standard" style:family="paragraph"/></office:styles>'
+              '</office:document-styles>')
+
+# The fixed parts of an exported HTML document, as Google Docs writes them:
+# bold and italic text are CSS classes
+HTML_START = ('<html><head><meta content="text/html; charset=UTF-8" http-equiv="content-type">'
+              '<style type="text/css">.c0{margin:0}.c1{color:#000000;font-weight:400;font-style:normal}'
+              '.c2{font-weight:700}.c3{font-style:italic}</style><title>Chapter</title></head>'
+              '<body class="c4 doc-content">')
+HTML_END = '</body></html>'
+
+# Automatic text style names for each (bold, italic) combination in the .odt
+# file
+ODT_TEXT_STYLES = {(True, False): 'T1', (False, True): 'T2', (True, True): 'T3'}
+
+# Function to write a .docx file
+# Parameters:
+#     path:        The path to write the file to
+#     paragraphs:  [] of [] of runs  The document's paragraphs, each a list of
+#                  (text, bold, italic) runs or None for a line break
+def writeDocx(path, paragraphs):
+    writeSyntheticDocx(path, paragraphs)
+
+# Function to write an .odt file
+# Parameters:
+#     path:        The path to write the file to
+#     paragraphs:  [] of [] of runs  The document's paragraphs (see writeDocx)
+def writeOdt(path, paragraphs):
+    parts = [ODT_CONTENT_START]
+    for runs in paragraphs:
+        parts.append('<text:p text:style-name="P1">')
+        for run in runs:
+            if run is None:
+                parts.append('<text:line-break/>')
+                continue
+            text, bold, italic = run
+            text = escape(text)
+            styleName = ODT_TEXT_STYLES.get((bool(bold), bool(italic)))
+            if styleName:
+                text = '<text:span text:style-name="' + styleName + '">' + text + '</text:span>'
+            parts.append(text)
+        parts.append('</text:p>')
+    parts.append(ODT_CONTENT_END)
+
+    with zipfile.ZipFile(path, 'w') as odtZip:
+        odtZip.writestr('mimetype', 'application/vnd.oasis.opendocument.text')
+        odtZip.writestr('content.xml', ''.join(parts), zipfile.ZIP_DEFLATED)
+        odtZip.writestr('styles.xml', ODT_STYLES, zipfile.ZIP_DEFLATED)
+
+# Function to write an exported HTML document
+# Parameters:
+#     path:        The path to write the file to
+#     paragraphs:  [] of [] of runs  The document's paragraphs (see writeDocx)
+def writeHtml(path, paragraphs):
+    parts = [HTML_START]
+    for runs in paragraphs:
+        parts.append('<p class="c0">')
+        for run in runs:
+            if run is None:
+                parts.append('<br>')
+                continue
+            text, bold, italic = run
+            classes = 'c1' + (' c2' if bold else '') + (' c3' if italic else '')
+            parts.append('<span class="' + classes + '">' + escape(text) + '</span>')
+        parts.append('</p>\n')
+    parts.append(HTML_END)
+
+    with open(path, 'w', encoding='utf-8') as htmlFile:
+        htmlFile.write(''.join(parts))
+
+# Writers for each type of document, keyed on file extension
+DOCUMENT_WRITERS = {'.docx': writeDocx,
+                    '.odt': writeOdt,
+                    '.html': writeHtml}
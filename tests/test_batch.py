@@ -0,0 +1,63 @@
+import json
+import os
+import tempfile
+import unittest
+
+from converter.batch import findOutputCollisions, mergeBatchSummaries, parseShard, selectShard
+
+# File names used to check how batches are split into shards
+FILENAMES = [os.path.join('chapters', 'chapter' + str(number) + '.docx') for number in range(1, 101)]
+
+# Class representing tests of splitting batches into shards and merging their
+# summaries
+class ShardTests(unittest.TestCase):
+    def testParsesShards(self):
+        self.assertEqual(parseShard('1/3'), (1, 3))
+        self.assertEqual(parseShard('3/3'), (3, 3))
+        for text in ('0/3', '4/3', '1', '1/', '/3', 'a/b', '-1/3', '1/0'):
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    parseShard(text)
+
+    def testShardsPartitionBatch(self):
+        for shardCount in range(1, 6):
+            with self.subTest(shardCount=shardCount):
+                shards = [selectShard(FILENAMES, index, shardCount)
+                          for index in range(1, shardCount + 1)]
+                self.assertEqual(sorted(sum(shards, [])), sorted(FILENAMES))
+                self.assertEqual(sum(len(shard) for shard in shards), len(FILENAMES))
+
+    def testShardsIgnoreOrderAndDirectory(self):
+        shard = selectShard(FILENAMES, 2, 3)
+        moved = [os.path.join('elsewhere', os.path.basename(filename))
+                 for filename in reversed(FILENAMES)]
+        self.assertEqual(sorted(os.path.basename(filename) for filename in selectShard(moved, 2, 3)),
+                         sorted(os.path.basename(filename) for filename in shard))
+
+    def testFindsOutputCollisions(self):
+        self.assertEqual(findOutputCollisions(FILENAMES), [])
+        self.assertEqual(findOutputCollisions(['a/chapter1.docx', 'b/chapter1.odt', 'a/chapter2.docx']),
+                         [['a/chapter1.docx', 'b/chapter1.odt']])
+
+    def testMergeReportsMissingShards(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = []
+            for index in (1, 3):
+                paths.append(os.path.join(directory, 'summary-%d-of-4.json' % index))
+                with open(paths[-1], 'w') as summaryFile:
+                    json.dump({'shard': [index, 4],
+                               'files': [{'file': 'chapter%d.docx' % index, 'status': 'OK'}],
+                               'senders': ['alice', 'sender%d' % index],
+                               'seconds': 1.5},
+                              summaryFile)
+
+            summary, missingShards = mergeBatchSummaries(paths)
+
+        self.assertEqual(missingShards, [2, 4])
+        self.assertEqual([entry['file'] for entry in summary['files']],
+                         ['chapter1.docx', 'chapter3.docx'])
+        self.assertEqual(summary['senders'], ['alice', 'sender1', 'sender3'])
+        self.assertEqual(summary['seconds'], 3.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+import os
+import re
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
+
+from benchmarks.synthetic import DOCX_CONTENT_TYPES, DOCX_DOCUMENT_END, DOCX_DOCUMENT_START, DOCX_RELATIONSHIPS, getDocxParagraphXml
+
+from config.classes import Character, CharacterRoster
+from converter import ficfileconverter
+from converter.blockcache import blockCache, documentCache
+from converter.formats import RENDER_HTML
+from tests.documents import DOCUMENT_WRITERS
+
+# A chapter using everything the readers have to agree on: prose, bold and
+# italic text, a chat with an action and a multi-line message, and empty
+# paragraphs (with and without a line break) inside and outside the chat
+CHAPTER = [[('Chapter intro paragraph with some prose.', False, False)],
+           [('Bold prose, ', True, False), ('bold italic', True, True)],
+           [('||| Besties', False, False)],
+           [('Alice: Hi ', False, False), ('Frank', False, True), ('!', False, False)],
+           [None],
+           [],
+           [('Frank: Hi, Alice!', False, False), None, ('How are you?', False, False)],
+           [('/// Alice added Lily', False, False)],
+           [('Lily: Hi guys!', False, False)],
+           [('not a message line', False, False)],
+           [('|||', False, False)],
+           [None],
+           [],
+           [('Some prose after the chat.', False, False)]]
+
+# Parts of a .docx file with a footnote, which the streaming reader can't
+# convert
+FOOTNOTE_RELATIONSHIPS = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                          '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                          '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/footnotes" Target="footnotes.xml"/>'
+                          '</Relationships>')
+FOOTNOTES_START = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                   '<w:footnotes xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+                   '<w:footnote w:type="separator" w:id="-1"><w:p><w:r><w:separator/></w:r></w:p></w:footnote>')
+FOOTNOTE = '<w:footnote w:id="1"><w:p><w:r><w:t>The footnote.</w:t></w:r></w:p></w:footnote>'
+FOOTNOTES_END = '</w:footnotes>'
+FOOTNOTE_PARAGRAPH = '<w:p><w:r><w:t>Prose with a footnote.</w:t></w:r><w:r><w:footnoteReference w:id="1"/></w:r></w:p>'
+
+# Pattern matching the class attribute of a message (but not of an action)
+MESSAGE_CLASS_REGEX = re.compile(r'class="[^"]*\bmessage\b(?!-)')
+
+# Class representing tests that every type of document converts to the same
+# output
+class DocumentReaderTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.roster = CharacterRoster.fromCharacters([Character('Alice', '#ff0000'),
+                                                      Character('Frank', '#00ff00')])
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    # Method to write the chapter as each type of document
+    # Parameters:
+    #     paragraphs:  The chapter's paragraphs (see tests.documents)
+    # Returns: dict of str  The path of each document, keyed on extension
+    def writeDocuments(self, paragraphs):
+        paths = {}
+        for extension, writer in DOCUMENT_WRITERS.items():
+            paths[extension] = os.path.join(self.directory.name, 'chapter' + extension)
+            writer(paths[extension], paragraphs)
+        return paths
+
+    # Method to convert a document from scratch
+    # Parameters:
+    #     path:  The path of the document
+    # Returns: (str, set(str))  The output HTML, and the senders found
+    def convert(self, path):
+        blockCache.clear()
+        documentCache.clear()
+        outputs, characters = ficfileconverter.renderDocument(path, self.roster, (RENDER_HTML,))
+        return outputs[0], characters
+
+    def testAllDocumentTypesConvertTheSame(self):
+        paths = self.writeDocuments(CHAPTER)
+        expected, expectedCharacters = self.convert(paths['.docx'])
+
+        self.assertIn('message-block', expected)
+        self.assertEqual(expectedCharacters, {'Alice', 'Frank', 'Lily'})
+        for extension in ('.odt', '.html'):
+            with self.subTest(extension=extension):
+                output, characters = self.convert(paths[extension])
+                self.assertEqual(output, expected)
+                self.assertEqual(characters, expectedCharacters)
+
+    def testStreamedDocxConvertsTheSame(self):
+        paths = self.writeDocuments(CHAPTER)
+        expected = self.convert(paths['.docx'])[0]
+
+        outputPath = os.path.join(self.directory.name, 'streamed.html')
+        blockCache.clear()
+        documentCache.clear()
+        with mock.patch.object(ficfileconverter, 'STREAMING_THRESHOLD_BYTES', 0):
+            ficfileconverter.processFile(paths['.docx'], self.roster, outfilePath=outputPath)
+        with open(outputPath, 'r', encoding='utf-8') as outputFile:
+            self.assertEqual(outputFile.read(), expected)
+
+    def testDocxWithFootnotesIsNotStreamed(self):
+        path = os.path.join(self.directory.name, 'footnotes.docx')
+        with zipfile.ZipFile(path, 'w') as docxZip:
+            docxZip.writestr('[Content_Types].xml', DOCX_CONTENT_TYPES)
+            docxZip.writestr('_rels/.rels', DOCX_RELATIONSHIPS)
+            docxZip.writestr('word/_rels/document.xml.rels', FOOTNOTE_RELATIONSHIPS)
+            docxZip.writestr('word/footnotes.xml', FOOTNOTES_START + FOOTNOTE + FOOTNOTES_END)
+            docxZip.writestr('word/document.xml',
+                             DOCX_DOCUMENT_START + FOOTNOTE_PARAGRAPH +
+                             ''.join(getDocxParagraphXml(runs) for runs in CHAPTER) +
+                             DOCX_DOCUMENT_END)
+        self.assertFalse(ficfileconverter.isStreamable(path))
+        expected = self.convert(path)[0]
+        self.assertIn('The footnote.', expected)
+
+        outputPath = os.path.join(self.directory.name, 'footnotes.html')
+        blockCache.clear()
+        documentCache.clear()
+        with mock.patch.object(ficfileconverter, 'STREAMING_THRESHOLD_BYTES', 0):
+            ficfileconverter.processFile(path, self.roster, outfilePath=outputPath)
+        with open(outputPath, 'r', encoding='utf-8') as outputFile:
+            self.assertEqual(outputFile.read(), expected)
+
+    def testDocxWithOnlyNoteSeparatorsIsStreamed(self):
+        path = os.path.join(self.directory.name, 'separators.docx')
+        with zipfile.ZipFile(path, 'w') as docxZip:
+            docxZip.writestr('[Content_Types].xml', DOCX_CONTENT_TYPES)
+            docxZip.writestr('_rels/.rels', DOCX_RELATIONSHIPS)
+            docxZip.writestr('word/_rels/document.xml.rels', FOOTNOTE_RELATIONSHIPS)
+            docxZip.writestr('word/footnotes.xml', FOOTNOTES_START + FOOTNOTES_END)
+            docxZip.writestr('word/document.xml', DOCX_DOCUMENT_START + DOCX_DOCUMENT_END)
+        self.assertTrue(ficfileconverter.isStreamable(path))
+
+    def testEmptyChatParagraphsAreDropped(self):
+        paths = self.writeDocuments([[('||| Besties', False, False)],
+                                     [None],
+                                     [('Alice: Hi!', False, False)],
+                                     [],
+                                     [None, None],
+                                     [('|||', False, False)]])
+
+        for extension, path in paths.items():
+            with self.subTest(extension=extension):
+                output, characters = self.convert(path)
+                self.assertEqual(characters, {'Alice'})
+                self.assertEqual(len(MESSAGE_CLASS_REGEX.findall(output)), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from config import importexport
+from config.classes import Character
+
+# Class representing tests of importing characters from CSV and JSON files
+class ImportCharactersTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.manager = mock.Mock()
+        self.manager.addCharacters.side_effect = len
+        patcher = mock.patch.object(importexport, 'getConfigManager', return_value=self.manager)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    # Method to write a character file
+    # Parameters:
+    #     name:      The file name (.csv or .json)
+    #     contents:  The file's contents
+    # Returns: str  The path of the file
+    def writeFile(self, name, contents):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', newline='') as outfile:
+            outfile.write(contents)
+        return path
+
+    def testImportsValidRows(self):
+        path = self.writeFile('characters.csv',
+                              'name,color,fontColor,aliases\n'
+                              'alice,#ff0000,,Ally Cat;Алиса\n'
+                              'frank,#00ff00,#000000,\n')
+        self.assertEqual(importexport.importCharacters(path), (2, []))
+
+        characters = self.manager.addCharacters.call_args[0][0]
+        self.assertEqual(characters[0], Character('alice', '#ff0000', None, ['Ally Cat', 'Алиса']))
+        self.assertEqual(characters[1].fontColor, '#000000')
+
+    def testRejectsInvalidFontColor(self):
+        path = self.writeFile('characters.json', json.dumps([
+            {'name': 'alice', 'color': '#ff0000', 'fontColor': 'red;} body {display:none'},
+            {'name': 'frank', 'color': '#00ff00', 'fontColor': ''}]))
+        count, errors = importexport.importCharacters(path)
+
+        self.assertEqual(count, 0)
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(errors[0].startswith('Row 1: invalid character "alice"'))
+        self.manager.addCharacters.assert_not_called()
+
+    def testReportsDuplicateNames(self):
+        path = self.writeFile('characters.csv',
+                              'name,color,fontColor,aliases\n'
+                              'alice,#ff0000,,\n'
+                              'frank,#00ff00,,\n'
+                              'Alice,#0000ff,,\n')
+        count, errors = importexport.importCharacters(path)
+
+        self.assertEqual(count, 0)
+        self.assertEqual(errors, ['Row 4: duplicate character "alice" (also in row 2)'])
+        self.manager.addCharacters.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import os
+import tempfile
+import time
+import unittest
+
+from converter.profiling import MEMORY_REPORT_EXTENSION, MEMORY_SAMPLE_SECONDS, ConversionProfiler, ProfileOptions
+
+# Memory allocated part-way through a profiled "conversion", in bytes
+ALLOCATED_BYTES = 16 * 1024 * 1024
+
+# Class representing tests of profiling conversions
+class MemoryProfileTests(unittest.TestCase):
+    def testReportShowsAllocationsHeldAtPeak(self):
+        with tempfile.TemporaryDirectory() as directory:
+            outfilePath = os.path.join(directory, 'output', 'chapter.html')
+            with ConversionProfiler(outfilePath, ProfileOptions(memory=True)) as profiler:
+                buffers = [bytearray(1024) for number in range(ALLOCATED_BYTES // 1024)]
+                # Give the sampler time to see the buffers, then free them
+                # before the end, as a conversion's working memory would be
+                deadline = time.time() + 10
+                while profiler.sampler.snapshotMemory < ALLOCATED_BYTES and time.time() < deadline:
+                    time.sleep(MEMORY_SAMPLE_SECONDS)
+                del buffers
+
+            self.assertEqual(profiler.reportPaths, [outfilePath + MEMORY_REPORT_EXTENSION])
+            with open(profiler.reportPaths[0], 'r') as reportFile:
+                report = reportFile.read()
+
+        peakLine, endLine = report.splitlines()[:2]
+        self.assertGreaterEqual(float(peakLine.split()[-2]), ALLOCATED_BYTES / 1024 / 1024)
+        self.assertLess(float(endLine.split()[-2]), 1)
+        # The top site is where the buffers were allocated, even though they
+        # were freed before the end
+        topSite = report.split('#1: ', 1)[1].split('#2: ', 1)[0]
+        self.assertIn(os.path.basename(__file__), topSite)
+        self.assertIn('bytearray(1024)', topSite)
+
+if __name__ == '__main__':
+    unittest.main()
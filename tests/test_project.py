@@ -0,0 +1,70 @@
+import json
+import os
+import tempfile
+import unittest
+
+from config.classes import Character
+from converter.blockcache import blockCache, documentCache
+from converter.project import MANIFEST_FILE_NAME, buildProject
+from tests.documents import writeDocx
+
+# Characters file for the test project
+CHARACTERS = {'alice': Character('alice', '#ff0000').toDict()}
+
+# Class representing tests of building projects
+class BuildProjectTests(unittest.TestCase):
+    def setUp(self):
+        blockCache.clear()
+        documentCache.clear()
+        self.directory = tempfile.TemporaryDirectory()
+        self.projectDir = self.directory.name
+        with open(os.path.join(self.projectDir, 'characters.json'), 'w') as charactersFile:
+            json.dump(CHARACTERS, charactersFile)
+        # Two chapters with the same name, in different directories
+        for part in ('a', 'b'):
+            os.makedirs(os.path.join(self.projectDir, part))
+            writeDocx(os.path.join(self.projectDir, part, 'ch1.docx'),
+                      [[('||| Besties', False, False)],
+                       [('Alice: Hi from part ' + part, False, False)],
+                       [('|||', False, False)]])
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    # Method to write the project manifest
+    # Parameters:
+    #     work:  The config of the project's only work
+    # Returns: str  The path of the manifest
+    def writeManifest(self, work):
+        path = os.path.join(self.projectDir, MANIFEST_FILE_NAME)
+        with open(path, 'w') as manifestFile:
+            json.dump({'works': [dict(work, characters='characters.json')]}, manifestFile)
+        return path
+
+    def testRejectsInputsSharingAnOutput(self):
+        manifestPath = self.writeManifest({'name': 'my-work',
+                                           'inputs': ['a/*.docx', 'b/*.docx']})
+
+        with self.assertRaises(ValueError) as context:
+            buildProject(manifestPath, jobs=1)
+
+        self.assertIn(os.path.join('a', 'ch1.docx'), str(context.exception))
+        self.assertIn(os.path.join('b', 'ch1.docx'), str(context.exception))
+        self.assertFalse(os.path.exists(os.path.join(self.projectDir, 'output')))
+
+    def testBuildsSameNamedInputsToDifferentOutputs(self):
+        manifestPath = self.writeManifest({'name': 'my-work',
+                                           'inputs': ['a/*.docx', 'b/*.docx'],
+                                           'output': 'output/{number}-{name}.html'})
+
+        report = buildProject(manifestPath, jobs=1)
+
+        self.assertEqual(report.failed, [])
+        self.assertEqual([os.path.basename(outputPath) for inputPath, outputPath in report.built],
+                         ['1-ch1.html', '2-ch1.html'])
+        for number, part in ((1, 'a'), (2, 'b')):
+            with open(os.path.join(self.projectDir, 'output', str(number) + '-ch1.html'), 'r') as outputFile:
+                self.assertIn('Hi from part ' + part, outputFile.read())
+
+if __name__ == '__main__':
+    unittest.main()
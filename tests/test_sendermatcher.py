@@ -0,0 +1,35 @@
+import unittest
+
+from config.classes import Character, CharacterRoster
+from converter.sendermatcher import SenderMatcher
+
+# Class representing tests of finding who sent a message
+class SenderMatcherTests(unittest.TestCase):
+    def setUp(self):
+        self.matcher = SenderMatcher(CharacterRoster.fromCharacters([
+            Character('alice', '#ff0000', aliases=['Ally Cat', 'Алиса']),
+            Character('ipek', '#00ff00', aliases=['İpek']),
+            Character('frank', '#0000ff')]))
+
+    def testMatchesNamesAndAliases(self):
+        self.assertEqual(self.matcher.match('alice: Hi!'), ('alice', 'alice'))
+        self.assertEqual(self.matcher.match('Ally Cat: Hi!'), ('Ally Cat', 'alice'))
+        self.assertEqual(self.matcher.match('АЛИСА: Привет!'), ('АЛИСА', 'alice'))
+
+    def testMatchesAliasWithMultiCodePointLowerCase(self):
+        # 'İ'.lower() is two code points ('i' and a combining dot)
+        self.assertEqual(self.matcher.match('İpek: Merhaba!'), ('İpek', 'ipek'))
+
+    def testPrefersLongestName(self):
+        matcher = SenderMatcher(CharacterRoster.fromCharacters([
+            Character('ally', '#ff0000'),
+            Character('alice', '#00ff00', aliases=['Ally Cat'])]))
+        self.assertEqual(matcher.match('Ally Cat: Hi!'), ('Ally Cat', 'alice'))
+        self.assertEqual(matcher.match('Ally: Hi!'), ('Ally', 'ally'))
+
+    def testFallsBackToUnknownSingleWordSender(self):
+        self.assertEqual(self.matcher.match('Lily: Hi guys!'), ('Lily', 'lily'))
+        self.assertIsNone(self.matcher.match('not a message line'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import json
+import os
+import tempfile
+import unittest
+
+from config.classes import Character
+from config.stores import SqliteCharacterStore
+
+# Class representing tests of the SQLite character store
+class SqliteCharacterStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'config.db')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    # Method to open a store on the test database
+    # Returns: SqliteCharacterStore
+    def openStore(self, **kwargs):
+        store = SqliteCharacterStore(self.path, **kwargs)
+        self.addCleanup(store.connection.close)
+        return store
+
+    def testOwnSavesAreNotChanges(self):
+        store = self.openStore()
+        store.saveCharacters(None, [Character('amy', '#ff0000')], [])
+        self.assertFalse(store.hasChanged())
+
+    def testSeesOtherSavesAfterOwnSave(self):
+        storeA = self.openStore()
+        storeB = self.openStore()
+
+        storeB.saveCharacters(None, [Character('bob', '#00ff00')], [])
+        storeA.saveCharacters(None, [Character('amy', '#ff0000')], [])
+
+        self.assertTrue(storeA.hasChanged())
+        self.assertFalse(storeA.hasChanged())
+        self.assertEqual([character.name for character in storeA.loadCharacters()],
+                         ['bob', 'amy'])
+
+    def testSeesOtherSavesAfterMigration(self):
+        jsonPath = os.path.join(self.directory.name, 'config.json')
+        with open(jsonPath, 'w') as jsonFile:
+            json.dump({'alice': Character('alice', '#0000ff').toDict()}, jsonFile)
+
+        storeA = self.openStore()
+        storeB = self.openStore()
+        storeB.saveCharacters(None, [Character('bob', '#00ff00')], [])
+        self.assertEqual(storeA.migrateFromJson(jsonPath), 0)
+        self.assertTrue(storeA.hasChanged())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import re
+import unittest
+
+from config.classes import Character, CharacterRoster
+from converter.blockcache import blockCache, documentCache
+from converter.ficfileconverter import convertHtml, renderHtml
+from converter.formats import RENDER_TEXT
+
+# Pattern matching the start of a speaker block, capturing its classes
+SENDER_BLOCK_REGEX = re.compile(r'class="sender-block ([^"]*)"')
+
+# Class representing tests of the chat transform's built-in stages
+class ChatTransformTests(unittest.TestCase):
+    def setUp(self):
+        blockCache.clear()
+        documentCache.clear()
+        self.roster = CharacterRoster.fromCharacters([Character('alice', '#ff0000'),
+                                                      Character('frank', '#00ff00')])
+
+    # Method to convert a chat
+    # Parameters:
+    #     lines:  [] of str  The lines of the chat, between the "|||" lines
+    # Returns: str  The output HTML
+    def convertChat(self, lines):
+        return convertHtml('<p>||| Besties</p>' +
+                           ''.join('<p>' + line + '</p>' for line in lines) +
+                           '<p>|||</p>',
+                           self.roster)[0]
+
+    def testConsecutiveMessagesShareSpeakerBlock(self):
+        output = self.convertChat(['Alice: Hi!', 'Alice: Anyone there?', 'Frank: Yes'])
+        self.assertEqual(SENDER_BLOCK_REGEX.findall(output),
+                         ['alice group-leader', 'frank'])
+
+    def testActionInterruptsSpeaker(self):
+        # The same sender after a "///" action starts a new speaker block
+        # (this used to fail with the block already closed by the action)
+        output = self.convertChat(['Alice: Hi!', '/// Alice added Frank', 'Alice: Welcome!'])
+        self.assertEqual(SENDER_BLOCK_REGEX.findall(output),
+                         ['alice group-leader', 'alice group-leader'])
+        self.assertLess(output.index('message-action'), output.rindex('sender-block'))
+
+    def testTextIndentsEveryLineOfMessage(self):
+        output = renderHtml('<p>||| Besties</p>'
+                            '<p>Frank: Hi, <b>with bold and </b><br>line two</p>'
+                            '<p>/// Alice added<br>Lily</p>'
+                            '<p>|||</p>',
+                            self.roster,
+                            (RENDER_TEXT,))[0][0]
+        self.assertEqual(output,
+                         '[ Besties ]\n'
+                         'Frank:\n'
+                         '    Hi, with bold and\n'
+                         '    line two\n'
+                         '* Alice added\n'
+                         '  Lily *\n\n')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,28 @@
-from PySide2.QtWidgets import QApplication
-from gui.appmain import AppMainWindow
+import multiprocessing
+import sys
 
-app = QApplication([])
+# Function to run the app
+def main():
+    # With arguments, run headless from the command line (see cli.commandline)
+    if len(sys.argv) > 1:
+        from cli.commandline import runCommandLine
+        sys.exit(runCommandLine(sys.argv[1:]))
 
-window = AppMainWindow()
-window.show()
+    from PySide2.QtWidgets import QApplication
+    from gui.appmain import AppMainWindow
+    from gui.filepreview import registerPreviewScheme
 
-app.exec_()
\ No newline at end of file
+    # The preview URL scheme has to be registered before the app is created
+    registerPreviewScheme()
+    app = QApplication([])
+
+    window = AppMainWindow()
+    window.show()
+
+    app.exec_()
+
+# Worker processes (used by the build command) import this module too, so
+# only start the app when run directly
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    main()